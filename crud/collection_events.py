@@ -0,0 +1,76 @@
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from models.collection_event import CollectionEvent
+from models.container import Container
+from datetime import datetime
+from typing import List, Optional
+
+# Pickups of a container, newest first
+def get_collection_events(
+    db: Session,
+    container_id: int,
+    from_timestamp: Optional[datetime] = None,
+    to_timestamp: Optional[datetime] = None,
+    limit: Optional[int] = None,
+) -> List[CollectionEvent]:
+    # A range on the primary key (container_id, timestamp)
+    query = db.query(CollectionEvent).filter(CollectionEvent.container_id == container_id)
+    if from_timestamp is not None:
+        query = query.filter(CollectionEvent.timestamp >= from_timestamp)
+    if to_timestamp is not None:
+        query = query.filter(CollectionEvent.timestamp <= to_timestamp)
+    query = query.order_by(CollectionEvent.timestamp.desc())
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
+
+def summarize_collections(rows):
+    events = sum(row.event_count for row in rows)
+    # Time between consecutive pickups of the same container, over all containers
+    gaps = sum(row.event_count - 1 for row in rows)
+    span_hours = sum((row.last_collection - row.first_collection).total_seconds() for row in rows) / 3600.0
+    return {
+        "event_count": events,
+        "container_count": len(rows),
+        "collected_litres": sum(int(row.collected_litres or 0) for row in rows),
+        "avg_fill_before": round(sum(float(row.fill_before_total or 0) for row in rows) / events, 1) if events else None,
+        "avg_hours_between_collections": round(span_hours / gaps, 2) if gaps else None,
+        "first_collection": min((row.first_collection for row in rows), default=None),
+        "last_collection": max((row.last_collection for row in rows), default=None),
+    }
+
+# Pickup statistics of the whole fleet and per container type, from one pass over collection_events
+def get_collection_stats(
+    db: Session,
+    from_timestamp: Optional[datetime] = None,
+    to_timestamp: Optional[datetime] = None,
+    container_type: Optional[str] = None,
+):
+    query = (
+        db.query(
+            Container.type.label("type"),
+            func.count().label("event_count"),
+            func.sum(CollectionEvent.fill_before - CollectionEvent.fill_after).label("collected_litres"),
+            func.sum(CollectionEvent.fill_before).label("fill_before_total"),
+            func.min(CollectionEvent.timestamp).label("first_collection"),
+            func.max(CollectionEvent.timestamp).label("last_collection"),
+        )
+        .join(Container, Container.id == CollectionEvent.container_id)
+    )
+    if from_timestamp is not None:
+        query = query.filter(CollectionEvent.timestamp >= from_timestamp)
+    if to_timestamp is not None:
+        query = query.filter(CollectionEvent.timestamp <= to_timestamp)
+    if container_type is not None:
+        query = query.filter(Container.type == container_type)
+    rows = query.group_by(CollectionEvent.container_id, Container.type).all()
+
+    by_type = {}
+    for row in rows:
+        by_type.setdefault(row.type, []).append(row)
+    stats = summarize_collections(rows)
+    stats["by_type"] = [
+        {"type": type_name, **summarize_collections(type_rows)}
+        for type_name, type_rows in sorted(by_type.items())
+    ]
+    return stats
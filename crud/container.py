@@ -1,11 +1,33 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from models.container import Container
+from crud.container_readings import delete_reading_stats, delete_reading_stats_async
 from schemas.container import ContainerCreate, ContainerUpdate
 from datetime import datetime
+from typing import Optional
 
-# List all containers
-def get_containers(db: Session):
-    return db.query(Container).all()
+# List containers ordered by id, one keyset page at a time
+def get_containers(db: Session, after_id: Optional[int] = None, limit: Optional[int] = None):
+    query = db.query(Container)
+    if after_id is not None:
+        query = query.filter(Container.id > after_id)
+    query = query.order_by(Container.id)
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
+
+# The columns the fleet-wide CO2 summary needs, optionally for one type or containers at least min_fill_ratio full
+def get_co2_inputs(db: Session, container_type: Optional[str] = None, min_fill_ratio: Optional[float] = None):
+    query = db.query(
+        Container.type, Container.address, Container.location_lat, Container.location_lng,
+        Container.capacity, Container.current_fill,
+    )
+    if container_type is not None:
+        query = query.filter(Container.type == container_type)
+    if min_fill_ratio is not None:
+        query = query.filter(Container.current_fill >= Container.capacity * min_fill_ratio)
+    return query.all()
 
 # Get a single container by ID
 def get_container(db: Session, container_id: int):
@@ -38,5 +60,60 @@ def delete_container(db: Session, container_id: int):
     if not db_container:
         return None
     db.delete(db_container)
+    # The readings go with the container (ON DELETE CASCADE), so do their statistics
+    delete_reading_stats(db, container_id)
     db.commit()
-    return db_container 
\ No newline at end of file
+    return db_container
+
+# Async variants of the functions above, for routes running on the event loop
+
+async def get_containers_async(db: AsyncSession, after_id: Optional[int] = None, limit: Optional[int] = None):
+    query = select(Container)
+    if after_id is not None:
+        query = query.where(Container.id > after_id)
+    query = query.order_by(Container.id)
+    if limit is not None:
+        query = query.limit(limit)
+    return (await db.scalars(query)).all()
+
+async def get_co2_inputs_async(db: AsyncSession, container_type: Optional[str] = None, min_fill_ratio: Optional[float] = None):
+    query = select(
+        Container.type, Container.address, Container.location_lat, Container.location_lng,
+        Container.capacity, Container.current_fill,
+    )
+    if container_type is not None:
+        query = query.where(Container.type == container_type)
+    if min_fill_ratio is not None:
+        query = query.where(Container.current_fill >= Container.capacity * min_fill_ratio)
+    return (await db.execute(query)).all()
+
+async def get_container_async(db: AsyncSession, container_id: int):
+    return await db.get(Container, container_id)
+
+async def create_container_async(db: AsyncSession, container: ContainerCreate):
+    db_container = Container(**container.dict())
+    db.add(db_container)
+    await db.commit()
+    await db.refresh(db_container)
+    return db_container
+
+async def update_container_async(db: AsyncSession, container_id: int, container: ContainerUpdate):
+    db_container = await db.get(Container, container_id)
+    if not db_container:
+        return None
+    for var, value in vars(container).items():
+        if value is not None:
+            setattr(db_container, var, value)
+    db_container.last_updated = datetime.utcnow()
+    await db.commit()
+    await db.refresh(db_container)
+    return db_container
+
+async def delete_container_async(db: AsyncSession, container_id: int):
+    db_container = await db.get(Container, container_id)
+    if not db_container:
+        return None
+    await db.delete(db_container)
+    await delete_reading_stats_async(db, container_id)
+    await db.commit()
+    return db_container
@@ -1,6 +1,224 @@
+from sqlalchemy import delete, func, select, true
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from models.container_readings import ContainerReading
-from typing import List
+from models.container import Container
+from models.container_reading_rollup import ContainerReadingHourly, ContainerReadingDaily
+from models.container_reading_stats import ContainerReadingStats, GLOBAL_STATS_ID
+from datetime import datetime, timedelta
+from typing import List, Optional
 
-def get_readings_by_container(db: Session, container_id: int) -> List[ContainerReading]:
-    return db.query(ContainerReading).filter(ContainerReading.container_id == container_id).order_by(ContainerReading.timestamp.desc()).all() 
\ No newline at end of file
+# Readings of a container, newest first, one keyset page at a time
+def get_readings_by_container(
+    db: Session,
+    container_id: int,
+    after_id: Optional[int] = None,
+    limit: Optional[int] = None,
+    from_timestamp: Optional[datetime] = None,
+    to_timestamp: Optional[datetime] = None,
+) -> List[ContainerReading]:
+    # Every filter is a range on uq_container_timestamp (container_id, timestamp)
+    query = db.query(ContainerReading).filter(ContainerReading.container_id == container_id)
+    if from_timestamp is not None:
+        query = query.filter(ContainerReading.timestamp >= from_timestamp)
+    if to_timestamp is not None:
+        query = query.filter(ContainerReading.timestamp <= to_timestamp)
+    if after_id is not None:
+        # Timestamps are unique per container, so the cursor reading's timestamp is the key
+        cursor_timestamp = (
+            db.query(ContainerReading.timestamp)
+            .filter(ContainerReading.reading_id == after_id)
+            .scalar_subquery()
+        )
+        query = query.filter(ContainerReading.timestamp < cursor_timestamp)
+    query = query.order_by(ContainerReading.timestamp.desc())
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
+
+# Latest reading at or before a timestamp for every container, with its coordinates
+def get_readings_as_of(db: Session, timestamp: datetime, tolerance: Optional[timedelta] = None):
+    # One index seek on uq_container_timestamp per container (LATERAL, MySQL 8.0.14+),
+    # so the cost follows the number of containers, not the number of readings
+    latest = (
+        db.query(
+            ContainerReading.reading_id,
+            ContainerReading.timestamp,
+            ContainerReading.fill_level_litres,
+        )
+        .filter(
+            ContainerReading.container_id == Container.id,
+            ContainerReading.timestamp <= timestamp,
+        )
+    )
+    if tolerance is not None:
+        latest = latest.filter(ContainerReading.timestamp >= timestamp - tolerance)
+    latest = latest.order_by(ContainerReading.timestamp.desc()).limit(1).subquery().lateral("latest")
+
+    return (
+        db.query(
+            Container.id.label("container_id"),
+            Container.address,
+            Container.location_lat,
+            Container.location_lng,
+            latest.c.reading_id,
+            latest.c.timestamp,
+            latest.c.fill_level_litres,
+        )
+        .join(latest, true())
+        .order_by(Container.id)
+        .all()
+    )
+
+# Readings of the given containers (all without ids) in a time range, in
+# (container_id, timestamp) order so the scan follows uq_container_timestamp
+def get_readings_for_export(
+    db: Session,
+    container_ids: Optional[List[int]] = None,
+    from_timestamp: Optional[datetime] = None,
+    to_timestamp: Optional[datetime] = None,
+):
+    query = db.query(
+        ContainerReading.reading_id,
+        ContainerReading.container_id,
+        ContainerReading.timestamp,
+        ContainerReading.fill_level_litres,
+    )
+    if container_ids:
+        query = query.filter(ContainerReading.container_id.in_(container_ids))
+    if from_timestamp is not None:
+        query = query.filter(ContainerReading.timestamp >= from_timestamp)
+    if to_timestamp is not None:
+        query = query.filter(ContainerReading.timestamp <= to_timestamp)
+    return query.order_by(ContainerReading.container_id, ContainerReading.timestamp)
+
+ROLLUP_MODELS = {"1h": ContainerReadingHourly, "1d": ContainerReadingDaily}
+
+# Hourly or daily aggregates of the given containers (all without ids) from the rollup tables
+def get_reading_aggregates(
+    db: Session,
+    bucket: str,
+    container_ids: Optional[List[int]] = None,
+    from_timestamp: Optional[datetime] = None,
+    to_timestamp: Optional[datetime] = None,
+):
+    model = ROLLUP_MODELS[bucket]
+    query = db.query(
+        model.container_id,
+        model.bucket_start,
+        model.reading_count,
+        model.min_fill,
+        model.max_fill,
+        (model.sum_fill * 1.0 / model.reading_count).label("avg_fill"),
+        model.last_fill,
+        model.last_timestamp,
+    )
+    if container_ids:
+        query = query.filter(model.container_id.in_(container_ids))
+    if from_timestamp is not None:
+        query = query.filter(model.bucket_start >= from_timestamp)
+    if to_timestamp is not None:
+        query = query.filter(model.bucket_start <= to_timestamp)
+    return query.order_by(model.container_id, model.bucket_start).all()
+
+# Maintained reading statistics of one container, or of all containers by default
+def get_reading_stats(db: Session, container_id: int = GLOBAL_STATS_ID) -> Optional[ContainerReadingStats]:
+    return db.query(ContainerReadingStats).filter(ContainerReadingStats.container_id == container_id).first()
+
+# Drop a container's statistics and recompute the global row from the remaining ones (caller commits)
+def delete_reading_stats(db: Session, container_id: int):
+    db.query(ContainerReadingStats).filter(ContainerReadingStats.container_id == container_id).delete()
+    per_container = db.query(ContainerReadingStats).filter(ContainerReadingStats.container_id != GLOBAL_STATS_ID)
+    totals = per_container.with_entities(
+        func.min(ContainerReadingStats.min_timestamp),
+        func.max(ContainerReadingStats.max_timestamp),
+        func.sum(ContainerReadingStats.reading_count),
+    ).one()
+    newest = per_container.order_by(ContainerReadingStats.max_timestamp.desc()).first()
+    if newest is None:
+        db.query(ContainerReadingStats).filter(ContainerReadingStats.container_id == GLOBAL_STATS_ID).delete()
+        return
+    db.merge(ContainerReadingStats(
+        container_id=GLOBAL_STATS_ID,
+        min_timestamp=totals[0],
+        max_timestamp=totals[1],
+        reading_count=totals[2],
+        latest_fill=newest.latest_fill,
+    ))
+
+# Async variants for routes running on the event loop. The snapshot and export
+# queries stay synchronous: their results are encoded or streamed on worker threads.
+
+async def get_readings_by_container_async(
+    db: AsyncSession,
+    container_id: int,
+    after_id: Optional[int] = None,
+    limit: Optional[int] = None,
+    from_timestamp: Optional[datetime] = None,
+    to_timestamp: Optional[datetime] = None,
+) -> List[ContainerReading]:
+    query = select(ContainerReading).where(ContainerReading.container_id == container_id)
+    if from_timestamp is not None:
+        query = query.where(ContainerReading.timestamp >= from_timestamp)
+    if to_timestamp is not None:
+        query = query.where(ContainerReading.timestamp <= to_timestamp)
+    if after_id is not None:
+        cursor_timestamp = (
+            select(ContainerReading.timestamp)
+            .where(ContainerReading.reading_id == after_id)
+            .scalar_subquery()
+        )
+        query = query.where(ContainerReading.timestamp < cursor_timestamp)
+    query = query.order_by(ContainerReading.timestamp.desc())
+    if limit is not None:
+        query = query.limit(limit)
+    return (await db.scalars(query)).all()
+
+async def get_reading_aggregates_async(
+    db: AsyncSession,
+    bucket: str,
+    container_ids: Optional[List[int]] = None,
+    from_timestamp: Optional[datetime] = None,
+    to_timestamp: Optional[datetime] = None,
+):
+    model = ROLLUP_MODELS[bucket]
+    query = select(
+        model.container_id,
+        model.bucket_start,
+        model.reading_count,
+        model.min_fill,
+        model.max_fill,
+        (model.sum_fill * 1.0 / model.reading_count).label("avg_fill"),
+        model.last_fill,
+        model.last_timestamp,
+    )
+    if container_ids:
+        query = query.where(model.container_id.in_(container_ids))
+    if from_timestamp is not None:
+        query = query.where(model.bucket_start >= from_timestamp)
+    if to_timestamp is not None:
+        query = query.where(model.bucket_start <= to_timestamp)
+    return (await db.execute(query.order_by(model.container_id, model.bucket_start))).all()
+
+async def get_reading_stats_async(db: AsyncSession, container_id: int = GLOBAL_STATS_ID) -> Optional[ContainerReadingStats]:
+    return await db.get(ContainerReadingStats, container_id)
+
+async def delete_reading_stats_async(db: AsyncSession, container_id: int):
+    await db.execute(delete(ContainerReadingStats).where(ContainerReadingStats.container_id == container_id))
+    per_container = select(ContainerReadingStats).where(ContainerReadingStats.container_id != GLOBAL_STATS_ID)
+    totals = (await db.execute(per_container.with_only_columns(
+        func.min(ContainerReadingStats.min_timestamp),
+        func.max(ContainerReadingStats.max_timestamp),
+        func.sum(ContainerReadingStats.reading_count),
+    ))).one()
+    newest = (await db.scalars(per_container.order_by(ContainerReadingStats.max_timestamp.desc()).limit(1))).first()
+    if newest is None:
+        await db.execute(delete(ContainerReadingStats).where(ContainerReadingStats.container_id == GLOBAL_STATS_ID))
+        return
+    await db.merge(ContainerReadingStats(
+        container_id=GLOBAL_STATS_ID,
+        min_timestamp=totals[0],
+        max_timestamp=totals[1],
+        reading_count=totals[2],
+        latest_fill=newest.latest_fill,
+    ))
@@ -1,3 +1,5 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from models.truck import Truck
 from schemas.truck import TruckCreate, TruckUpdate
@@ -31,4 +33,37 @@ def delete_truck(db: Session, truck_id: int):
         db.delete(db_truck)
         db.commit()
         return True
-    return False
\ No newline at end of file
+    return False
+
+# Async variants of the functions above, for routes running on the event loop
+
+async def create_truck_async(db: AsyncSession, truck: TruckCreate):
+    db_truck = Truck(**truck.dict())
+    db.add(db_truck)
+    await db.commit()
+    await db.refresh(db_truck)
+    return db_truck
+
+async def get_truck_async(db: AsyncSession, truck_id: int):
+    return await db.get(Truck, truck_id)
+
+async def get_trucks_async(db: AsyncSession, skip: int = 0, limit: int = 100):
+    return (await db.scalars(select(Truck).offset(skip).limit(limit))).all()
+
+async def update_truck_async(db: AsyncSession, truck_id: int, truck: TruckUpdate):
+    db_truck = await db.get(Truck, truck_id)
+    if db_truck:
+        update_data = truck.dict(exclude_unset=True)
+        for key, value in update_data.items():
+            setattr(db_truck, key, value)
+        await db.commit()
+        await db.refresh(db_truck)
+    return db_truck
+
+async def delete_truck_async(db: AsyncSession, truck_id: int):
+    db_truck = await db.get(Truck, truck_id)
+    if db_truck:
+        await db.delete(db_truck)
+        await db.commit()
+        return True
+    return False
@@ -1,5 +1,6 @@
 import os
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
@@ -13,6 +14,13 @@ MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD", "yourrootpassword")
 MYSQL_DB = os.getenv("MYSQL_DB", "greenroad_db")
 
 SQLALCHEMY_DATABASE_URL = f"mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DB}"
+# Driver of the async engine: aiomysql or asyncmy. ASYNC_DATABASE_URL replaces the whole URL
+# (e.g. sqlite+aiosqlite:///./test.db)
+MYSQL_ASYNC_DRIVER = os.getenv("MYSQL_ASYNC_DRIVER", "aiomysql")
+ASYNC_DATABASE_URL = os.getenv(
+    "ASYNC_DATABASE_URL",
+    f"mysql+{MYSQL_ASYNC_DRIVER}://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DB}",
+)
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
@@ -23,10 +31,23 @@ engine = create_engine(
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Used by the async routes, so their queries wait on the event loop instead of holding a threadpool worker
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_pre_ping=True,
+    pool_recycle=300
+)
+# Objects stay readable after commit; lazy loads are not possible on an AsyncSession
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 # Add the get_db dependency
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,6 +1,10 @@
 from database import engine
 from models.container import Base as ContainerBase
 from models.truck import Base as TruckBase
+from models.import_job import Base as ImportJobBase
+from models.container_reading_rollup import Base as RollupBase
+from models.container_reading_stats import Base as ReadingStatsBase
+from models.collection_event import Base as CollectionEventBase
 import os
 import sys
 from sqlalchemy import text
@@ -11,6 +15,10 @@ def init_db():
     # Create all tables
     ContainerBase.metadata.create_all(bind=engine)
     TruckBase.metadata.create_all(bind=engine)
+    ImportJobBase.metadata.create_all(bind=engine)
+    RollupBase.metadata.create_all(bind=engine)
+    ReadingStatsBase.metadata.create_all(bind=engine)
+    CollectionEventBase.metadata.create_all(bind=engine)
     
     print("Database tables created successfully.")
 
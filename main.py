@@ -1,10 +1,22 @@
 from fastapi import FastAPI
 from fastapi.routing import APIRoute
-from routes import containers, truck, admin  # Add the admin import
+from routes import containers, truck, admin, route_plans  # Add the admin import
 import uvicorn
 from fastapi.responses import RedirectResponse
 from datetime import datetime
 from fastapi.middleware.cors import CORSMiddleware
+from services.import_jobs import import_jobs
+from services.csv_watcher import CsvDirectoryWatcher, CSV_WATCH_ENABLED
+from services.reading_index import reading_index, READING_INDEX_ENABLED
+from services.snapshot_cache import snapshot_cache
+from services.spatial_index import spatial_index
+from services.tile_pyramid import tile_pyramid
+from services.urgency_queue import urgency_queue
+from services.distance_matrix import distance_matrix, DISTANCE_MATRIX_ENABLED
+from services.route_plan_store import route_plan_store
+from services.fill_forecast import fill_forecast, FORECAST_ENABLED
+from scripts.import_csv import add_readings_listener, add_containers_listener
+from database import async_engine
 import os
 
 # Custom operationId for better client generation
@@ -27,8 +39,70 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
+    expose_headers=["X-Next-After-Id"],  # Keyset pagination cursor
 )
 
+@app.on_event("startup")
+def mark_interrupted_imports():
+    # Imports that were running when the previous process stopped can be resumed
+    try:
+        import_jobs.recover_interrupted()
+    except Exception as e:
+        print(f"Could not check for interrupted import jobs: {e}")
+
+@app.on_event("startup")
+def load_reading_index():
+    # Loaded in the background; /containers/readings/nearest uses SQL until it is ready
+    if READING_INDEX_ENABLED:
+        add_readings_listener(reading_index.refresh)
+        reading_index.start()
+
+@app.on_event("startup")
+def invalidate_snapshots_on_import():
+    # Registered after the index so a dropped bucket is never rebuilt from stale readings
+    add_readings_listener(snapshot_cache.on_readings_committed)
+
+@app.on_event("startup")
+def load_fill_forecast():
+    # Fill rates are loaded in the background; /containers/forecast answers 503 until then
+    if FORECAST_ENABLED:
+        add_readings_listener(fill_forecast.refresh)
+        fill_forecast.start()
+
+@app.on_event("startup")
+def load_spatial_index():
+    add_containers_listener(spatial_index.refresh)
+    spatial_index.add_observer(tile_pyramid)
+    spatial_index.add_observer(route_plan_store)
+    spatial_index.add_observer(urgency_queue)
+    if DISTANCE_MATRIX_ENABLED:
+        spatial_index.add_observer(distance_matrix)
+    try:
+        spatial_index.load()
+    except Exception as e:
+        # Loaded on first use instead
+        print(f"Could not load the container spatial index: {e}")
+        return
+    if DISTANCE_MATRIX_ENABLED:
+        # Brings the saved matrix up to date with the containers in the background
+        distance_matrix.start()
+
+csv_watcher = CsvDirectoryWatcher() if CSV_WATCH_ENABLED else None
+
+@app.on_event("startup")
+def start_csv_watcher():
+    if csv_watcher is not None:
+        csv_watcher.start()
+
+@app.on_event("shutdown")
+def stop_csv_watcher():
+    if csv_watcher is not None:
+        csv_watcher.stop()
+
+@app.on_event("shutdown")
+async def close_async_engine():
+    await async_engine.dispose()
+
 # Root endpoint that redirects to the API docs
 @app.get("/", tags=["root"])
 def root():
@@ -47,6 +121,7 @@ def health_check():
 app.include_router(containers.router, prefix="/containers", tags=["containers"])
 app.include_router(truck.router, tags=["trucks"])
 app.include_router(admin.router, prefix="/admin", tags=["admin"])  # Add the admin router
+app.include_router(route_plans.router, prefix="/routes", tags=["routes"])
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
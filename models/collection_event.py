@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, DateTime, ForeignKey
+from database import Base
+
+# A pickup: a reading far below the previous reading of the same container,
+# detected by the CSV import (scripts/import_csv.py)
+
+class CollectionEvent(Base):
+    __tablename__ = "collection_events"
+
+    container_id = Column(Integer, ForeignKey("containers.id", ondelete="CASCADE"), primary_key=True)
+    timestamp = Column(DateTime, primary_key=True, index=True)  # The first reading after the pickup
+    previous_timestamp = Column(DateTime, nullable=False)
+    fill_before = Column(Integer, nullable=False)
+    fill_after = Column(Integer, nullable=False)
@@ -1,9 +1,12 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime
+from sqlalchemy import Column, Integer, String, Float, DateTime, UniqueConstraint
 from database import Base
 import datetime
 
 class Container(Base):
     __tablename__ = "containers"
+    __table_args__ = (
+        UniqueConstraint("name", "address", name="uq_container_name_address"),
+    )
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     name = Column(String(255), nullable=False)
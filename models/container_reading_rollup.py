@@ -0,0 +1,29 @@
+from sqlalchemy import Column, Integer, BigInteger, DateTime, ForeignKey
+from database import Base
+
+# Per container and bucket: the aggregates of the raw readings in
+# container_readings, maintained by the CSV import (scripts/import_csv.py)
+
+class ContainerReadingHourly(Base):
+    __tablename__ = "container_readings_hourly"
+
+    container_id = Column(Integer, ForeignKey("containers.id", ondelete="CASCADE"), primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    reading_count = Column(Integer, nullable=False)
+    min_fill = Column(Integer, nullable=False)
+    max_fill = Column(Integer, nullable=False)
+    sum_fill = Column(BigInteger, nullable=False)
+    last_timestamp = Column(DateTime, nullable=False)
+    last_fill = Column(Integer, nullable=False)
+
+class ContainerReadingDaily(Base):
+    __tablename__ = "container_readings_daily"
+
+    container_id = Column(Integer, ForeignKey("containers.id", ondelete="CASCADE"), primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    reading_count = Column(Integer, nullable=False)
+    min_fill = Column(Integer, nullable=False)
+    max_fill = Column(Integer, nullable=False)
+    sum_fill = Column(BigInteger, nullable=False)
+    last_timestamp = Column(DateTime, nullable=False)
+    last_fill = Column(Integer, nullable=False)
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, BigInteger, DateTime
+from database import Base
+
+# container_id of the row that covers all containers
+GLOBAL_STATS_ID = 0
+
+class ContainerReadingStats(Base):
+    __tablename__ = "container_reading_stats"
+
+    # No foreign key: the global row uses GLOBAL_STATS_ID
+    container_id = Column(Integer, primary_key=True, autoincrement=False)
+    min_timestamp = Column(DateTime, nullable=False)
+    max_timestamp = Column(DateTime, nullable=False)
+    reading_count = Column(BigInteger, nullable=False)
+    latest_fill = Column(Integer, nullable=False)
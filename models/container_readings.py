@@ -1,8 +1,11 @@
-from sqlalchemy import Column, Integer, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, UniqueConstraint
 from database import Base
 
 class ContainerReading(Base):
     __tablename__ = "container_readings"
+    __table_args__ = (
+        UniqueConstraint("container_id", "timestamp", name="uq_container_timestamp"),
+    )
 
     reading_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     container_id = Column(Integer, ForeignKey("containers.id", ondelete="CASCADE"), nullable=False, index=True)
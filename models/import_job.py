@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, BigInteger, Boolean, String, Text, DateTime
+from database import Base
+import datetime
+
+class ImportJob(Base):
+    __tablename__ = "import_jobs"
+
+    id = Column(String(36), primary_key=True)
+    filepath = Column(String(1024), nullable=False)
+    status = Column(String(20), nullable=False, index=True)
+    workers = Column(Integer, nullable=False, default=1)
+    incremental = Column(Boolean, nullable=False, default=False)
+    # Byte offset just past the last committed row; a resumed run starts here
+    byte_offset = Column(BigInteger, nullable=True)
+    total_bytes = Column(BigInteger, nullable=True)
+    rows_processed = Column(BigInteger, nullable=False, default=0)
+    rows_rejected = Column(BigInteger, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
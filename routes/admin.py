@@ -1,12 +1,20 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import APIKeyHeader
 import os
-from typing import Dict
+from typing import Any, Dict, List
+from datetime import datetime
 import sys
+import time
 
 # Add the scripts directory to the Python path
 sys.path.append(os.path.join(os.path.dirname(__file__), "..", "scripts"))
-from scripts.import_csv import import_data_from_csv
+from scripts.import_csv import (
+    import_summary, prepare_database, ImportSession, StreamRowDecoder,
+    IMPORT_WORKERS, CHUNK_SIZE, CSV_DATA_DIR,
+)
+from services.import_jobs import import_jobs, import_slots, IMPORT_STREAM_WAIT_SECONDS
+from services.snapshot_cache import snapshot_cache
 
 router = APIRouter()
 
@@ -22,22 +30,18 @@ def verify_api_key(api_key: str = Depends(api_key_header)):
         )
     return api_key
 
-# Function to run in background
-def import_csv_task(filepath: str):
-    try:
-        import_data_from_csv(filepath)
-    except Exception as e:
-        print(f"Background CSV import failed: {e}")
-
 @router.post("/import-csv", response_model=Dict[str, str])
 async def trigger_csv_import(
-    background_tasks: BackgroundTasks,
+    workers: int = Query(IMPORT_WORKERS, ge=1, le=32),
+    incremental: bool = False,
     api_key: str = Depends(verify_api_key)
 ):
     """
-    Trigger a CSV import from the predefined CSV file.
+    Queue a CSV import job for the predefined CSV file.
     This endpoint is protected by an API key.
-    The import runs in the background to avoid blocking the API.
+    Track the returned job with GET /admin/import-jobs/{job_id}.
+    With workers > 1 the file is imported by a pool of worker processes.
+    With incremental=true rows at or before each container's newest stored reading are skipped.
     """
     csv_file_path = os.path.join(
         os.path.dirname(os.path.dirname(__file__)), 
@@ -50,21 +54,23 @@ async def trigger_csv_import(
             detail=f"CSV file not found: {csv_file_path}"
         )
     
-    # Add the task to run in the background
-    background_tasks.add_task(import_csv_task, csv_file_path)
+    job = await run_in_threadpool(import_jobs.submit, csv_file_path, workers, incremental)
     
-    return {"message": "CSV import started in the background"}
+    return {"message": "CSV import queued", "job_id": job["id"]}
 
 @router.post("/import-custom-csv", response_model=Dict[str, str])
 async def trigger_custom_csv_import(
     csv_filename: str,
-    background_tasks: BackgroundTasks,
+    workers: int = Query(IMPORT_WORKERS, ge=1, le=32),
+    incremental: bool = False,
     api_key: str = Depends(verify_api_key)
 ):
     """
-    Trigger a CSV import from a custom CSV file (must be in the application directory).
+    Queue a CSV import job for a custom CSV file (must be in the application directory).
     This endpoint is protected by an API key.
-    The import runs in the background to avoid blocking the API.
+    Track the returned job with GET /admin/import-jobs/{job_id}.
+    With workers > 1 the file is imported by a pool of worker processes.
+    With incremental=true rows at or before each container's newest stored reading are skipped.
     """
     # Security check: don't allow path traversal
     if "/" in csv_filename or "\\" in csv_filename:
@@ -84,7 +90,142 @@ async def trigger_custom_csv_import(
             detail=f"CSV file not found: {csv_filename}"
         )
     
-    # Add the task to run in the background
-    background_tasks.add_task(import_csv_task, csv_file_path)
+    job = await run_in_threadpool(import_jobs.submit, csv_file_path, workers, incremental)
     
-    return {"message": f"Import of {csv_filename} started in the background"}
\ No newline at end of file
+    return {"message": f"Import of {csv_filename} queued", "job_id": job["id"]}
+
+@router.get("/import-jobs", response_model=List[Dict[str, Any]])
+def list_import_jobs(
+    limit: int = Query(50, ge=1, le=500),
+    api_key: str = Depends(verify_api_key)
+):
+    """
+    List the most recent import jobs, newest first.
+    """
+    return import_jobs.list_jobs(limit)
+
+@router.get("/import-jobs/{job_id}", response_model=Dict[str, Any])
+def get_import_job(job_id: str, api_key: str = Depends(verify_api_key)):
+    """
+    Get the status and progress of an import job: rows processed and
+    rejected, rows per second, elapsed time and an ETA based on the bytes read so far.
+    """
+    job = import_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
+
+@router.post("/import-jobs/{job_id}/cancel", response_model=Dict[str, Any])
+def cancel_import_job(job_id: str, api_key: str = Depends(verify_api_key)):
+    """
+    Cancel a queued or running import job. A running job stops after its
+    current chunk; everything committed so far is kept and can be resumed.
+    """
+    try:
+        job = import_jobs.cancel(job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
+
+@router.post("/import-jobs/{job_id}/resume", response_model=Dict[str, Any])
+def resume_import_job(job_id: str, api_key: str = Depends(verify_api_key)):
+    """
+    Requeue an interrupted, failed or cancelled job. It continues from the
+    byte offset of its last committed chunk instead of the start of the file.
+    """
+    try:
+        job = import_jobs.resume(job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
+
+@router.post("/import-stream", response_model=Dict[str, Any])
+async def import_csv_stream(
+    request: Request,
+    incremental: bool = False,
+    api_key: str = Depends(verify_api_key)
+):
+    """
+    Import a CSV sent as the raw request body (e.g. Content-Type: text/csv,
+    optionally with chunked transfer encoding).
+    Rows are parsed and written chunk by chunk while the body is still
+    arriving, so the file is never held in memory or on disk as a whole.
+    Rejected rows are written to the CSV data directory. With
+    incremental=true rows at or before each container's newest stored reading are skipped.
+    The upload takes one of the import slots shared with queued jobs and the
+    CSV watcher; if none frees up within IMPORT_STREAM_WAIT_SECONDS it is
+    answered with 503.
+    This endpoint is protected by an API key.
+    """
+    started = time.monotonic()
+    if not await run_in_threadpool(import_slots.acquire, timeout=IMPORT_STREAM_WAIT_SECONDS):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Other imports are running, try again later",
+            headers={"Retry-After": str(max(1, round(IMPORT_STREAM_WAIT_SECONDS)))},
+        )
+    try:
+        return await run_stream_import(request, incremental, started)
+    finally:
+        import_slots.release()
+
+async def run_stream_import(request, incremental, started):
+    await run_in_threadpool(prepare_database)
+    rejects_path = os.path.join(CSV_DATA_DIR, f"import-stream-{datetime.utcnow():%Y%m%dT%H%M%S%f}.rejects.csv")
+
+    decoder = StreamRowDecoder()
+    session = None
+    rows = []
+    try:
+        async for data in request.stream():
+            rows.extend(decoder.feed(data))
+            if session is None and rows:
+                session = await open_stream_session(rows.pop(0), rejects_path, incremental)
+            while session is not None and len(rows) >= CHUNK_SIZE:
+                chunk, rows = rows[:CHUNK_SIZE], rows[CHUNK_SIZE:]
+                await run_in_threadpool(session.write_rows, chunk)
+
+        rows.extend(decoder.flush())
+        if session is None:
+            if not rows:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Request body is empty"
+                )
+            session = await open_stream_session(rows.pop(0), rejects_path, incremental)
+        if rows:
+            await run_in_threadpool(session.write_rows, rows)
+        await run_in_threadpool(session.update_container_fills)
+    finally:
+        if session is not None:
+            await run_in_threadpool(session.close)
+
+    return import_summary(
+        session.rows_processed, session.rows_rejected, len(session.latest_readings), started,
+        rows_skipped=session.rows_skipped,
+    )
+
+async def open_stream_session(header, rejects_path, incremental=False):
+    try:
+        return await run_in_threadpool(ImportSession, header, rejects_path, CHUNK_SIZE, incremental=incremental)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+@router.get("/snapshot-cache", response_model=Dict[str, Any])
+def get_snapshot_cache_stats(api_key: str = Depends(verify_api_key)):
+    """
+    Size and hit/miss/eviction counters of the /containers/readings/nearest snapshot cache.
+    """
+    return snapshot_cache.stats()
+
+@router.delete("/snapshot-cache", response_model=Dict[str, Any])
+def clear_snapshot_cache(api_key: str = Depends(verify_api_key)):
+    """
+    Drop all cached snapshots.
+    """
+    snapshot_cache.invalidate()
+    return snapshot_cache.stats()
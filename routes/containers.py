@@ -1,16 +1,36 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
-from database import SessionLocal
-from schemas.container import ContainerCreate, ContainerUpdate, ContainerResponse
-from crud.container import get_containers, get_container, create_container, update_container, delete_container
-from services.co2 import estimate_co2_emission
-from typing import List
-from schemas.container_readings import ContainerReadingResponse
-from crud.container_readings import get_readings_by_container
-from models.container_readings import ContainerReading
-from models.container import Container
-from datetime import datetime
+from database import SessionLocal, get_async_db
+from schemas.container import (
+    ContainerCreate, ContainerUpdate, ContainerResponse, ContainerNearResponse, Co2SummaryResponse, FillForecastResponse,
+    UrgentContainerResponse,
+)
+from crud.container import (
+    get_container, get_container_async, get_containers_async, create_container_async, update_container_async,
+    delete_container_async, get_co2_inputs_async,
+)
+from services.co2 import estimate_co2_emission, summarize_co2
+from services.reading_index import reading_index
+from services.snapshot_cache import snapshot_cache
+from services.spatial_index import spatial_index
+from services.tile_pyramid import tile_pyramid, tile_bounds, cluster_entries
+from services.fill_forecast import fill_forecast, parse_horizon
+from services.urgency_queue import urgency_queue
+from services.reading_export import iter_ndjson, iter_csv
+from services.arrow_export import iter_export_bytes, ARROW_FORMATS
+from typing import List, Literal, Optional
+from schemas.container_readings import ContainerReadingResponse, ReadingAggregateResponse
+from crud.container_readings import (
+    get_readings_as_of, get_readings_by_container_async, get_reading_aggregates_async, get_reading_stats_async,
+)
+from schemas.collection_event import CollectionEventResponse, CollectionStatsResponse
+from crud.collection_events import get_collection_events, get_collection_stats
+from models.container_reading_stats import GLOBAL_STATS_ID
+from datetime import datetime, timedelta
 
 router = APIRouter()
 
@@ -21,38 +41,158 @@ def get_db():
     finally:
         db.close()
 
+# Keyset pages: the id to pass as after_id for the next page is sent in this header
+NEXT_PAGE_HEADER = "X-Next-After-Id"
+
 @router.get("/", response_model=List[ContainerResponse])
-def list_containers(db: Session = Depends(get_db)):
-    return get_containers(db)
+async def list_containers(
+    response: Response,
+    after_id: Optional[int] = Query(None, description="Return containers with an id greater than this"),
+    limit: int = Query(1000, ge=1, le=10000),
+    db: AsyncSession = Depends(get_async_db)
+):
+    containers = await get_containers_async(db, after_id, limit)
+    if len(containers) == limit:
+        response.headers[NEXT_PAGE_HEADER] = str(containers[-1].id)
+    return containers
+
+# Declared before /{container_id} so the path is not taken for an id
+@router.get("/near", response_model=List[ContainerNearResponse])
+def list_containers_near(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    radius_m: float = Query(1000, gt=0, le=50000),
+    type: Optional[str] = None,
+    min_fill_ratio: Optional[float] = Query(None, ge=0),
+    limit: int = Query(1000, ge=1, le=10000),
+):
+    """
+    Containers within radius_m meters of a point, nearest first, from the in-memory spatial index.
+    Optionally only containers of one type or at least min_fill_ratio full.
+    """
+    spatial_index.ensure_loaded()
+    return [
+        {**entry._asdict(), "distance_m": round(distance, 1)}
+        for entry, distance in spatial_index.near(lat, lng, radius_m, type, min_fill_ratio, limit)
+    ]
+
+@router.get("/in-bbox", response_model=List[ContainerResponse])
+def list_containers_in_bbox(
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lng: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lng: float = Query(..., ge=-180, le=180),
+    type: Optional[str] = None,
+    min_fill_ratio: Optional[float] = Query(None, ge=0),
+    limit: int = Query(10000, ge=1, le=100000),
+):
+    """
+    Containers inside a bounding box, ordered by id, from the in-memory spatial index.
+    """
+    if min_lat > max_lat or min_lng > max_lng:
+        raise HTTPException(status_code=400, detail="min_lat/min_lng must not exceed max_lat/max_lng")
+    spatial_index.ensure_loaded()
+    return spatial_index.in_bbox(min_lat, min_lng, max_lat, max_lng, type, min_fill_ratio, limit)
+
+@router.get("/tiles/{z}/{x}/{y}")
+def get_container_tile(z: int, x: int, y: int):
+    """
+    Container clusters of a Web Mercator map tile: the tile is split into 8x8
+    cells and every occupied cell returns its container count, average fill
+    ratio and centroid (plus the container id if it holds only one).
+    """
+    if not 0 <= z <= 22 or not 0 <= x < 2 ** z or not 0 <= y < 2 ** z:
+        raise HTTPException(status_code=404, detail="Tile not found")
+    spatial_index.ensure_loaded()
+    if z <= tile_pyramid.max_zoom:
+        clusters = tile_pyramid.tile(z, x, y)
+    else:
+        # Deep tiles cover few containers; cluster them on request
+        clusters = cluster_entries(spatial_index.in_bbox(*tile_bounds(z, x, y)), z, x, y)
+    return {"z": z, "x": x, "y": y, "clusters": clusters}
+
+@router.get("/forecast", response_model=List[FillForecastResponse])
+def get_fill_forecast(
+    horizon: str = Query("48h", description="How far ahead to predict, e.g. 90m, 48h or 2d"),
+    at: Optional[datetime] = Query(None, description="Predict from this time instead of now"),
+    type: Optional[str] = None,
+    full_within_horizon: bool = Query(False, description="Only containers predicted to be full within the horizon"),
+):
+    """
+    Predicted fill level at the end of the horizon and time until full for
+    every container, from its fill rate since it was last emptied.
+    """
+    horizon_delta = parse_horizon(horizon)
+    if horizon_delta is None:
+        raise HTTPException(status_code=422, detail="horizon must look like 90m, 48h or 2d")
+    if not fill_forecast.ready:
+        raise HTTPException(status_code=503, detail="Fill rates are still loading")
+    spatial_index.ensure_loaded()
+    entries = spatial_index.in_bbox(-90, -180, 90, 180, type)
+    forecasts = fill_forecast.predict(entries, at or datetime.utcnow(), horizon_delta)
+    if full_within_horizon:
+        forecasts = [forecast for forecast in forecasts if forecast["full_within_horizon"]]
+    return forecasts
+
+@router.get("/urgent", response_model=List[UrgentContainerResponse])
+def get_urgent_containers(
+    type: Optional[str] = None,
+    k: int = Query(50, ge=1, le=1000),
+):
+    """
+    The k containers whose pickup is most urgent (highest CO2 cost of a
+    delay, then fullest), from the in-memory urgency heaps.
+    """
+    spatial_index.ensure_loaded()
+    return [
+        {**entry._asdict(), "fill_ratio": round(ratio, 4), "delay_co2_kg": round(cost, 3)}
+        for entry, ratio, cost in urgency_queue.top(k, type)
+    ]
 
 @router.get("/{container_id}", response_model=ContainerResponse)
-def read_container(container_id: int, db: Session = Depends(get_db)):
-    db_container = get_container(db, container_id)
+async def read_container(container_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_container = await get_container_async(db, container_id)
     if not db_container:
         raise HTTPException(status_code=404, detail="Container not found")
     return db_container
 
+# The in-memory indexes take locks that a concurrent index load holds for a while,
+# so the async handlers update them on a worker thread instead of the event loop
+def container_changed(db_container):
+    reading_index.update_container(db_container)
+    spatial_index.update_container(db_container)
+    snapshot_cache.invalidate()
+
+def container_removed(container_id):
+    reading_index.remove_container(container_id)
+    spatial_index.remove_container(container_id)
+    snapshot_cache.invalidate()
+
 @router.post("/", response_model=ContainerResponse)
-def add_container(container: ContainerCreate, db: Session = Depends(get_db)):
-    return create_container(db, container)
+async def add_container(container: ContainerCreate, db: AsyncSession = Depends(get_async_db)):
+    db_container = await create_container_async(db, container)
+    await run_in_threadpool(container_changed, db_container)
+    return db_container
 
 @router.put("/{container_id}", response_model=ContainerResponse)
-def edit_container(container_id: int, container: ContainerUpdate, db: Session = Depends(get_db)):
-    db_container = update_container(db, container_id, container)
+async def edit_container(container_id: int, container: ContainerUpdate, db: AsyncSession = Depends(get_async_db)):
+    db_container = await update_container_async(db, container_id, container)
     if not db_container:
         raise HTTPException(status_code=404, detail="Container not found")
+    await run_in_threadpool(container_changed, db_container)
     return db_container
 
 @router.delete("/{container_id}", response_model=ContainerResponse)
-def remove_container(container_id: int, db: Session = Depends(get_db)):
-    db_container = delete_container(db, container_id)
+async def remove_container(container_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_container = await delete_container_async(db, container_id)
     if not db_container:
         raise HTTPException(status_code=404, detail="Container not found")
+    await run_in_threadpool(container_removed, container_id)
     return db_container
 
 @router.get("/{container_id}/co2", response_model=float)
-def get_co2_estimate(container_id: int, delayed_hours: int = 0, db: Session = Depends(get_db)):
-    db_container = get_container(db, container_id)
+async def get_co2_estimate(container_id: int, delayed_hours: int = 0, db: AsyncSession = Depends(get_async_db)):
+    db_container = await get_container_async(db, container_id)
     if not db_container:
         raise HTTPException(status_code=404, detail="Container not found")
     return estimate_co2_emission(
@@ -64,94 +204,223 @@ def get_co2_estimate(container_id: int, delayed_hours: int = 0, db: Session = De
         delayed_hours=delayed_hours
     )
 
+@router.get("/co2/summary", response_model=Co2SummaryResponse)
+async def get_co2_summary(
+    delayed_hours: List[int] = Query([1, 6, 24]),
+    group_by: Optional[Literal["type", "postal_code", "tile"]] = None,
+    zoom: int = Query(12, ge=0, le=22),
+    type: Optional[str] = None,
+    min_fill_ratio: Optional[float] = Query(None, ge=0),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Extra CO2 from delayed unloading summed over all containers (or those of one
+    type / at least min_fill_ratio full), one total per delayed_hours scenario.
+    group_by adds totals per container type, postal code of the address, or map tile at `zoom`.
+    """
+    return summarize_co2(await get_co2_inputs_async(db, type, min_fill_ratio), delayed_hours, group_by, zoom)
+
+@router.get("/collections/stats", response_model=CollectionStatsResponse)
+def get_fleet_collection_stats(
+    from_timestamp: Optional[datetime] = Query(None, alias="from"),
+    to_timestamp: Optional[datetime] = Query(None, alias="to"),
+    type: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Pickup counts, collected litres and average time between pickups of the
+    fleet and per container type, from the collection events the import records.
+    """
+    return get_collection_stats(db, from_timestamp, to_timestamp, type)
+
+@router.get("/{container_id}/collections", response_model=List[CollectionEventResponse])
+def get_container_collections(
+    container_id: int,
+    from_timestamp: Optional[datetime] = Query(None, alias="from"),
+    to_timestamp: Optional[datetime] = Query(None, alias="to"),
+    limit: int = Query(1000, ge=1, le=10000),
+    db: Session = Depends(get_db)
+):
+    """
+    Pickups of a container, newest first.
+    """
+    if get_container(db, container_id) is None:
+        raise HTTPException(status_code=404, detail="Container not found")
+    return get_collection_events(db, container_id, from_timestamp, to_timestamp, limit)
+
 @router.get("/{container_id}/readings", response_model=List[ContainerReadingResponse])
-def get_container_readings(container_id: int, db: Session = Depends(get_db)):
-    readings = get_readings_by_container(db, container_id)
+async def get_container_readings(
+    container_id: int,
+    response: Response,
+    after_id: Optional[int] = Query(None, description="Continue after this reading (readings are returned newest first)"),
+    limit: int = Query(1000, ge=1, le=10000),
+    from_timestamp: Optional[datetime] = Query(None, alias="from"),
+    to_timestamp: Optional[datetime] = Query(None, alias="to"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    readings = await get_readings_by_container_async(db, container_id, after_id, limit, from_timestamp, to_timestamp)
+    if len(readings) == limit:
+        response.headers[NEXT_PAGE_HEADER] = str(readings[-1].reading_id)
     return readings
 
+@router.get("/{container_id}/readings/aggregate", response_model=List[ReadingAggregateResponse])
+async def get_container_reading_aggregates(
+    container_id: int,
+    bucket: Literal["1h", "1d"] = "1h",
+    from_timestamp: Optional[datetime] = Query(None, alias="from"),
+    to_timestamp: Optional[datetime] = Query(None, alias="to"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Min/max/avg/last fill level of a container per hour or day, served from the rollup tables.
+    """
+    return await get_reading_aggregates_async(db, bucket, [container_id], from_timestamp, to_timestamp)
+
+@router.get("/readings/aggregate", response_model=List[ReadingAggregateResponse])
+async def get_reading_aggregates_for_containers(
+    container_id: Optional[List[int]] = Query(None, description="Repeat for several containers; all containers if omitted"),
+    bucket: Literal["1h", "1d"] = "1h",
+    from_timestamp: Optional[datetime] = Query(None, alias="from"),
+    to_timestamp: Optional[datetime] = Query(None, alias="to"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Hourly or daily fill level aggregates of several containers, ordered by container and bucket.
+    """
+    return await get_reading_aggregates_async(db, bucket, container_id, from_timestamp, to_timestamp)
+
+def nearest_readings_snapshot(db: Session, timestamp: datetime, tolerance: Optional[timedelta] = None):
+    # Served from memory once the reading index is loaded
+    if reading_index.ready:
+        readings = reading_index.as_of(timestamp, tolerance)
+    else:
+        readings = get_readings_as_of(db, timestamp, tolerance)
+
+    result = [
+        {
+            "container_id": reading.container_id,
+            "reading_id": reading.reading_id,
+            "timestamp": reading.timestamp,
+            "fill_level": reading.fill_level_litres,
+            "location": reading.address,
+            "coordinates": {
+                "latitude": reading.location_lat,
+                "longitude": reading.location_lng
+            }
+        }
+        for reading in readings
+    ]
+    return {"readings": result}
+
 @router.get("/readings/nearest")
 def get_nearest_readings(
     timestamp: datetime,
+    tolerance: Optional[timedelta] = Query(None, description="Only use readings at most this long before the timestamp"),
     db: Session = Depends(get_db)
 ):
     """
-    Get the nearest readings for all unique containers to the provided timestamp.
+    Get the latest reading at or before the provided timestamp for every container.
     Returns container locations and fullness data.
+    Repeated requests are answered from the snapshot cache; only with
+    SNAPSHOT_CACHE_BUCKET_SECONDS set is the timestamp rounded down to its cache bucket.
     """
     try:
-        # Subquery to find the closest reading for each container
-        subquery = (
-            db.query(
-                ContainerReading.container_id,
-                func.max(ContainerReading.reading_id).label("latest_id")
-            )
-            .filter(ContainerReading.timestamp <= timestamp)
-            .group_by(ContainerReading.container_id)
-            .subquery()
-        )
-
-        # Join with container_readings to get the actual readings
-        readings_query = (
-            db.query(ContainerReading)
-            .join(subquery, and_(
-                ContainerReading.container_id == subquery.c.container_id,
-                ContainerReading.reading_id == subquery.c.latest_id
-            ))
-        )
-        
-        # Get the containers info
-        containers = {
-            c.id: c for c in db.query(Container).filter(
-                Container.id.in_([r.container_id for r in readings_query])
-            )
-        }
-        
-        # Format the results
-        result = []
-        for reading in readings_query:
-            container = containers.get(reading.container_id)
-            if container:
-                result.append({
-                    "container_id": reading.container_id,
-                    "reading_id": reading.reading_id,
-                    "timestamp": reading.timestamp,
-                    "fill_level": reading.fill_level_litres,
-                    "location": container.address,
-                    "coordinates": {
-                        "latitude": container.location_lat,
-                        "longitude": container.location_lng
-                    }
-                })
-
-        return {"readings": result}
+        if not snapshot_cache.enabled:
+            return nearest_readings_snapshot(db, timestamp, tolerance)
+
+        key, snapshot_at = snapshot_cache.key(timestamp, tolerance)
+        body = snapshot_cache.get(key)
+        if body is None:
+            generation = snapshot_cache.generation
+            body = JSONResponse(jsonable_encoder(nearest_readings_snapshot(db, snapshot_at, tolerance))).body
+            snapshot_cache.put(key, body, generation)
+        return Response(content=body, media_type="application/json")
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve nearest readings: {str(e)}")
 
+def timestamp_range_response(stats):
+    # Handle case where there are no readings
+    if stats is None:
+        return {
+            "min_timestamp": None,
+            "max_timestamp": None,
+            "reading_count": 0,
+            "latest_fill": None,
+            "message": "No container readings found in the database"
+        }
+
+    return {
+        "min_timestamp": stats.min_timestamp,
+        "max_timestamp": stats.max_timestamp,
+        "reading_count": stats.reading_count,
+        "latest_fill": stats.latest_fill
+    }
+
 @router.get("/readings/timestamp-range")
-def get_timestamp_range(db: Session = Depends(get_db)):
+async def get_timestamp_range(db: AsyncSession = Depends(get_async_db)):
     """
     Get the minimum (earliest) and maximum (latest) timestamps from all container readings.
+    Answered from the statistics the CSV import maintains, without scanning the readings.
     """
     try:
-        # Query to find the minimum and maximum timestamps
-        result = db.query(
-            func.min(ContainerReading.timestamp).label("min_timestamp"),
-            func.max(ContainerReading.timestamp).label("max_timestamp")
-        ).first()
-        
-        # Handle case where there are no readings
-        if result.min_timestamp is None or result.max_timestamp is None:
-            return {
-                "min_timestamp": None,
-                "max_timestamp": None,
-                "message": "No container readings found in the database"
-            }
-        
-        return {
-            "min_timestamp": result.min_timestamp,
-            "max_timestamp": result.max_timestamp
-        }
+        return timestamp_range_response(await get_reading_stats_async(db))
     
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to retrieve timestamp range: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Failed to retrieve timestamp range: {str(e)}")
+
+@router.get("/{container_id}/readings/timestamp-range")
+async def get_container_timestamp_range(container_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    Get the earliest and latest reading timestamps, the number of readings
+    and the latest fill level of one container.
+    """
+    if container_id == GLOBAL_STATS_ID or not await get_container_async(db, container_id):
+        raise HTTPException(status_code=404, detail="Container not found")
+    try:
+        return timestamp_range_response(await get_reading_stats_async(db, container_id))
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to retrieve timestamp range: {str(e)}")
+
+EXPORT_FORMATS = {
+    "ndjson": (iter_ndjson, "application/x-ndjson"),
+    "csv": (iter_csv, "text/csv"),
+}
+
+@router.get("/readings/export")
+def export_readings(
+    container_id: Optional[List[int]] = Query(None, description="Repeat to export several containers; all containers if omitted"),
+    from_timestamp: Optional[datetime] = Query(None, alias="from"),
+    to_timestamp: Optional[datetime] = Query(None, alias="to"),
+    format: Literal["ndjson", "csv"] = "ndjson",
+):
+    """
+    Stream reading history as NDJSON or CSV, ordered by container and timestamp.
+    Rows are read through a server-side cursor and sent in chunks, so memory
+    use does not depend on the size of the export.
+    """
+    iter_rows, media_type = EXPORT_FORMATS[format]
+    return StreamingResponse(
+        iter_rows(container_id, from_timestamp, to_timestamp),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="readings.{format}"'},
+    )
+
+@router.get("/readings/export/columnar")
+def export_readings_columnar(
+    container_id: Optional[List[int]] = Query(None, description="Repeat to export several containers; all containers if omitted"),
+    from_timestamp: Optional[datetime] = Query(None, alias="from"),
+    to_timestamp: Optional[datetime] = Query(None, alias="to"),
+    format: Literal["arrow", "parquet"] = "parquet",
+):
+    """
+    Stream readings joined with their container metadata as a Parquet file
+    or an Arrow IPC stream, written in record batches for analytics tools.
+    """
+    media_type, extension = ARROW_FORMATS[format]
+    return StreamingResponse(
+        iter_export_bytes(format, container_id, from_timestamp, to_timestamp),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="readings.{extension}"'},
+    )
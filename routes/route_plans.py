@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from database import get_db
+from schemas.route_plan import RoutePlanRequest, RoutePlanResponse
+from services.route_plan_store import route_plan_store
+
+router = APIRouter()
+
+@router.post("/plan", response_model=RoutePlanResponse)
+def plan_collection_routes(request: RoutePlanRequest, db: Session = Depends(get_db)):
+    """
+    Collection tours for the fleet, covering every container filled to at
+    least min_fill_ratio of its capacity. Each truck starts at its location;
+    the glass collected per colour stays within the truck's capacity for it.
+    The plan becomes the current plan, which follows later fill and truck changes.
+    """
+    plan = route_plan_store.plan(db, request.dict())
+    if plan is None:
+        raise HTTPException(status_code=404, detail="No trucks found")
+    return plan
+
+@router.get("/plan/current", response_model=RoutePlanResponse)
+def get_current_route_plan():
+    """The last plan, updated incrementally for containers and trucks that changed since."""
+    plan = route_plan_store.current()
+    if plan is None:
+        raise HTTPException(status_code=404, detail="No route plan yet")
+    return plan
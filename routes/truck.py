@@ -1,38 +1,43 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
-from database import get_db
+from database import get_async_db
 from schemas.truck import Truck, TruckCreate, TruckUpdate
 from crud import truck as truck_crud
+from services.route_plan_store import route_plan_store
 
 router = APIRouter()
 
 @router.post("/trucks/", response_model=Truck)
-def create_truck(truck: TruckCreate, db: Session = Depends(get_db)):
-    return truck_crud.create_truck(db=db, truck=truck)
+async def create_truck(truck: TruckCreate, db: AsyncSession = Depends(get_async_db)):
+    db_truck = await truck_crud.create_truck_async(db=db, truck=truck)
+    route_plan_store.truck_changed(db_truck.id)
+    return db_truck
 
 @router.get("/trucks/", response_model=List[Truck])
-def read_trucks(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    trucks = truck_crud.get_trucks(db, skip=skip, limit=limit)
+async def read_trucks(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_async_db)):
+    trucks = await truck_crud.get_trucks_async(db, skip=skip, limit=limit)
     return trucks
 
 @router.get("/trucks/{truck_id}", response_model=Truck)
-def read_truck(truck_id: int, db: Session = Depends(get_db)):
-    db_truck = truck_crud.get_truck(db, truck_id=truck_id)
+async def read_truck(truck_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_truck = await truck_crud.get_truck_async(db, truck_id=truck_id)
     if db_truck is None:
         raise HTTPException(status_code=404, detail="Truck not found")
     return db_truck
 
 @router.put("/trucks/{truck_id}", response_model=Truck)
-def update_truck(truck_id: int, truck: TruckUpdate, db: Session = Depends(get_db)):
-    db_truck = truck_crud.update_truck(db, truck_id=truck_id, truck=truck)
+async def update_truck(truck_id: int, truck: TruckUpdate, db: AsyncSession = Depends(get_async_db)):
+    db_truck = await truck_crud.update_truck_async(db, truck_id=truck_id, truck=truck)
     if db_truck is None:
         raise HTTPException(status_code=404, detail="Truck not found")
+    route_plan_store.truck_changed(truck_id)
     return db_truck
 
 @router.delete("/trucks/{truck_id}")
-def delete_truck(truck_id: int, db: Session = Depends(get_db)):
-    success = truck_crud.delete_truck(db, truck_id=truck_id)
+async def delete_truck(truck_id: int, db: AsyncSession = Depends(get_async_db)):
+    success = await truck_crud.delete_truck_async(db, truck_id=truck_id)
     if not success:
         raise HTTPException(status_code=404, detail="Truck not found")
-    return {"message": "Truck deleted successfully"}
\ No newline at end of file
+    route_plan_store.truck_changed(truck_id)
+    return {"message": "Truck deleted successfully"}
@@ -0,0 +1,28 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import List, Optional
+
+class CollectionEventResponse(BaseModel):
+    container_id: int
+    timestamp: datetime  # First reading after the pickup
+    previous_timestamp: datetime
+    fill_before: int
+    fill_after: int
+
+    class Config:
+        orm_mode = True
+
+class CollectionStats(BaseModel):
+    event_count: int
+    container_count: int
+    collected_litres: int
+    avg_fill_before: Optional[float]
+    avg_hours_between_collections: Optional[float]  # None until a container was collected twice
+    first_collection: Optional[datetime]
+    last_collection: Optional[datetime]
+
+class CollectionTypeStats(CollectionStats):
+    type: str
+
+class CollectionStatsResponse(CollectionStats):
+    by_type: List[CollectionTypeStats]
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 class ContainerBase(BaseModel):
@@ -29,4 +29,33 @@ class ContainerResponse(ContainerBase):
     last_updated: datetime
 
     class Config:
-        orm_mode = True 
\ No newline at end of file
+        orm_mode = True 
+
+class ContainerNearResponse(ContainerResponse):
+    distance_m: float
+
+class UrgentContainerResponse(ContainerResponse):
+    fill_ratio: float
+    delay_co2_kg: float  # Extra CO2 if the pickup waits URGENCY_DELAY_HOURS longer
+
+class Co2GroupSummary(BaseModel):
+    key: str
+    container_count: int
+    total_kg: List[float]  # One total per delay scenario
+
+class Co2SummaryResponse(BaseModel):
+    delayed_hours: List[int]
+    container_count: int
+    total_kg: List[float]
+    groups: Optional[List[Co2GroupSummary]] = None
+
+class FillForecastResponse(BaseModel):
+    container_id: int
+    capacity: int
+    current_fill: int
+    fill_rate_per_hour: Optional[float]  # Litres per hour since the last emptying; None with too few readings
+    predicted_fill: int
+    predicted_fill_ratio: Optional[float]
+    full_at: Optional[datetime]
+    hours_to_full: Optional[float]
+    full_within_horizon: bool
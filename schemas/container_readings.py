@@ -10,4 +10,17 @@ class ContainerReadingResponse(ContainerReadingBase):
     reading_id: int
 
     class Config:
-        orm_mode = True 
\ No newline at end of file
+        orm_mode = True 
+
+class ReadingAggregateResponse(BaseModel):
+    container_id: int
+    bucket_start: datetime
+    reading_count: int
+    min_fill: int
+    max_fill: int
+    avg_fill: float
+    last_fill: int
+    last_timestamp: datetime
+
+    class Config:
+        orm_mode = True
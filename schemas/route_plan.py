@@ -0,0 +1,32 @@
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+
+class RoutePlanRequest(BaseModel):
+    truck_ids: Optional[List[int]] = Field(None, example=[1, 2])  # All trucks when omitted
+    min_fill_ratio: float = Field(0.5, ge=0, le=1, example=0.5)
+    container_type: Optional[str] = None
+    time_budget_seconds: float = Field(2.0, gt=0, le=30, example=2.0)
+    return_to_start: bool = True
+
+class RouteStop(BaseModel):
+    container_id: int
+    lat: float
+    lng: float
+    compartment: str
+    demand: int
+
+class TruckRoute(BaseModel):
+    truck_id: int
+    container_ids: List[int]
+    stops: List[RouteStop]
+    distance_m: float
+    load: Dict[str, int]
+    capacity: Dict[str, int]
+
+class RoutePlanResponse(BaseModel):
+    routes: List[TruckRoute]
+    unassigned_container_ids: List[int]  # Over the fleet's remaining capacity
+    skipped_container_ids: List[int]  # Type does not match a truck compartment
+    total_distance_m: float
+    elapsed_seconds: float
+    incremental_updates: int = 0  # Changes applied since the last full plan
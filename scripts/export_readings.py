@@ -0,0 +1,24 @@
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from services.arrow_export import write_export, ARROW_FORMATS
+
+if __name__ == "__main__":
+    # python -m scripts.export_readings readings.parquet [--format arrow] [--from ...] [--to ...] [--container-id N ...]
+    parser = argparse.ArgumentParser(description="Export container readings as Parquet or Arrow IPC.")
+    parser.add_argument("output", help="File to write")
+    parser.add_argument("--format", choices=sorted(ARROW_FORMATS), default=None,
+                        help="Defaults to arrow for .arrow/.arrows files and parquet otherwise")
+    parser.add_argument("--from", dest="from_timestamp", type=datetime.fromisoformat, default=None)
+    parser.add_argument("--to", dest="to_timestamp", type=datetime.fromisoformat, default=None)
+    parser.add_argument("--container-id", dest="container_ids", type=int, action="append", default=None)
+    args = parser.parse_args()
+
+    export_format = args.format or ("arrow" if args.output.endswith((".arrow", ".arrows")) else "parquet")
+    started = time.monotonic()
+    rows = sum(write_export(args.output, export_format, args.container_ids, args.from_timestamp, args.to_timestamp))
+    print(f"[EXPORT] Wrote {rows} readings to {args.output} in {time.monotonic() - started:.1f}s.")
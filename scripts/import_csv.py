@@ -1,9 +1,14 @@
+import codecs
 import csv
+import multiprocessing
 import os
 import pymysql
 from dotenv import load_dotenv
-from datetime import datetime
+from datetime import datetime, timedelta
 import time
+from itertools import islice
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 
 load_dotenv()
 
@@ -14,6 +19,13 @@ DB_PASSWORD = os.getenv("MYSQL_PASSWORD")
 DB_NAME = os.getenv("MYSQL_DB")
 DB_PORT = int(os.getenv("MYSQL_PORT", 3306)) 
 
+# Rows per chunk handed to the bulk writer; each chunk is one transaction
+CHUNK_SIZE = int(os.getenv("CSV_IMPORT_CHUNK_SIZE", 5000))
+# Worker processes for parallel imports; 1 keeps the import in-process
+IMPORT_WORKERS = int(os.getenv("CSV_IMPORT_WORKERS", 1))
+# Data directory (the csv_data volume in docker-compose) for files the import writes itself
+CSV_DATA_DIR = os.getenv("CSV_DATA_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "csv_data"))
+
 def get_db_connection():
     print("[CSV_IMPORT_DEBUG] Attempting to connect to database...")
     try:
@@ -31,371 +43,1023 @@ def get_db_connection():
         print(f"[CSV_IMPORT_DEBUG] Database connection failed: {e}")
         raise
 
-def convert_capacity_to_litres(capacity_m3_str):
-    try:
-        return float(capacity_m3_str.replace(',', '.')) * 1000
-    except ValueError:
-        print(f"Warning: Could not convert capacity '{capacity_m3_str}' to float. Using 0.")
-        return 0
+# German CSV column names mapped to the database column they feed
+COLUMN_MAPPING = {
+    'name': 'Label',
+    'address': 'Location',  # 'Location' in the CSV is stored as the container address
+    'location_lat': 'Latitude',
+    'location_lng': 'Longitude',
+    'date': 'Datum',
+    'time': 'Uhrzeit',
+    'fill_level': 'Füllstand',
+    'capacity': 'Containergröße',
+    'type': 'Container-Typ',
+}
 
-def convert_fill_to_litres(fill_m3_str):
+def column_indexes(header):
+    missing = [csv_name for csv_name in COLUMN_MAPPING.values() if csv_name not in header]
+    if missing:
+        raise ValueError(f"CSV header is missing columns: {', '.join(missing)}")
+    return {field: header.index(csv_name) for field, csv_name in COLUMN_MAPPING.items()}
+
+def parse_decimal_column(values):
+    """
+    Convert decimal strings that may use a comma separator to float64.
+    Unparseable values become NaN.
+    """
+    values = np.char.replace(np.char.strip(values), ',', '.')
     try:
-        return float(fill_m3_str.replace(',', '.')) * 1000
+        return values.astype(np.float64)
     except ValueError:
-        print(f"Warning: Could not convert fill level '{fill_m3_str}' to float. Using 0.")
-        return 0
+        # Only chunks that contain bad values take the per-element path
+        parsed = np.empty(len(values), dtype=np.float64)
+        for i, value in enumerate(values):
+            try:
+                parsed[i] = float(value)
+            except ValueError:
+                parsed[i] = np.nan
+        return parsed
 
-def parse_timestamp(date_str, time_str):
+def parse_timestamp_column(dates, times):
+    # Datum + Uhrzeit ('%Y-%m-%d', '%H:%M') to datetime64; unparseable values become NaT
+    combined = np.char.add(np.char.add(np.char.strip(dates), 'T'), np.char.strip(times))
     try:
-        return datetime.strptime(f"{date_str} {time_str}", "%Y-%m-%d %H:%M")
+        return combined.astype('datetime64[s]')
     except ValueError:
-        print(f"Warning: Could not parse date/time '{date_str} {time_str}'. Using current time.")
-        return datetime.now()
+        parsed = np.empty(len(combined), dtype='datetime64[s]')
+        for i, value in enumerate(combined):
+            try:
+                parsed[i] = np.datetime64(datetime.strptime(value, "%Y-%m-%dT%H:%M"), 's')
+            except ValueError:
+                parsed[i] = np.datetime64('NaT')
+        return parsed
 
-def import_data_from_csv(filepath, batch_size=100):
-    connection = None
-    try:
-        connection = get_db_connection()
-        with connection.cursor() as cursor:
-            batch = []
-            containers_cache = {}
-            
-            with open(filepath, mode='r', encoding='utf-8') as csvfile:
-                csv_reader = csv.DictReader(csvfile)
-                rows_processed = 0
-                
-                for row in csv_reader:
-                    try:
-                        # Process row and prepare data
-                        container_data = prepare_container_data(row)
-                        reading_data = prepare_reading_data(row)
-                        
-                        batch.append((container_data, reading_data))
-                        rows_processed += 1
-                        
-                        # Process batch when it reaches batch_size
-                        if len(batch) >= batch_size:
-                            process_batch(cursor, batch, containers_cache)
-                            connection.commit()
-                            print(f"[CSV_IMPORT_DEBUG] Committed batch of {batch_size} rows. Total processed: {rows_processed}")
-                            batch = []
-                            
-                    except Exception as e:
-                        print(f"[CSV_IMPORT_DEBUG] Error processing row: {e}")
-                        continue
-                
-                # Process remaining batch
-                if batch:
-                    process_batch(cursor, batch, containers_cache)
-                    connection.commit()
-                    
-            print(f"[CSV_IMPORT_DEBUG] Import completed. Total rows processed: {rows_processed}")
-            
-    except Exception as e:
-        print(f"[CSV_IMPORT_DEBUG] Fatal error during import: {e}")
-        if connection:
-            connection.rollback()
-    finally:
-        if connection:
-            connection.close()
+def parse_chunk(rows, indexes, field_count):
+    """
+    Parse a chunk of raw CSV rows column-wise.
+    Returns the valid rows as a dict of NumPy arrays and the rejected rows
+    as a list of (row, reason) tuples.
+    """
+    rejects = [(row, "wrong number of fields") for row in rows if len(row) != field_count]
+    if rejects:
+        rows = [row for row in rows if len(row) == field_count]
+    if not rows:
+        return None, rejects
 
-def process_batch(cursor, batch, containers_cache):
-    for container_data, reading_data in batch:
-        container_key = (container_data['name'], container_data['address'])
-        
-        # Get or create container with retry logic
-        retry_count = 0
-        max_retries = 3
-        while retry_count < max_retries:
-            try:
-                container_id = get_or_create_container(cursor, container_data, containers_cache, container_key)
-                # Insert reading with container_id
-                insert_reading(cursor, container_id, reading_data)
-                # Update container's current fill level
-                update_container_fill(cursor, container_id, reading_data)
-                break
-            except pymysql.OperationalError as e:
-                retry_count += 1
-                if retry_count == max_retries:
-                    raise
-                time.sleep(0.1 * retry_count)  # Exponential backoff
-
-def get_or_create_container(cursor, container_data, containers_cache, container_key):
-    if container_key in containers_cache:
-        return containers_cache[container_key]
-        
-    # Use SELECT ... FOR UPDATE to prevent race conditions
-    select_sql = "SELECT id FROM containers WHERE name = %s AND address = %s FOR UPDATE"
-    cursor.execute(select_sql, (container_data['name'], container_data['address']))
-    result = cursor.fetchone()
-    
-    if result:
-        container_id = result['id']
-    else:
-        insert_sql = """
-            INSERT INTO containers 
-            (name, address, location_lat, location_lng, type, capacity, current_fill, last_updated)
-            VALUES (%(name)s, %(address)s, %(location_lat)s, %(location_lng)s, 
-                    %(type)s, %(capacity)s, %(current_fill)s, %(last_updated)s)
-        """
-        cursor.execute(insert_sql, container_data)
-        container_id = cursor.lastrowid
-        
-    containers_cache[container_key] = container_id
-    return container_id
-
-def prepare_container_data(row):
-    # Map German CSV column names to internal Python variable names / database model names
-    column_mapping = {
-        'csv_name': 'Label',
-        'csv_address': 'Location', # This is 'Location' in CSV, will map to 'address' in DB
-        'csv_latitude': 'Latitude',
-        'csv_longitude': 'Longitude',
-        'csv_date': 'Datum',
-        'csv_time': 'Uhrzeit',
-        'csv_fill_level': 'Füllstand',
-        'csv_capacity': 'Containergröße',
-        'csv_type': 'Container-Typ'
-    }
-    
-    # Extract and convert data
-    name = row[column_mapping['csv_name']]
-    address = row[column_mapping['csv_address']]
-    location_lat = float(row[column_mapping['csv_latitude']].replace(',', '.'))
-    location_lng = float(row[column_mapping['csv_longitude']].replace(',', '.'))
-    type_ = row[column_mapping['csv_type']]
-    capacity = convert_capacity_to_litres(row[column_mapping['csv_capacity']])
-    current_fill = convert_fill_to_litres(row[column_mapping['csv_fill_level']])
-    last_updated = parse_timestamp(row[column_mapping['csv_date']], row[column_mapping['csv_time']])
-    
-    return {
-        'name': name,
-        'address': address,
-        'location_lat': location_lat,
-        'location_lng': location_lng,
-        'type': type_,
-        'capacity': capacity,
-        'current_fill': current_fill,
-        'last_updated': last_updated
-    }
+    raw = list(zip(*rows))
+    location_lat = parse_decimal_column(np.array(raw[indexes['location_lat']]))
+    location_lng = parse_decimal_column(np.array(raw[indexes['location_lng']]))
+    capacity = parse_decimal_column(np.array(raw[indexes['capacity']])) * 1000
+    fill_level = parse_decimal_column(np.array(raw[indexes['fill_level']])) * 1000
+    timestamp = parse_timestamp_column(np.array(raw[indexes['date']]), np.array(raw[indexes['time']]))
+
+    checks = [
+        (np.isnan(location_lat), "invalid Latitude"),
+        (np.isnan(location_lng), "invalid Longitude"),
+        (np.isnan(capacity), "invalid Containergröße"),
+        (np.isnan(fill_level), "invalid Füllstand"),
+        (np.isnat(timestamp), "invalid Datum/Uhrzeit"),
+    ]
+    invalid = np.zeros(len(rows), dtype=bool)
+    for failed, _ in checks:
+        invalid |= failed
+    if invalid.any():
+        for i in np.flatnonzero(invalid):
+            reason = next(reason for failed, reason in checks if failed[i])
+            rejects.append((rows[i], reason))
+    valid = ~invalid
 
-def prepare_reading_data(row):
-    # Map German CSV column names to internal Python variable names / database model names
-    column_mapping = {
-        'csv_name': 'Label',
-        'csv_address': 'Location', # This is 'Location' in CSV, will map to 'address' in DB
-        'csv_latitude': 'Latitude',
-        'csv_longitude': 'Longitude',
-        'csv_date': 'Datum',
-        'csv_time': 'Uhrzeit',
-        'csv_fill_level': 'Füllstand',
-        'csv_capacity': 'Containergröße',
-        'csv_type': 'Container-Typ'
+    columns = {
+        'name': np.array(raw[indexes['name']], dtype=object)[valid],
+        'address': np.array(raw[indexes['address']], dtype=object)[valid],
+        'location_lat': location_lat[valid],
+        'location_lng': location_lng[valid],
+        'type': np.array(raw[indexes['type']], dtype=object)[valid],
+        'capacity': np.rint(capacity[valid]).astype(np.int64),
+        'fill_level_litres': np.rint(fill_level[valid]).astype(np.int64),
+        'timestamp': timestamp[valid],
     }
-    
-    # Extract and convert data
-    date = row[column_mapping['csv_date']]
-    time = row[column_mapping['csv_time']]
-    fill_level = convert_fill_to_litres(row[column_mapping['csv_fill_level']])
-    
-    timestamp = parse_timestamp(date, time)
-    
+    return (columns if valid.any() else None), rejects
+
+def iter_chunks(rows, chunk_size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+class StreamRowDecoder:
+    """
+    Turns arbitrary byte chunks of a CSV body into complete rows. Only the
+    trailing partial line is kept between calls; quoted fields must not
+    contain newlines.
+    """
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._pending = ''
+
+    def feed(self, data):
+        lines = (self._pending + self._decoder.decode(data)).split('\n')
+        self._pending = lines.pop()
+        return [row for row in csv.reader(lines) if row]
+
+    def flush(self):
+        lines = [self._pending + self._decoder.decode(b'', final=True)]
+        self._pending = ''
+        return [row for row in csv.reader(lines) if row]
+
+def rejects_path_for(filepath, part=None):
+    suffix = f".rejects.part{part}.csv" if part is not None else ".rejects.csv"
+    return filepath + suffix
+
+class RejectsWriter:
+    """
+    Collects rows that failed to parse in a CSV file next to the import,
+    with the reason as an extra column. The file is only created on the first
+    reject; with append=True an existing file from an interrupted run is continued.
+
+    Rejects of a chunk are staged with add() and only written by flush()
+    once the chunk is committed, so a chunk that is rolled back and later
+    read again from the checkpoint does not leave them in the file twice.
+    """
+
+    def __init__(self, path, header, append=False):
+        self.path = path
+        self.header = header
+        self.append = append
+        self.count = 0
+        self.pending = []
+        self._file = None
+        self._writer = None
+
+    def add(self, rejects):
+        self.pending.extend(rejects)
+        self.count += len(rejects)
+
+    def discard(self):
+        self.count -= len(self.pending)
+        self.pending = []
+
+    def flush(self):
+        rejects, self.pending = self.pending, []
+        if not rejects:
+            return
+        if self._file is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            continued = self.append and os.path.exists(self.path)
+            self._file = open(self.path, mode='a' if continued else 'w', encoding='utf-8', newline='')
+            self._writer = csv.writer(self._file)
+            if not continued:
+                self._writer.writerow(list(self.header) + ['reason'])
+        self._writer.writerows(list(row) + [reason] for row, reason in rejects)
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+def ensure_schema(cursor):
+    # Table definitions match models/container.py and models/container_readings.py
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS containers (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            address VARCHAR(255) NOT NULL DEFAULT '',
+            location_lat FLOAT NOT NULL,
+            location_lng FLOAT NOT NULL,
+            type VARCHAR(50) NOT NULL,
+            capacity INT NOT NULL,
+            current_fill INT NOT NULL,
+            last_updated DATETIME NOT NULL,
+            UNIQUE KEY uq_container_name_address (name, address)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS container_readings (
+            reading_id INT AUTO_INCREMENT PRIMARY KEY,
+            container_id INT NOT NULL,
+            timestamp DATETIME NOT NULL,
+            fill_level_litres INT NOT NULL,
+            UNIQUE KEY uq_container_timestamp (container_id, timestamp),
+            FOREIGN KEY (container_id) REFERENCES containers(id) ON DELETE CASCADE
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+    """)
+
+    for table in ROLLUP_TABLES:
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                container_id INT NOT NULL,
+                bucket_start DATETIME NOT NULL,
+                reading_count INT NOT NULL,
+                min_fill INT NOT NULL,
+                max_fill INT NOT NULL,
+                sum_fill BIGINT NOT NULL,
+                last_timestamp DATETIME NOT NULL,
+                last_fill INT NOT NULL,
+                PRIMARY KEY (container_id, bucket_start),
+                FOREIGN KEY (container_id) REFERENCES containers(id) ON DELETE CASCADE
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS container_reading_stats (
+            container_id INT NOT NULL PRIMARY KEY,
+            min_timestamp DATETIME NOT NULL,
+            max_timestamp DATETIME NOT NULL,
+            reading_count BIGINT NOT NULL,
+            latest_fill INT NOT NULL
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+    """)
+
+    cursor.execute("SHOW TABLES LIKE 'collection_events'")
+    collection_events_created = cursor.fetchone() is None
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS collection_events (
+            container_id INT NOT NULL,
+            timestamp DATETIME NOT NULL,
+            previous_timestamp DATETIME NOT NULL,
+            fill_before INT NOT NULL,
+            fill_after INT NOT NULL,
+            PRIMARY KEY (container_id, timestamp),
+            INDEX ix_collection_events_timestamp (timestamp),
+            FOREIGN KEY (container_id) REFERENCES containers(id) ON DELETE CASCADE
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+    """)
+
+    # The bulk upsert relies on uq_container_name_address and idempotent reading
+    # inserts on uq_container_timestamp; older tables may lack either key
+    index_statements = [
+        "ALTER TABLE containers ADD UNIQUE KEY uq_container_name_address (name, address)",
+        "ALTER TABLE container_readings ADD UNIQUE KEY uq_container_timestamp (container_id, timestamp)",
+        "ALTER TABLE container_readings ADD INDEX idx_timestamp (timestamp)",
+    ]
+    for index_sql in index_statements:
+        try:
+            cursor.execute(index_sql)
+        except pymysql.Error as e:
+            if "Duplicate key name" in str(e):
+                continue
+            if "Duplicate entry" in str(e) and "uq_container_timestamp" in index_sql:
+                # Earlier imports stored the same reading several times; keep the first copy
+                print("[CSV_IMPORT] Removing duplicate readings before adding uq_container_timestamp...")
+                cursor.execute("""
+                    DELETE r1 FROM container_readings r1
+                    JOIN container_readings r2
+                        ON r1.container_id = r2.container_id
+                        AND r1.timestamp = r2.timestamp
+                        AND r1.reading_id > r2.reading_id
+                """)
+                cursor.execute(index_sql)
+                continue
+            print(f"[CSV_IMPORT] Could not apply '{index_sql}': {e}")
+
+    # Readings stored before the rollup, stats and pickup tables existed are aggregated once;
+    # collection_events may legitimately stay empty, so it is only filled when just created
+    for table, rebuild in (("container_readings_hourly", rebuild_rollups), ("container_reading_stats", rebuild_reading_stats)):
+        cursor.execute(f"SELECT EXISTS(SELECT 1 FROM {table}) AS maintained")
+        if cursor.fetchone()['maintained']:
+            continue
+        cursor.execute("SELECT EXISTS(SELECT 1 FROM container_readings) AS has_readings")
+        if cursor.fetchone()['has_readings']:
+            print(f"[CSV_IMPORT] Aggregating the existing readings into {table}...")
+            rebuild(cursor)
+    if collection_events_created:
+        cursor.execute("SELECT EXISTS(SELECT 1 FROM container_readings) AS has_readings")
+        if cursor.fetchone()['has_readings']:
+            print("[CSV_IMPORT] Detecting pickups in the existing readings...")
+            rebuild_collection_events(cursor)
+
+# Rollup tables of container_readings (models/container_reading_rollup.py)
+ROLLUP_TABLES = ("container_readings_hourly", "container_readings_daily")
+
+# Newest value of a column within a group: the first element of a descending GROUP_CONCAT
+LAST_VALUE_SQL = "CAST(SUBSTRING_INDEX(GROUP_CONCAT({value} ORDER BY {order} DESC), ',', 1) AS SIGNED)"
+
+ROLLUP_UPSERT_SQL = """
+    ON DUPLICATE KEY UPDATE
+        reading_count = VALUES(reading_count),
+        min_fill = VALUES(min_fill),
+        max_fill = VALUES(max_fill),
+        sum_fill = VALUES(sum_fill),
+        last_timestamp = VALUES(last_timestamp),
+        last_fill = VALUES(last_fill)
+"""
+
+def hourly_rollup_sql(where):
+    return f"""
+        INSERT INTO container_readings_hourly
+            (container_id, bucket_start, reading_count, min_fill, max_fill, sum_fill, last_timestamp, last_fill)
+        SELECT container_id, TIMESTAMP(DATE(timestamp), MAKETIME(HOUR(timestamp), 0, 0)) AS hour_start,
+            COUNT(*), MIN(fill_level_litres), MAX(fill_level_litres), SUM(fill_level_litres), MAX(timestamp),
+            {LAST_VALUE_SQL.format(value='fill_level_litres', order='timestamp')}
+        FROM container_readings
+        WHERE {where}
+        GROUP BY container_id, hour_start
+    """ + ROLLUP_UPSERT_SQL
+
+def daily_rollup_sql(where):
+    return f"""
+        INSERT INTO container_readings_daily
+            (container_id, bucket_start, reading_count, min_fill, max_fill, sum_fill, last_timestamp, last_fill)
+        SELECT container_id, DATE(bucket_start) AS day_start,
+            SUM(reading_count), MIN(min_fill), MAX(max_fill), SUM(sum_fill), MAX(last_timestamp),
+            {LAST_VALUE_SQL.format(value='last_fill', order='last_timestamp')}
+        FROM container_readings_hourly
+        WHERE {where}
+        GROUP BY container_id, day_start
+    """ + ROLLUP_UPSERT_SQL
+
+def rebuild_rollups(cursor):
+    cursor.execute(hourly_rollup_sql("TRUE"))
+    cursor.execute(daily_rollup_sql("TRUE"))
+
+def summarize_chunk(ids, timestamps, fills):
+    """
+    Per container in a chunk, ordered by container id: the first and last
+    timestamp and the fill level of the last reading, as arrays.
+    """
+    order = np.lexsort((timestamps, ids))
+    sorted_ids = ids[order]
+    boundaries = sorted_ids[1:] != sorted_ids[:-1]
+    first = order[np.append(True, boundaries)]
+    last = order[np.append(boundaries, True)]
+    return ids[first], timestamps[first], timestamps[last], fills[last]
+
+def bucket_ranges(container_ids, first, last, unit):
+    # Start of the first and end of the last `unit` ('h' or 'D') bucket per container
+    starts = first.astype(f'datetime64[{unit}]').astype('datetime64[s]')
+    ends = (last.astype(f'datetime64[{unit}]') + np.timedelta64(1, unit)).astype('datetime64[s]')
+    return list(zip(container_ids.tolist(), starts.tolist(), ends.tolist()))
+
+def ranges_filter(ranges, column):
+    where = " OR ".join([f"(container_id = %s AND {column} >= %s AND {column} < %s)"] * len(ranges))
+    return where, [value for time_range in ranges for value in time_range]
+
+def hourly_reading_counts(cursor, where, params, for_update=False):
+    cursor.execute(
+        f"SELECT container_id, SUM(reading_count) AS reading_count FROM container_readings_hourly "
+        f"WHERE {where} GROUP BY container_id" + (" FOR UPDATE" if for_update else ""),
+        params,
+    )
+    return {row['container_id']: int(row['reading_count']) for row in cursor.fetchall()}
+
+def update_rollups(cursor, summary):
+    """
+    Recompute the hourly and daily buckets touched by a chunk from the stored
+    rows, in the chunk's transaction. Recomputing instead of adding the chunk's
+    values keeps re-imported and corrected readings from being counted twice.
+    Returns the number of readings the chunk added per container.
+    """
+    container_ids, first, last, _ = summary
+    hours = bucket_ranges(container_ids, first, last, 'h')
+    readings_where, params = ranges_filter(hours, "timestamp")
+    hourly_where, _ = ranges_filter(hours, "bucket_start")
+    # Locking read, so a concurrent worker cannot add to these hours before the recompute
+    counts_before = hourly_reading_counts(cursor, hourly_where, params, for_update=True)
+    cursor.execute(hourly_rollup_sql(readings_where), params)
+    counts_after = hourly_reading_counts(cursor, hourly_where, params)
+
+    # Daily buckets are summed from the hourly ones that were just refreshed
+    daily_where, params = ranges_filter(bucket_ranges(container_ids, first, last, 'D'), "bucket_start")
+    cursor.execute(daily_rollup_sql(daily_where), params)
+
     return {
-        'timestamp': timestamp,
-        'fill_level_litres': fill_level
+        container_id: counts_after.get(container_id, 0) - counts_before.get(container_id, 0)
+        for container_id in container_ids.tolist()
     }
 
-def insert_reading(cursor, container_id, reading_data):
-    insert_reading_sql = "INSERT INTO container_readings (container_id, timestamp, fill_level_litres) VALUES (%s, %s, %s)"
-    reading_values = (container_id, reading_data['timestamp'], reading_data['fill_level_litres'])
-    cursor.execute(insert_reading_sql, reading_values)
+# container_reading_stats (models/container_reading_stats.py); this row covers all containers
+GLOBAL_STATS_ID = 0
+
+READING_STATS_UPSERT_SQL = """
+    INSERT INTO container_reading_stats (container_id, min_timestamp, max_timestamp, reading_count, latest_fill)
+    VALUES (%s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        latest_fill = IF(VALUES(max_timestamp) >= max_timestamp, VALUES(latest_fill), latest_fill),
+        min_timestamp = LEAST(min_timestamp, VALUES(min_timestamp)),
+        max_timestamp = GREATEST(max_timestamp, VALUES(max_timestamp)),
+        reading_count = reading_count + VALUES(reading_count)
+"""
+
+def update_reading_stats(cursor, summary, added_counts):
+    """
+    Fold a chunk into the per-container and global reading stats. latest_fill
+    is assigned before max_timestamp, because MySQL applies the assignments in order.
+    """
+    container_ids, first, last, last_fills = summary
+    newest = int(np.argmax(last))
+    rows = [
+        (container_id, first_timestamp, last_timestamp, added_counts[container_id], fill)
+        for container_id, first_timestamp, last_timestamp, fill in zip(
+            container_ids.tolist(), first.tolist(), last.tolist(), last_fills.tolist(),
+        )
+    ]
+    rows.append((
+        GLOBAL_STATS_ID, first.min().item(), last[newest].item(),
+        sum(added_counts.values()), int(last_fills[newest]),
+    ))
+    cursor.executemany(READING_STATS_UPSERT_SQL, rows)
+
+def rebuild_reading_stats(cursor):
+    cursor.execute("DELETE FROM container_reading_stats")
+    cursor.execute("""
+        INSERT INTO container_reading_stats (container_id, min_timestamp, max_timestamp, reading_count, latest_fill)
+        SELECT s.container_id, s.min_timestamp, s.max_timestamp, s.reading_count, r.fill_level_litres
+        FROM (
+            SELECT container_id, MIN(timestamp) AS min_timestamp, MAX(timestamp) AS max_timestamp, COUNT(*) AS reading_count
+            FROM container_readings
+            GROUP BY container_id
+        ) s
+        JOIN container_readings r ON r.container_id = s.container_id AND r.timestamp = s.max_timestamp
+    """)
+    cursor.execute(f"""
+        INSERT INTO container_reading_stats (container_id, min_timestamp, max_timestamp, reading_count, latest_fill)
+        SELECT {GLOBAL_STATS_ID}, MIN(min_timestamp), MAX(max_timestamp), SUM(reading_count),
+            {LAST_VALUE_SQL.format(value='latest_fill', order='max_timestamp')}
+        FROM container_reading_stats
+        HAVING COUNT(*) > 0
+    """)
+
+# collection_events (models/collection_event.py): a reading below this fraction
+# of the previous reading of the same container marks a pickup
+COLLECTION_EMPTYING_RATIO = float(os.getenv("COLLECTION_EMPTYING_RATIO", 0.5))
+
+COLLECTION_EVENT_UPSERT_SQL = """
+    ON DUPLICATE KEY UPDATE
+        previous_timestamp = VALUES(previous_timestamp),
+        fill_before = VALUES(fill_before),
+        fill_after = VALUES(fill_after)
+"""
+
+def collection_events_sql(where):
+    # Pickups among the stored readings matching `where`, each compared with the reading before it.
+    # An event another worker already recorded from the same readings is overwritten with the same values
+    return f"""
+        INSERT INTO collection_events (container_id, timestamp, previous_timestamp, fill_before, fill_after)
+        SELECT container_id, timestamp, previous_timestamp, fill_before, fill_after FROM (
+            SELECT container_id, timestamp, fill_level_litres AS fill_after,
+                LAG(timestamp) OVER w AS previous_timestamp,
+                LAG(fill_level_litres) OVER w AS fill_before
+            FROM container_readings r
+            WHERE {where}
+            WINDOW w AS (PARTITION BY container_id ORDER BY timestamp)
+        ) steps
+        WHERE fill_after < fill_before * %s
+    """ + COLLECTION_EVENT_UPSERT_SQL
+
+def rebuild_collection_events(cursor):
+    cursor.execute("DELETE FROM collection_events")
+    cursor.execute(collection_events_sql("TRUE"), (COLLECTION_EMPTYING_RATIO,))
+
+def neighbour_readings(cursor, container_ids, first, last):
+    """
+    Timestamps of the stored readings just before `first` and just after
+    `last` of every container, one index seek on uq_container_timestamp each.
+    Returns two dicts by container id; containers without such a reading are missing.
+
+    The seeks are locking reads: they see (or wait for) readings a
+    concurrent worker writes next to the chunk, and keep new ones out of
+    the gaps until commit. Only the chunk's edges are locked, so workers
+    importing different time ranges do not queue behind each other.
+
+    Lock order is the one of update_rollups, which runs first: the chunk's
+    own readings (inserted), then its hourly rows (FOR UPDATE), then shared
+    locks on stored readings, taken container by container in ascending id
+    order. Two workers can only wait on each other here when they write
+    adjacent spans of the same container at the same moment; InnoDB then
+    picks a deadlock victim and write_chunk retries its chunk.
+    """
+    seek = (
+        "(SELECT container_id, timestamp FROM container_readings "
+        "WHERE container_id = %s AND timestamp {op} %s ORDER BY timestamp {order} LIMIT 1 FOR SHARE)"
+    )
+    cursor.execute(
+        " UNION ALL ".join([seek.format(op="<", order="DESC"), seek.format(op=">", order="ASC")] * len(container_ids)),
+        [value for c, f, l in zip(container_ids, first, last) for value in (c, f, c, l)],
+    )
+    first_of = dict(zip(container_ids, first))
+    previous, following = {}, {}
+    for row in cursor.fetchall():
+        if row['timestamp'] < first_of[row['container_id']]:
+            previous[row['container_id']] = row['timestamp']
+        else:
+            following[row['container_id']] = row['timestamp']
+    return previous, following
 
-def update_container_fill(cursor, container_id, reading_data):
-    update_container_sql = (
+def update_collection_events(cursor, summary):
+    """
+    Record the pickups among a chunk's readings, in the chunk's transaction
+    and after the readings were written and the rollups updated. Detection
+    re-reads the stored readings of the chunk's span with LAG() instead of
+    keeping per-container state in memory, so out-of-order, duplicate and
+    concurrently written readings are compared with their true predecessor. The state needed per container is
+    the stored reading before the chunk's first one and the one after its
+    last: the events from the chunk's first reading up to the reading after
+    its last (whose event compares with a chunk reading) are deleted and
+    recomputed from the readings between those two. An appended chunk
+    reads back only its own rows and one more; a re-imported one never
+    reaches beyond its own span.
+    """
+    container_ids, first, last, _ = summary
+    container_ids, first, last = container_ids.tolist(), first.tolist(), last.tolist()
+    previous, following = neighbour_readings(cursor, container_ids, first, last)
+    # Timestamps are whole seconds, so one second past the bound includes it in the half-open ranges
+    until = [following.get(c, l) + timedelta(seconds=1) for c, l in zip(container_ids, last)]
+    events_where, params = ranges_filter(list(zip(container_ids, first, until)), "timestamp")
+    cursor.execute(f"DELETE FROM collection_events WHERE {events_where}", params)
+    readings_where, params = ranges_filter(
+        [(c, previous.get(c, f), u) for c, f, u in zip(container_ids, first, until)], "timestamp",
+    )
+    cursor.execute(collection_events_sql(readings_where), params + [COLLECTION_EMPTYING_RATIO])
+
+# Compares below every timestamp, for containers without stored readings
+NO_HIGH_WATER_MARK = np.datetime64('1000-01-01T00:00:00', 's')
+
+def load_high_water_marks(cursor):
+    """
+    Newest stored reading timestamp per container key, read from the
+    maintained container_reading_stats (one row per container), so the
+    cost follows the number of containers and not the number of readings.
+    """
+    cursor.execute("""
+        SELECT c.name, c.address, s.max_timestamp AS high_water_mark
+        FROM containers c
+        JOIN container_reading_stats s ON s.container_id = c.id
+    """)
+    return {(row['name'], row['address']): np.datetime64(row['high_water_mark'], 's') for row in cursor.fetchall()}
+
+def skip_seen_rows(columns, high_water_marks):
+    """
+    Drop rows at or before their container's high-water mark.
+    Returns the remaining columns (None if nothing is left) and the number of skipped rows.
+    """
+    if not high_water_marks:
+        return columns, 0
+    marks = np.array(
+        [high_water_marks.get(key, NO_HIGH_WATER_MARK) for key in zip(columns['name'], columns['address'])],
+        dtype='datetime64[s]',
+    )
+    keep = columns['timestamp'] > marks
+    skipped = int(len(keep) - keep.sum())
+    if skipped == 0:
+        return columns, 0
+    if not keep.any():
+        return None, skipped
+    return {field: values[keep] for field, values in columns.items()}, skipped
+
+def load_container_ids(cursor):
+    # Resolve every known container key in a single pass
+    cursor.execute("SELECT id, name, address FROM containers")
+    return {(row['name'], row['address']): row['id'] for row in cursor.fetchall()}
+
+def upsert_containers(cursor, new_containers, container_ids):
+    """
+    Insert containers that are not known yet in one multi-row statement and
+    resolve their ids. `new_containers` maps each key to a row of column values
+    in INSERT order; existing rows only get their static attributes refreshed.
+    """
+    if not new_containers:
+        return
+    upsert_sql = (
+        "INSERT INTO containers (name, address, location_lat, location_lng, type, capacity, current_fill, last_updated) "
+        "VALUES (%s, %s, %s, %s, %s, %s, %s, %s) "
+        "ON DUPLICATE KEY UPDATE location_lat = VALUES(location_lat), location_lng = VALUES(location_lng), "
+        "type = VALUES(type), capacity = VALUES(capacity)"
+    )
+    # Sorted keys give concurrent importers the same lock order
+    keys = sorted(new_containers)
+    cursor.executemany(upsert_sql, [new_containers[key] for key in keys])
+
+    placeholders = ", ".join(["(%s, %s)"] * len(keys))
+    params = [value for key in keys for value in key]
+    cursor.execute(f"SELECT id, name, address FROM containers WHERE (name, address) IN ({placeholders})", params)
+    for row in cursor.fetchall():
+        container_ids[(row['name'], row['address'])] = row['id']
+
+def insert_readings(cursor, readings):
+    # pymysql rewrites executemany on INSERT ... VALUES into multi-row inserts.
+    # A reading that is already stored (uq_container_timestamp) is overwritten, not duplicated
+    insert_sql = (
+        "INSERT INTO container_readings (container_id, timestamp, fill_level_litres) VALUES (%s, %s, %s) "
+        "ON DUPLICATE KEY UPDATE fill_level_litres = VALUES(fill_level_litres)"
+    )
+    cursor.executemany(insert_sql, readings)
+
+def update_container_fills(cursor, latest_readings):
+    """
+    Set current_fill/last_updated once per container from the newest imported
+    reading, never overwriting a more recent value.
+    """
+    update_sql = (
         "UPDATE containers SET current_fill = %s, last_updated = %s "
-        "WHERE id = %s AND (%s > last_updated OR last_updated IS NULL)"
+        "WHERE id = %s AND (last_updated IS NULL OR last_updated < %s)"
     )
-    update_values = (reading_data['fill_level_litres'], reading_data['timestamp'], container_id, reading_data['timestamp'])
-    cursor.execute(update_container_sql, update_values)
+    cursor.executemany(update_sql, [
+        (fill, timestamp, container_id, timestamp)
+        for container_id, (timestamp, fill) in latest_readings.items()
+    ])
+
+def refresh_container_fills(cursor):
+    """
+    Bring every container's current fill in line with its newest stored reading.
+    Used after resumed imports, whose earlier chunks were written by another run.
+    """
+    cursor.execute("""
+        UPDATE containers c
+        JOIN container_readings r ON r.container_id = c.id
+            AND r.timestamp = (SELECT MAX(r2.timestamp) FROM container_readings r2 WHERE r2.container_id = c.id)
+        SET c.current_fill = r.fill_level_litres, c.last_updated = r.timestamp
+        WHERE c.last_updated IS NULL OR c.last_updated < r.timestamp
+    """)
+
+def write_chunk(connection, columns, container_ids, latest_readings, before_commit=None, max_retries=3):
+    """
+    Write one parsed chunk: upsert unseen containers, insert the readings
+    and commit. `before_commit(cursor)` runs inside the same transaction,
+    e.g. to store a checkpoint. Deadlocks and lock timeouts are retried.
+    Returns the container id of every row.
+    """
+    keys = list(zip(columns['name'], columns['address']))
+    timestamps = columns['timestamp'].tolist()
+    fills = columns['fill_level_litres'].tolist()
+
+    new_containers = {}
+    for i, key in enumerate(keys):
+        if key not in container_ids and key not in new_containers:
+            new_containers[key] = (
+                key[0], key[1],
+                float(columns['location_lat'][i]), float(columns['location_lng'][i]),
+                columns['type'][i], int(columns['capacity'][i]),
+                fills[i], timestamps[i],
+            )
+
+    for attempt in range(1, max_retries + 1):
+        try:
+            with connection.cursor() as cursor:
+                # Ids of rows inserted by a rolled back attempt must not leak into the cache
+                chunk_ids = {}
+                upsert_containers(cursor, new_containers, chunk_ids)
+                ids = [container_ids.get(key) or chunk_ids[key] for key in keys]
+                insert_readings(cursor, list(zip(ids, timestamps, fills)))
+                row_ids = np.array(ids, dtype=np.int64)
+                summary = summarize_chunk(row_ids, columns['timestamp'], columns['fill_level_litres'])
+                added_counts = update_rollups(cursor, summary)
+                update_collection_events(cursor, summary)
+                update_reading_stats(cursor, summary, added_counts)
+                if before_commit is not None:
+                    before_commit(cursor)
+            connection.commit()
+            container_ids.update(chunk_ids)
+            break
+        except pymysql.OperationalError:
+            connection.rollback()
+            if attempt == max_retries:
+                raise
+            time.sleep(0.1 * attempt)
+
+    # Newest reading per container in this chunk: sort by (container, timestamp)
+    # and keep the last row of every container group
+    ids = np.array(ids, dtype=np.int64)
+    order = np.lexsort((columns['timestamp'], ids))
+    sorted_ids = ids[order]
+    last = order[np.append(sorted_ids[1:] != sorted_ids[:-1], True)]
+    for i in last.tolist():
+        container_id = int(ids[i])
+        latest = latest_readings.get(container_id)
+        if latest is None or timestamps[i] > latest[0]:
+            latest_readings[container_id] = (timestamps[i], fills[i])
+    return ids
+
+# Callbacks that run after readings were committed, with the ids of the
+# touched containers and the first and last timestamp of the rows; ids of
+# None means any container may have changed
+readings_listeners = []
+
+def add_readings_listener(listener):
+    readings_listeners.append(listener)
+
+def notify_readings_committed(container_ids=None, first=None, last=None):
+    for listener in readings_listeners:
+        try:
+            listener(container_ids, first, last)
+        except Exception as e:
+            print(f"[CSV_IMPORT] Readings listener failed: {e}")
+
+# Callbacks that run after containers were added or their current fill
+# changed, with their ids (None: any container may have changed)
+containers_listeners = []
+
+def add_containers_listener(listener):
+    containers_listeners.append(listener)
+
+def notify_containers_changed(container_ids=None):
+    for listener in containers_listeners:
+        try:
+            listener(container_ids)
+        except Exception as e:
+            print(f"[CSV_IMPORT] Containers listener failed: {e}")
+
+class ImportCancelled(Exception):
+    """Raised from an on_progress callback to stop an import between two chunks."""
+
+class ImportSession:
+    """
+    State of one import over a single connection: resolved container ids,
+    the newest reading per container and the rejects file. Raw CSV rows can
+    be fed in any number of calls, which lets files, byte ranges and
+    request bodies share the same pipeline.
+
+    on_chunk(session, cursor, rows_written) runs inside every chunk transaction
+    (a chunk without valid rows gets one of its own) and on_progress(session)
+    after every chunk; `offset` is the byte offset just past the last row
+    written when reading through a LineReader.
+
+    In incremental mode rows at or before their container's high-water mark
+    (the newest stored reading when the session starts) are skipped without
+    touching the database. Parallel imports pass the marks in as
+    `high_water_marks`, so every worker skips against the same snapshot.
+    """
+
+    def __init__(self, header, rejects_path, chunk_size=CHUNK_SIZE, on_chunk=None, on_progress=None, resume=False,
+                 incremental=False, high_water_marks=None):
+        self.header = header
+        self.indexes = column_indexes(header)
+        self.chunk_size = chunk_size
+        self.on_chunk = on_chunk
+        self.on_progress = on_progress
+        self.rejects = RejectsWriter(rejects_path, header, append=resume)
+        self.latest_readings = {}
+        # First and last timestamp of all rows written
+        self.span = None
+        self.rows_processed = 0
+        self.rows_skipped = 0
+        self.reader = None
+        self.connection = get_db_connection()
+        try:
+            with self.connection.cursor() as cursor:
+                self.container_ids = load_container_ids(cursor)
+                if high_water_marks is None:
+                    high_water_marks = load_high_water_marks(cursor) if incremental else {}
+                self.high_water_marks = high_water_marks
+        except Exception:
+            self.close()
+            raise
+
+    @property
+    def rows_rejected(self):
+        return self.rejects.count
+
+    @property
+    def offset(self):
+        return self.reader.offset if self.reader is not None else None
+
+    def write_rows(self, raw_rows):
+        # Parse one chunk of raw CSV rows and write the valid ones
+        columns, chunk_rejects = parse_chunk(raw_rows, self.indexes, len(self.header))
+        self.rejects.add(chunk_rejects)
+        skipped = 0
+        if columns is not None:
+            columns, skipped = skip_seen_rows(columns, self.high_water_marks)
+        try:
+            if columns is not None:
+                rows_written = len(columns['timestamp'])
+                before_commit = (lambda cursor: self.on_chunk(self, cursor, rows_written)) if self.on_chunk else None
+                ids = write_chunk(self.connection, columns, self.container_ids, self.latest_readings, before_commit)
+            elif self.on_chunk is not None:
+                # Nothing to write, but the checkpoint still moves past the rejected or skipped rows
+                with self.connection.cursor() as cursor:
+                    self.on_chunk(self, cursor, 0)
+                self.connection.commit()
+        except Exception:
+            self.rejects.discard()
+            raise
+        self.rejects.flush()
+        self.rows_skipped += skipped
+        if columns is not None:
+            self.rows_processed += rows_written
+            first, last = columns['timestamp'].min().item(), columns['timestamp'].max().item()
+            self.span = (first, last) if self.span is None else (min(self.span[0], first), max(self.span[1], last))
+            if readings_listeners:
+                notify_readings_committed(np.unique(ids).tolist(), first, last)
+        if self.on_progress is not None:
+            self.on_progress(self)
+
+    def import_rows(self, rows):
+        for raw_rows in iter_chunks(rows, self.chunk_size):
+            self.write_rows(raw_rows)
 
-def import_data_from_csv(filepath):
+    def import_lines(self, reader):
+        self.reader = reader
+        self.import_rows(csv.reader(reader))
+
+    def update_container_fills(self, refresh_all=False):
+        self.connection.ping(reconnect=True)
+        with self.connection.cursor() as cursor:
+            update_container_fills(cursor, self.latest_readings)
+            if refresh_all:
+                refresh_container_fills(cursor)
+        self.connection.commit()
+        notify_containers_changed(None if refresh_all else sorted(self.latest_readings))
+
+    def close(self):
+        # Rejects still staged belong to a chunk that was never committed
+        self.rejects.discard()
+        self.rejects.close()
+        self.connection.close()
+
+def prepare_database():
     connection = get_db_connection()
     try:
         with connection.cursor() as cursor:
-            print("[CSV_IMPORT_DEBUG] Cursor created.")
+            ensure_schema(cursor)
+        connection.commit()
+    finally:
+        connection.close()
 
-            # Debug: Show schema of containers table before attempting to modify/use it
-            try:
-                cursor.execute("SHOW CREATE TABLE containers;")
-                create_table_statement = cursor.fetchone()
-                print(f"[CSV_IMPORT_DEBUG] Existing 'containers' table schema: {create_table_statement}")
-            except Exception as e:
-                print(f"[CSV_IMPORT_DEBUG] Could not get 'containers' table schema (it might not exist yet): {e}")
-            
-            # Define table creation SQL (matches models/container.py)
-            create_containers_table_sql = """
-            CREATE TABLE IF NOT EXISTS containers (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                name VARCHAR(255) NOT NULL,
-                address VARCHAR(255) NOT NULL DEFAULT '',
-                location_lat FLOAT NOT NULL,
-                location_lng FLOAT NOT NULL,
-                type VARCHAR(50) NOT NULL,
-                capacity INT NOT NULL,
-                current_fill INT NOT NULL,
-                last_updated DATETIME NOT NULL,
-                UNIQUE KEY uq_container_name_address (name, address)
-            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-            """
-            print(f"[CSV_IMPORT_DEBUG] Executing SQL to create/ensure 'containers' table: {create_containers_table_sql}")
-            cursor.execute(create_containers_table_sql)
-            print("[CSV_IMPORT_DEBUG] 'containers' table ensured.")
-
-            create_readings_table_sql = """
-            CREATE TABLE IF NOT EXISTS container_readings (
-                reading_id INT AUTO_INCREMENT PRIMARY KEY,
-                container_id INT NOT NULL,
-                timestamp DATETIME NOT NULL,
-                fill_level_litres INT NOT NULL,
-                INDEX idx_container_timestamp (container_id, timestamp),
-                FOREIGN KEY (container_id) REFERENCES containers(id) ON DELETE CASCADE
-            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-            """
-            print(f"[CSV_IMPORT_DEBUG] Executing SQL to create/ensure 'container_readings' table: {create_readings_table_sql}")
-            cursor.execute(create_readings_table_sql)
-            print("[CSV_IMPORT_DEBUG] 'container_readings' table ensured.")
-            
-            # Add indexes for better performance
-            index_statements = [
-                "ALTER TABLE containers ADD INDEX IF NOT EXISTS idx_name_address (name, address)",
-                "ALTER TABLE container_readings ADD INDEX IF NOT EXISTS idx_timestamp (timestamp)",
-                "ALTER TABLE container_readings ADD INDEX IF NOT EXISTS idx_container_fill (container_id, fill_level_litres)"
-            ]
-            
-            for index_sql in index_statements:
-                try:
-                    print(f"[CSV_IMPORT_DEBUG] Creating index: {index_sql}")
-                    cursor.execute(index_sql)
-                except pymysql.Error as e:
-                    if "Duplicate key name" in str(e):
-                        print(f"[CSV_IMPORT_DEBUG] Index already exists: {e}")
-                    else:
-                        print(f"[CSV_IMPORT_DEBUG] Error creating index: {e}")
-            
-            connection.commit()
-            print("[CSV_IMPORT_DEBUG] Schema creation/ensurance and indexes committed.")
-
-            with open(filepath, mode='r', encoding='utf-8') as csvfile:
-                csv_reader = csv.DictReader(csvfile)
-                
-                header = csv_reader.fieldnames
-                if header:
-                    print(f"[CSV_IMPORT_DEBUG] CSV Header: {header}")
-                else:
-                    print("[CSV_IMPORT_DEBUG] Warning: CSV file has no header row or is empty.")
-                    return
-                
-                # Define column mapping here
-                column_mapping = {
-                    'csv_name': 'Label',
-                    'csv_address': 'Location', # This is 'Location' in CSV, will map to 'address' in DB
-                    'csv_latitude': 'Latitude',
-                    'csv_longitude': 'Longitude',
-                    'csv_date': 'Datum',
-                    'csv_time': 'Uhrzeit',
-                    'csv_fill_level': 'Füllstand',
-                    'csv_capacity': 'Containergröße',
-                    'csv_type': 'Container-Typ'
-                }
-                
-                containers_cache = {} 
-                rows_processed_count = 0
-
-                for row_num, row in enumerate(csv_reader, 1):
-                    try:
-                        # Use mapped names to read from CSV row
-                        container_name_val = row[column_mapping['csv_name']]
-                        # The 'Location' from CSV will become the 'address' in the database
-                        container_address_val = row[column_mapping['csv_address']] 
-                        location_lat_val = float(row[column_mapping['csv_latitude']].replace(',', '.'))
-                        location_lng_val = float(row[column_mapping['csv_longitude']].replace(',', '.'))
-                        container_type_val = row[column_mapping['csv_type']]
-                        capacity_litres_val = convert_capacity_to_litres(row[column_mapping['csv_capacity']])
-                        fill_level_litres_val = convert_fill_to_litres(row[column_mapping['csv_fill_level']])
-                        timestamp_val = parse_timestamp(row[column_mapping['csv_date']], row[column_mapping['csv_time']])
-
-                        container_key = (container_name_val, container_address_val)
-                        container_id = None
-
-                        if container_key not in containers_cache:
-                            select_sql = "SELECT id FROM containers WHERE name = %s AND address = %s"
-                            print(f"[CSV_IMPORT_DEBUG] Row {row_num}: Checking for existing container. SQL: {select_sql} with values: ('{container_name_val}', '{container_address_val}')")
-                            cursor.execute(select_sql, (container_name_val, container_address_val))
-                            container_record = cursor.fetchone()
-                            
-                            if container_record:
-                                container_id = container_record['id']
-                                print(f"[CSV_IMPORT_DEBUG] Row {row_num}: Found existing container. ID: {container_id}")
-                            else:
-                                insert_sql = (
-                                    "INSERT INTO containers (name, address, location_lat, location_lng, type, capacity, current_fill, last_updated) "
-                                    "VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"
-                                )
-                                insert_values = (container_name_val, container_address_val, location_lat_val, location_lng_val, container_type_val, capacity_litres_val, fill_level_litres_val, timestamp_val)
-                                print(f"[CSV_IMPORT_DEBUG] Row {row_num}: Creating new container. SQL: {insert_sql} with values: {insert_values}")
-                                cursor.execute(insert_sql, insert_values)
-                                container_id = cursor.lastrowid
-                                print(f"[CSV_IMPORT_DEBUG] Row {row_num}: New container created. ID: {container_id}")
-                            containers_cache[container_key] = container_id
-                        else:
-                            container_id = containers_cache[container_key]
-                            print(f"[CSV_IMPORT_DEBUG] Row {row_num}: Container ID {container_id} from cache for key {container_key}")
-                        
-                        # Insert reading
-                        insert_reading_sql = "INSERT INTO container_readings (container_id, timestamp, fill_level_litres) VALUES (%s, %s, %s)"
-                        reading_values = (container_id, timestamp_val, fill_level_litres_val)
-                        # print(f"[CSV_IMPORT_DEBUG] Row {row_num}: Inserting reading. SQL: {insert_reading_sql} with values: {reading_values}") # Too verbose
-                        cursor.execute(insert_reading_sql, reading_values)
-                        
-                        # Update containers table with the latest reading
-                        update_container_sql = (
-                            "UPDATE containers SET current_fill = %s, last_updated = %s "
-                            "WHERE id = %s AND (%s > last_updated OR last_updated IS NULL)"
-                        )
-                        update_values = (fill_level_litres_val, timestamp_val, container_id, timestamp_val)
-                        # print(f"[CSV_IMPORT_DEBUG] Row {row_num}: Updating container latest reading. SQL: {update_container_sql} with values: {update_values}") # Too verbose
-                        cursor.execute(update_container_sql, update_values)
-                        
-                        rows_processed_count += 1
-                        if rows_processed_count % 1000 == 0: # Commit every 1000 rows
-                            connection.commit()
-                            print(f"[CSV_IMPORT_DEBUG] Processed and committed {rows_processed_count} rows...")
-
-                    except KeyError as e:
-                        print(f"[CSV_IMPORT_DEBUG] Error: CSV Key error {e} in row {row_num}. Skipping row: {row}")
-                        continue
-                    except ValueError as e:
-                        print(f"[CSV_IMPORT_DEBUG] Error: Data conversion error in row {row_num}: {e}. Skipping row: {row}")
-                        continue
-                    except Exception as e:
-                        print(f"[CSV_IMPORT_DEBUG] An unexpected error occurred processing row {row_num}: {e}. SQL that might have failed was related to container: '{container_name_val}', address: '{container_address_val}'. Skipping row.")
-                        continue
-                
-                connection.commit() # Final commit
-                print(f"[CSV_IMPORT_DEBUG] Data import completed. Total rows processed in this run: {rows_processed_count}")
-
-    except pymysql.MySQLError as e:
-        print(f"[CSV_IMPORT_DEBUG] Database error during import: {e}")
-        if connection: connection.rollback()
-    except FileNotFoundError:
-        print(f"[CSV_IMPORT_DEBUG] Error: CSV file not found at {filepath}")
-    except Exception as e:
-        print(f"[CSV_IMPORT_DEBUG] An unexpected error occurred during setup or file open: {e}")
-        if connection: connection.rollback()
+def import_summary(rows_processed, rows_rejected, containers, started, workers=1, rows_skipped=0):
+    elapsed = time.monotonic() - started
+    summary = {
+        'rows_processed': rows_processed,
+        'rows_rejected': rows_rejected,
+        'rows_skipped': rows_skipped,
+        'containers': containers,
+        'workers': workers,
+        'elapsed_seconds': round(elapsed, 2),
+        'rows_per_second': round(rows_processed / elapsed, 1) if elapsed > 0 else None,
+    }
+    print(
+        f"[CSV_IMPORT] Imported {rows_processed} rows for {containers} containers "
+        f"in {summary['elapsed_seconds']}s ({summary['rows_per_second']} rows/s, {workers} workers), "
+        f"rejected {rows_rejected} rows, skipped {rows_skipped} already imported rows."
+    )
+    return summary
+
+def read_header(filepath):
+    # Returns the header fields and the byte offset where the data rows start
+    with open(filepath, mode='rb') as csvfile:
+        first_line = csvfile.readline()
+        header = next(csv.reader([first_line.decode('utf-8')]), None)
+        return header, csvfile.tell()
+
+def split_byte_ranges(filepath, data_start, parts):
+    """
+    Split the data section of a CSV file into `parts` byte ranges that
+    start and end on line boundaries. Quoted fields must not contain newlines.
+    """
+    file_size = os.path.getsize(filepath)
+    boundaries = [data_start]
+    with open(filepath, mode='rb') as csvfile:
+        for i in range(1, parts):
+            target = data_start + (file_size - data_start) * i // parts
+            csvfile.seek(max(target - 1, boundaries[-1]))
+            csvfile.readline()
+            boundaries.append(max(csvfile.tell(), boundaries[-1]))
+    boundaries.append(file_size)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+class LineReader:
+    """
+    Iterates the decoded lines between two byte offsets of a file and keeps
+    the offset just past the last line handed out, which is where an
+    interrupted import resumes.
+    """
+
+    def __init__(self, filepath, start, end):
+        self.filepath = filepath
+        self.offset = start
+        self.end = end
+
+    def __iter__(self):
+        with open(self.filepath, mode='rb') as csvfile:
+            csvfile.seek(self.offset)
+            while self.offset < self.end:
+                line = csvfile.readline()
+                if not line:
+                    break
+                self.offset += len(line)
+                yield line.decode('utf-8')
+
+def import_byte_range(filepath, header, start, end, chunk_size=CHUNK_SIZE, part=None, high_water_marks=None):
+    """
+    Worker entry point for parallel imports: imports the rows between two byte
+    offsets over its own connection and returns the counts, the span of the
+    written timestamps and the newest reading per container.
+    `high_water_marks` is the parent's snapshot for incremental imports; a
+    worker loading its own would see rows other workers already committed.
+    """
+    session = ImportSession(header, rejects_path_for(filepath, part), chunk_size, high_water_marks=high_water_marks)
+    try:
+        session.import_lines(LineReader(filepath, start, end))
+        return session.rows_processed, session.rows_rejected, session.rows_skipped, session.span, session.latest_readings
+    except Exception:
+        session.connection.rollback()
+        raise
     finally:
-        if 'connection' in locals() and connection:
+        session.close()
+
+def import_data_from_csv(filepath, chunk_size=CHUNK_SIZE, workers=1, start_offset=None, on_chunk=None, on_progress=None,
+                         incremental=False):
+    """
+    Bulk import a sensor CSV: rows are parsed column-wise in chunks, container
+    keys are resolved once, containers are upserted per chunk, readings are
+    written with multi-row inserts and every container's current fill is
+    updated once at the end.
+    With workers > 1 the file is split into byte ranges that are imported
+    by a process pool, each worker using its own connection.
+    Rows that cannot be parsed are written to <filepath>.rejects.csv
+    (one .rejects.partN.csv per worker in parallel mode).
+    Single-worker imports can resume from a byte offset checkpoint and accept
+    the on_chunk/on_progress callbacks of ImportSession.
+    Re-importing rows is idempotent (uq_container_timestamp); with
+    incremental=True rows at or before each container's newest stored
+    reading are skipped up front, so a re-sent cumulative file only costs its new rows.
+    Returns a summary with the number of rows and the achieved throughput.
+    """
+    started = time.monotonic()
+    header, data_start = read_header(filepath)
+    if not header:
+        print(f"[CSV_IMPORT] Warning: CSV file {filepath} has no header row or is empty.")
+        return None
+    column_indexes(header)
+    prepare_database()
+
+    if workers <= 1:
+        resume = start_offset is not None and start_offset > data_start
+        session = ImportSession(
+            header, rejects_path_for(filepath), chunk_size,
+            on_chunk=on_chunk, on_progress=on_progress, resume=resume, incremental=incremental,
+        )
+        cancelled = None
+        try:
+            try:
+                session.import_lines(LineReader(filepath, start_offset if resume else data_start, os.path.getsize(filepath)))
+            except ImportCancelled as e:
+                # The chunks committed before the cancel are kept, so their containers' fills are updated too
+                cancelled = e
+            session.update_container_fills(refresh_all=resume)
+        except Exception:
+            session.connection.rollback()
+            raise
+        finally:
+            session.close()
+        if cancelled is not None:
+            raise cancelled
+        return import_summary(
+            session.rows_processed, session.rows_rejected, len(session.latest_readings), started,
+            rows_skipped=session.rows_skipped,
+        )
+
+    rows_processed = 0
+    rows_rejected = 0
+    rows_skipped = 0
+    latest_readings = {}
+    span = None
+    byte_ranges = split_byte_ranges(filepath, data_start, workers)
+    high_water_marks = None
+    if incremental:
+        # One snapshot taken before any worker writes
+        connection = get_db_connection()
+        try:
+            with connection.cursor() as cursor:
+                high_water_marks = load_high_water_marks(cursor)
+        finally:
             connection.close()
-            print("[CSV_IMPORT_DEBUG] Database connection closed.")
+    # Spawned, not forked: the server process runs other threads whose locks (stdout among them)
+    # a forked child could inherit while held and wait on forever
+    with ProcessPoolExecutor(max_workers=len(byte_ranges) or 1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [
+            pool.submit(import_byte_range, filepath, header, start, end, chunk_size, part, high_water_marks)
+            for part, (start, end) in enumerate(byte_ranges)
+        ]
+        for future in futures:
+            processed, rejected, skipped, worker_span, worker_latest = future.result()
+            rows_processed += processed
+            rows_rejected += rejected
+            rows_skipped += skipped
+            if worker_span is not None:
+                span = worker_span if span is None else (min(span[0], worker_span[0]), max(span[1], worker_span[1]))
+            for container_id, (timestamp, fill) in worker_latest.items():
+                latest = latest_readings.get(container_id)
+                if latest is None or timestamp > latest[0]:
+                    latest_readings[container_id] = (timestamp, fill)
+
+    # Workers never touch the container fill columns, so this is the only
+    # statement that locks existing container rows
+    connection = get_db_connection()
+    try:
+        with connection.cursor() as cursor:
+            update_container_fills(cursor, latest_readings)
+        connection.commit()
+    finally:
+        connection.close()
+    # Chunks were committed by the worker processes, which have no listeners;
+    # every container a worker wrote to has an entry in latest_readings
+    if span is not None:
+        notify_readings_committed(sorted(latest_readings), *span)
+    notify_containers_changed(sorted(latest_readings))
+    return import_summary(rows_processed, rows_rejected, len(latest_readings), started, workers, rows_skipped)
 
 if __name__ == "__main__":
     print("[CSV_IMPORT_DEBUG] import_csv.py script execution started directly.")
@@ -405,4 +1069,4 @@ if __name__ == "__main__":
     if not os.path.exists(csv_file_path):
         print(f"[CSV_IMPORT_DEBUG] FATAL ERROR: CSV file not found at the resolved path: {csv_file_path}")
     else:
-        import_data_from_csv(csv_file_path)
\ No newline at end of file
+        import_data_from_csv(csv_file_path, workers=IMPORT_WORKERS)
\ No newline at end of file
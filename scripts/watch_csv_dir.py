@@ -0,0 +1,14 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from services.csv_watcher import CsvDirectoryWatcher, CSV_WATCH_DIR
+
+if __name__ == "__main__":
+    # Standalone ingestion daemon: python -m scripts.watch_csv_dir [directory]
+    directory = sys.argv[1] if len(sys.argv) > 1 else CSV_WATCH_DIR
+    watcher = CsvDirectoryWatcher(directory)
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        print("[CSV_WATCH] Stopped.")
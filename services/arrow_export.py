@@ -0,0 +1,161 @@
+import os
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from database import SessionLocal
+from models.container import Container
+from services.reading_export import iter_reading_batches
+
+# Rows per record batch (and per Parquet row group)
+ARROW_EXPORT_BATCH_SIZE = int(os.getenv("ARROW_EXPORT_BATCH_SIZE", 100000))
+
+ARROW_FORMATS = {
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+CONTAINER_FIELDS = [
+    pa.field("name", pa.dictionary(pa.int32(), pa.string())),
+    pa.field("address", pa.dictionary(pa.int32(), pa.string())),
+    pa.field("type", pa.dictionary(pa.int32(), pa.string())),
+    pa.field("location_lat", pa.float64()),
+    pa.field("location_lng", pa.float64()),
+    pa.field("capacity", pa.int32()),
+]
+
+READINGS_SCHEMA = pa.schema([
+    pa.field("reading_id", pa.int64()),
+    pa.field("container_id", pa.int32()),
+    pa.field("timestamp", pa.timestamp("s")),
+    pa.field("fill_level_litres", pa.int32()),
+] + CONTAINER_FIELDS)
+
+def load_container_rows():
+    with SessionLocal() as db:
+        return db.query(
+            Container.id, Container.name, Container.address, Container.type,
+            Container.location_lat, Container.location_lng, Container.capacity,
+        ).order_by(Container.id).all()
+
+class ContainerColumns:
+    """
+    Container metadata as Arrow arrays, loaded once per export and again
+    when a batch references a container created after that, e.g. by an
+    import running alongside the export. Every batch of readings takes its
+    container columns from these arrays by position, and the string columns
+    stay dictionary encoded.
+    """
+
+    def __init__(self, load_rows=None):
+        self.load_rows = load_rows or load_container_rows
+        self.reload()
+
+    def reload(self):
+        containers = self.load_rows()
+        self.ids = np.array([c.id for c in containers], dtype=np.int64)
+        self.strings = {}
+        self.indices = {}
+        for field in ("name", "address", "type"):
+            values = [getattr(c, field) for c in containers]
+            dictionary = sorted(set(values))
+            position = {value: i for i, value in enumerate(dictionary)}
+            self.strings[field] = pa.array(dictionary, pa.string())
+            self.indices[field] = np.array([position[value] for value in values], dtype=np.int32)
+        self.location_lat = np.array([c.location_lat for c in containers], dtype=np.float64)
+        self.location_lng = np.array([c.location_lng for c in containers], dtype=np.float64)
+        self.capacity = np.array([c.capacity for c in containers], dtype=np.int32)
+
+    def positions(self, container_ids):
+        positions = np.searchsorted(self.ids, container_ids)
+        found = positions < len(self.ids)
+        found[found] = self.ids[positions[found]] == container_ids[found]
+        return positions, found
+
+    def take(self, container_ids):
+        """
+        Container columns for the rows of a batch whose container exists, and
+        a mask of those rows; rows of containers deleted since are left out.
+        """
+        positions, found = self.positions(container_ids)
+        if not found.all():
+            self.reload()
+            positions, found = self.positions(container_ids)
+        positions = positions[found]
+        columns = [
+            pa.DictionaryArray.from_arrays(pa.array(self.indices[field][positions]), self.strings[field])
+            for field in ("name", "address", "type")
+        ]
+        columns += [
+            pa.array(self.location_lat[positions]),
+            pa.array(self.location_lng[positions]),
+            pa.array(self.capacity[positions]),
+        ]
+        return columns, found
+
+def iter_record_batches(container_ids=None, from_timestamp=None, to_timestamp=None, batch_size=ARROW_EXPORT_BATCH_SIZE):
+    containers = ContainerColumns()
+    for batch in iter_reading_batches(container_ids, from_timestamp, to_timestamp, batch_size):
+        reading_ids, batch_container_ids, timestamps, fills = zip(*batch)
+        batch_container_ids = np.array(batch_container_ids, dtype=np.int64)
+        container_columns, found = containers.take(batch_container_ids)
+        yield pa.RecordBatch.from_arrays([
+            pa.array(np.array(reading_ids, dtype=np.int64)[found]),
+            pa.array(batch_container_ids[found].astype(np.int32)),
+            pa.array(np.array(timestamps, dtype="datetime64[s]")[found]),
+            pa.array(np.array(fills, dtype=np.int32)[found]),
+        ] + container_columns, schema=READINGS_SCHEMA)
+
+def write_export(sink, format="parquet", container_ids=None, from_timestamp=None, to_timestamp=None,
+                 batch_size=ARROW_EXPORT_BATCH_SIZE):
+    """
+    Write readings joined with their container metadata to `sink` (a path or
+    writable file object) as an Arrow IPC stream or Parquet file, one record
+    batch (or row group) at a time. Yields the row count of every batch and
+    0 once the file is complete, so a caller can forward what was written so far.
+    """
+    if format == "arrow":
+        writer = pa.ipc.new_stream(sink, READINGS_SCHEMA)
+    else:
+        writer = pq.ParquetWriter(sink, READINGS_SCHEMA, compression="zstd")
+    with writer:
+        for record_batch in iter_record_batches(container_ids, from_timestamp, to_timestamp, batch_size):
+            writer.write_batch(record_batch)
+            yield record_batch.num_rows
+    yield 0
+
+class ChunkSink:
+    """Write-only file object that collects bytes until they are taken out."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+def iter_export_bytes(format="parquet", container_ids=None, from_timestamp=None, to_timestamp=None):
+    # Response body chunks: the bytes written for every record batch, then the footer
+    sink = ChunkSink()
+    for _ in write_export(sink, format, container_ids, from_timestamp, to_timestamp):
+        data = sink.take()
+        if data:
+            yield data
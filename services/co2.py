@@ -1,9 +1,76 @@
+import re
+
+import numpy as np
+
+from services.tile_pyramid import MAX_MERCATOR_LAT
+
+CO2_COEFFICIENT = 0.5  # kg CO2 per hour per full container (example value)
+
+# Ways to break the fleet-wide summary down; containers have no district column, so the
+# postal code in the address or the map tile at a zoom level stands in for it
+CO2_GROUPS = ("type", "postal_code", "tile")
+POSTAL_CODE = re.compile(r"\b\d{5}\b")
+
 def estimate_co2_emission(current_fill, capacity, last_updated, location_lat, location_lng, delayed_hours=0):
     """
     Estimate extra CO₂ emission due to delayed unloading.
     Simple formula: extra_kg = delayed_hours * (current_fill / capacity) * CO2_COEFFICIENT
     """
-    CO2_COEFFICIENT = 0.5  # kg CO2 per hour per full container (example value)
     fill_ratio = current_fill / capacity if capacity else 0
     extra_kg = delayed_hours * fill_ratio * CO2_COEFFICIENT
-    return extra_kg 
\ No newline at end of file
+    return extra_kg
+
+def estimate_co2_emissions(current_fill, capacity, delayed_hours):
+    """
+    estimate_co2_emission for arrays of containers and a list of delay
+    scenarios: kg per container (rows) and scenario (columns).
+    """
+    fill = np.asarray(current_fill, dtype=np.float64)
+    capacity = np.asarray(capacity, dtype=np.float64)
+    fill_ratio = np.divide(fill, capacity, out=np.zeros_like(fill), where=capacity != 0)
+    return fill_ratio[:, None] * np.asarray(delayed_hours, dtype=np.float64)[None, :] * CO2_COEFFICIENT
+
+def tile_keys(lats, lngs, zoom):
+    # "z/x/y" of the map tile (as served by /containers/tiles) every coordinate falls into
+    lat = np.radians(np.clip(np.asarray(lats, dtype=np.float64), -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT))
+    n = 2 ** zoom
+    x = np.clip(((np.asarray(lngs, dtype=np.float64) + 180.0) / 360.0 * n).astype(np.int64), 0, n - 1)
+    y = np.clip(((1.0 - np.arcsinh(np.tan(lat)) / np.pi) / 2.0 * n).astype(np.int64), 0, n - 1)
+    return [f"{zoom}/{tx}/{ty}" for tx, ty in zip(x.tolist(), y.tolist())]
+
+def group_keys(rows, group_by, zoom):
+    if group_by == "type":
+        return [row.type for row in rows]
+    if group_by == "postal_code":
+        keys = []
+        for row in rows:
+            match = POSTAL_CODE.search(row.address or "")
+            keys.append(match.group() if match else "unknown")
+        return keys
+    return tile_keys([row.location_lat for row in rows], [row.location_lng for row in rows], zoom)
+
+def summarize_co2(rows, delayed_hours, group_by=None, zoom=12):
+    """
+    Fleet-wide CO2 estimate for every delay scenario, computed for all rows
+    (current_fill, capacity and the group_by fields) in one NumPy pass, with
+    optional per-group totals.
+    """
+    fills = np.fromiter((row.current_fill for row in rows), dtype=np.float64, count=len(rows))
+    capacities = np.fromiter((row.capacity for row in rows), dtype=np.float64, count=len(rows))
+    emissions = estimate_co2_emissions(fills, capacities, delayed_hours)
+    summary = {
+        "delayed_hours": list(delayed_hours),
+        "container_count": len(rows),
+        "total_kg": np.round(emissions.sum(axis=0), 3).tolist(),
+        "groups": None,
+    }
+    if group_by is not None:
+        keys, inverse = np.unique(np.array(group_keys(rows, group_by, zoom), dtype=str), return_inverse=True)
+        totals = np.zeros((len(keys), len(delayed_hours)))
+        np.add.at(totals, inverse, emissions)
+        counts = np.bincount(inverse, minlength=len(keys))
+        summary["groups"] = [
+            {"key": str(key), "container_count": int(count), "total_kg": np.round(total, 3).tolist()}
+            for key, count, total in zip(keys, counts, totals)
+        ]
+    return summary
@@ -0,0 +1,161 @@
+import json
+import os
+import threading
+
+from scripts.import_csv import (
+    ImportSession, LineReader, prepare_database, read_header, rejects_path_for, CSV_DATA_DIR,
+)
+from services.import_jobs import import_slots
+
+# Directory that is watched for new and growing CSV files
+CSV_WATCH_DIR = os.getenv("CSV_WATCH_DIR", CSV_DATA_DIR)
+# Seconds between two scans of the directory
+CSV_WATCH_INTERVAL = float(os.getenv("CSV_WATCH_INTERVAL", 2))
+# Start the watcher together with the API (see main.py)
+CSV_WATCH_ENABLED = os.getenv("CSV_WATCH_ENABLED", "false").lower() in ("1", "true", "yes")
+
+STATE_FILENAME = ".ingest_state.json"
+
+def complete_lines_end(filepath, offset, size):
+    """
+    Byte offset just past the last newline between offset and size, so a
+    line that is still being written is left for the next scan.
+    """
+    with open(filepath, mode='rb') as csvfile:
+        position = size
+        while position > offset:
+            block_start = max(offset, position - 65536)
+            csvfile.seek(block_start)
+            block = csvfile.read(position - block_start)
+            newline = block.rfind(b'\n')
+            if newline != -1:
+                return block_start + newline + 1
+            position = block_start
+    return offset
+
+class CsvDirectoryWatcher:
+    """
+    Polls a directory for CSV files and tails them: every scan imports only
+    the complete lines appended since the last processed byte offset, in
+    micro-batches through the bulk import path. Offsets and headers are kept
+    in a state file inside the directory, so a restart continues where it
+    stopped. A file is only read from the start again if it was replaced or truncated.
+    Files whose size and modification time match the state are skipped
+    without being read, so an idle scan costs one stat per file; a session
+    (and one of the import slots shared with queued jobs, see
+    services/import_jobs.py) is only taken when there are new complete lines.
+    """
+
+    def __init__(self, directory=CSV_WATCH_DIR, interval=CSV_WATCH_INTERVAL, chunk_size=1000):
+        self.directory = directory
+        self.interval = interval
+        self.chunk_size = chunk_size
+        self.state_path = os.path.join(directory, STATE_FILENAME)
+        self.state = self._load_state()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, encoding='utf-8') as state_file:
+                return json.load(state_file)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_state(self):
+        temp_path = self.state_path + ".tmp"
+        with open(temp_path, mode='w', encoding='utf-8') as state_file:
+            json.dump(self.state, state_file)
+        os.replace(temp_path, self.state_path)
+
+    def csv_files(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            name for name in os.listdir(self.directory)
+            if name.lower().endswith(".csv") and ".rejects." not in name
+        )
+
+    def scan(self):
+        """Import whatever was added to the watched files since the last scan."""
+        imported = 0
+        for name in self.csv_files():
+            try:
+                imported += self.ingest_file(name)
+            except Exception as e:
+                print(f"[CSV_WATCH] Failed to ingest {name}: {e}")
+        return imported
+
+    def ingest_file(self, name):
+        filepath = os.path.join(self.directory, name)
+        stat = os.stat(filepath)
+        file_state = self.state.get(name)
+        if file_state is None or file_state.get("inode") != stat.st_ino or stat.st_size < file_state["offset"]:
+            # New, replaced or truncated file
+            file_state = {"inode": stat.st_ino, "offset": 0, "header": None}
+        elif (file_state.get("size"), file_state.get("mtime")) == (stat.st_size, stat.st_mtime_ns):
+            # Nothing was written since the last scan
+            return 0
+
+        def seen(**changes):
+            # Remember how far the file was looked at, so an unchanged file is skipped next time
+            file_state.update(size=stat.st_size, mtime=stat.st_mtime_ns, **changes)
+            self.state[name] = file_state
+            self._save_state()
+
+        if file_state["header"] is None:
+            header, data_start = read_header(filepath)
+            if not header or data_start > complete_lines_end(filepath, 0, stat.st_size):
+                seen()
+                return 0
+            file_state.update(header=header, offset=data_start)
+
+        end = complete_lines_end(filepath, file_state["offset"], stat.st_size)
+        if end <= file_state["offset"]:
+            # Only a partial line was added
+            seen()
+            return 0
+
+        # Waits while queued import jobs or stream uploads hold all import slots
+        with import_slots:
+            session = ImportSession(file_state["header"], rejects_path_for(filepath), self.chunk_size, resume=True)
+            try:
+                session.import_lines(LineReader(filepath, file_state["offset"], end))
+                session.update_container_fills()
+            except Exception:
+                session.connection.rollback()
+                raise
+            finally:
+                session.close()
+
+        # Committed chunks of a failed scan are simply written again next time;
+        # uq_container_timestamp keeps that idempotent
+        seen(offset=end)
+        if session.rows_processed or session.rows_rejected:
+            print(
+                f"[CSV_WATCH] {name}: imported {session.rows_processed} rows, "
+                f"rejected {session.rows_rejected} (offset {end})."
+            )
+        return session.rows_processed
+
+    def run(self):
+        print(f"[CSV_WATCH] Watching {self.directory} every {self.interval}s.")
+        schema_ready = False
+        while not self._stop.is_set():
+            try:
+                if not schema_ready:
+                    prepare_database()
+                    schema_ready = True
+                self.scan()
+            except Exception as e:
+                print(f"[CSV_WATCH] Scan failed: {e}")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="csv-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 5)
@@ -0,0 +1,226 @@
+import hashlib
+import os
+import threading
+
+import numpy as np
+
+from services.spatial_index import EARTH_RADIUS_M
+
+DISTANCE_MATRIX_DIR = os.getenv(
+    "DISTANCE_MATRIX_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "distance_matrix"),
+)
+DISTANCE_MATRIX_ENABLED = os.getenv("DISTANCE_MATRIX_ENABLED", "true").lower() in ("1", "true", "yes")
+# Rows computed per NumPy call when many containers change at once
+DISTANCE_MATRIX_BLOCK_ROWS = 128
+# Slots added at least when the matrix has to grow
+MIN_CAPACITY = 64
+
+MATRIX_FILE = "distances.f32"
+SLOTS_FILE = "slots.npz"
+
+def haversine_pairs(lat1, lng1, lat2, lng2):
+    """Great-circle distances in meters between every point of set 1 (rows) and set 2 (columns)."""
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(values, dtype=np.float64)) for values in (lat1, lng1, lat2, lng2))
+    dlat = lat1[:, None] - lat2[None, :]
+    dlng = lng1[:, None] - lng2[None, :]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1)[:, None] * np.cos(lat2)[None, :] * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def haversine_legs(lats, lngs):
+    """Distances in meters between consecutive points of a path."""
+    lat = np.radians(np.asarray(lats, dtype=np.float64))
+    lng = np.radians(np.asarray(lngs, dtype=np.float64))
+    a = np.sin(np.diff(lat) / 2) ** 2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(np.diff(lng) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def haversine_matrix(lats, lngs):
+    return haversine_pairs(lats, lngs, lats, lngs)
+
+def container_set_version(ids, coords):
+    """Hash of the container ids and their coordinates, independent of slot order."""
+    order = np.argsort(ids, kind="stable")
+    digest = hashlib.sha1(np.ascontiguousarray(ids[order], dtype=np.int64).tobytes())
+    digest.update(np.ascontiguousarray(coords[order], dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+class DistanceMatrix:
+    """
+    Pairwise container distances in a memory-mapped float32 file. Every
+    container owns a slot (a row and the same column); the slot ids and
+    coordinates are saved next to the matrix together with the version of
+    the container set, so a restart with unchanged containers maps the file
+    as is. A container that is added or moved gets its row and column
+    recomputed; a deleted one frees its slot.
+
+    Observes the spatial index. Changes are queued and applied to the file
+    the next time the matrix is used.
+    """
+
+    def __init__(self, directory=DISTANCE_MATRIX_DIR):
+        self.directory = directory
+        self.matrix = None
+        self.ids = np.empty(0, dtype=np.int64)  # -1 marks a free slot
+        self.coords = np.empty((0, 2), dtype=np.float64)
+        self.slot_of = {}
+        self.version = None
+        self.opened = False
+        # Observer changes waiting for the next use: the full container set after a reset
+        # ({id: (lat, lng)}) and single changes since then (coordinates, or None when deleted)
+        self.pending_reset = None
+        self.pending_changes = {}
+        self._lock = threading.RLock()
+        self._pending_lock = threading.Lock()
+
+    # Spatial index observer; only queues, so the index is never held up by file updates
+    def reset(self, entries):
+        with self._pending_lock:
+            self.pending_reset = {entry.id: (entry.location_lat, entry.location_lng) for entry in entries}
+            self.pending_changes = {}
+
+    def entry_added(self, entry):
+        with self._pending_lock:
+            self.pending_changes[entry.id] = (entry.location_lat, entry.location_lng)
+
+    def entry_removed(self, entry):
+        with self._pending_lock:
+            self.pending_changes[entry.id] = None
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _open(self):
+        # Map the saved matrix; an unreadable or inconsistent pair of files starts empty
+        try:
+            with np.load(self._path(SLOTS_FILE)) as saved:
+                ids, coords, version = saved["ids"], saved["coords"], str(saved["version"])
+            capacity = len(ids)
+            if os.path.getsize(self._path(MATRIX_FILE)) != capacity * capacity * 4:
+                raise ValueError("distance matrix size does not match its slots")
+            self.matrix = np.memmap(self._path(MATRIX_FILE), dtype=np.float32, mode="r+", shape=(capacity, capacity))
+        except FileNotFoundError:
+            ids, coords, version = np.empty(0, dtype=np.int64), np.empty((0, 2)), None
+            self.matrix = None
+        except (OSError, KeyError, ValueError) as e:
+            print(f"Rebuilding the distance matrix: {e}")
+            ids, coords, version = np.empty(0, dtype=np.int64), np.empty((0, 2)), None
+            self.matrix = None
+        self.ids = ids.astype(np.int64)
+        self.coords = coords.astype(np.float64)
+        self.version = version
+        self.slot_of = {int(container_id): slot for slot, container_id in enumerate(self.ids) if container_id >= 0}
+
+    def _grow(self, capacity):
+        os.makedirs(self.directory, exist_ok=True)
+        old_capacity = len(self.ids)
+        temp_path = self._path(MATRIX_FILE + ".tmp")
+        grown = np.memmap(temp_path, dtype=np.float32, mode="w+", shape=(capacity, capacity))
+        if old_capacity:
+            for start in range(0, old_capacity, DISTANCE_MATRIX_BLOCK_ROWS):
+                stop = min(start + DISTANCE_MATRIX_BLOCK_ROWS, old_capacity)
+                grown[start:stop, :old_capacity] = self.matrix[start:stop]
+        grown.flush()
+        del grown
+        self.matrix = None
+        os.replace(temp_path, self._path(MATRIX_FILE))
+        self.matrix = np.memmap(self._path(MATRIX_FILE), dtype=np.float32, mode="r+", shape=(capacity, capacity))
+        self.ids = np.concatenate([self.ids, np.full(capacity - old_capacity, -1, dtype=np.int64)])
+        self.coords = np.concatenate([self.coords, np.full((capacity - old_capacity, 2), np.nan)])
+
+    def _save(self):
+        # The matrix is flushed before the slots, so saved coordinates never claim rows that were not written
+        self.matrix.flush()
+        occupied = self.ids >= 0
+        self.version = container_set_version(self.ids[occupied], self.coords[occupied])
+        temp_path = self._path(SLOTS_FILE + ".tmp.npz")
+        np.savez(temp_path, ids=self.ids, coords=self.coords, version=np.array(self.version))
+        os.replace(temp_path, self._path(SLOTS_FILE))
+
+    def _compute(self, slots):
+        slots = np.asarray(sorted(slots), dtype=np.int64)
+        # Recomputed rows cover every column; the columns only need writing in the other occupied rows
+        recomputed = np.zeros(len(self.ids), dtype=bool)
+        recomputed[slots] = True
+        others = np.flatnonzero(~recomputed & (self.ids >= 0))
+        for start in range(0, len(slots), DISTANCE_MATRIX_BLOCK_ROWS):
+            block = slots[start:start + DISTANCE_MATRIX_BLOCK_ROWS]
+            rows = haversine_pairs(
+                self.coords[block, 0], self.coords[block, 1], self.coords[:, 0], self.coords[:, 1],
+            ).astype(np.float32)
+            self.matrix[block, :] = rows
+            if len(others):
+                self.matrix[others[:, None], block] = rows[:, others].T
+
+    def _apply(self, changed, removed):
+        # Give added and moved containers ({id: (lat, lng)}) fresh rows and free the slots of removed ones
+        dirty = False
+        for container_id in removed:
+            slot = self.slot_of.pop(container_id, None)
+            if slot is not None:
+                self.ids[slot] = -1
+                self.coords[slot] = np.nan
+                dirty = True
+        moved = {
+            container_id: coords for container_id, coords in changed.items()
+            if container_id not in self.slot_of or tuple(self.coords[self.slot_of[container_id]]) != tuple(coords)
+        }
+        if moved:
+            free = np.flatnonzero(self.ids < 0).tolist()
+            needed = len([container_id for container_id in moved if container_id not in self.slot_of]) - len(free)
+            if needed > 0:
+                self._grow(len(self.ids) + max(needed, len(self.ids) // 8, MIN_CAPACITY))
+                free = np.flatnonzero(self.ids < 0).tolist()
+            free.reverse()
+            slots = []
+            for container_id, coords in moved.items():
+                slot = self.slot_of.get(container_id)
+                if slot is None:
+                    slot = self.slot_of[container_id] = free.pop()
+                    self.ids[slot] = container_id
+                self.coords[slot] = coords
+                slots.append(slot)
+            self._compute(slots)
+            dirty = True
+        if dirty:
+            self._save()
+
+    def sync(self):
+        """Apply the queued container changes; the first call maps the saved matrix."""
+        with self._lock:
+            with self._pending_lock:
+                target, changes = self.pending_reset, self.pending_changes
+                self.pending_reset, self.pending_changes = None, {}
+            if not self.opened:
+                self._open()
+                self.opened = True
+            if target is not None:
+                for container_id, coords in changes.items():
+                    if coords is None:
+                        target.pop(container_id, None)
+                    else:
+                        target[container_id] = coords
+                ids = np.fromiter(target.keys(), dtype=np.int64, count=len(target))
+                coords = np.array(list(target.values()), dtype=np.float64).reshape(-1, 2)
+                if self.matrix is not None and self.version == container_set_version(ids, coords):
+                    return
+                self._apply(target, [container_id for container_id in self.slot_of if container_id not in target])
+            elif changes:
+                self._apply(
+                    {container_id: coords for container_id, coords in changes.items() if coords is not None},
+                    [container_id for container_id, coords in changes.items() if coords is None],
+                )
+
+    def start(self):
+        threading.Thread(target=self.sync, name="distance-matrix", daemon=True).start()
+
+    def submatrix(self, container_ids):
+        """Distances between the given containers in their order, or None if one has no slot."""
+        with self._lock:
+            self.sync()
+            slots = [self.slot_of.get(container_id) for container_id in container_ids]
+            if any(slot is None for slot in slots):
+                return None
+            slots = np.array(slots, dtype=np.int64)
+            return np.asarray(self.matrix[np.ix_(slots, slots)]) if len(slots) else np.zeros((0, 0), np.float32)
+
+distance_matrix = DistanceMatrix()
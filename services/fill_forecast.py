@@ -0,0 +1,237 @@
+import os
+import re
+import threading
+from datetime import timedelta
+
+import numpy as np
+
+from scripts.import_csv import COLLECTION_EMPTYING_RATIO
+from services.reading_export import iter_reading_batches
+from services.reading_index import to_seconds, from_seconds
+
+FORECAST_ENABLED = os.getenv("FORECAST_ENABLED", "true").lower() in ("1", "true", "yes")
+# A reading below this fraction of the previous one is taken as the container being emptied,
+# by default the same rule that records collection events
+FORECAST_EMPTYING_RATIO = float(os.getenv("FORECAST_EMPTYING_RATIO", COLLECTION_EMPTYING_RATIO))
+
+HORIZON_PATTERN = re.compile(r"^(\d+(?:\.\d+)?)([mhd])$")
+HORIZON_UNITS = {"m": "minutes", "h": "hours", "d": "days"}
+
+def parse_horizon(value):
+    """'90m', '48h' or '2d' as a timedelta, None if malformed."""
+    match = HORIZON_PATTERN.match(value.strip())
+    if match is None:
+        return None
+    return timedelta(**{HORIZON_UNITS[match.group(2)]: float(match.group(1))})
+
+class FillForecast:
+    """
+    Fill rate per container from a least-squares line through the readings
+    since the container was last emptied. Only the regression sums of that
+    segment are kept (count, sum of hours, fills, hours squared and
+    hours * fill, hours counted from the segment's first reading) together
+    with the last reading, in arrays with one slot per container.
+
+    Imported readings newer than a container's last reading are folded into
+    the sums in one vectorized pass per batch; an emptying starts a new
+    segment. Readings at or before the last one (corrections, backfills)
+    make the container's segment be rebuilt from its history.
+    """
+
+    def __init__(self, emptying_ratio=FORECAST_EMPTYING_RATIO):
+        self.emptying_ratio = emptying_ratio
+        self._reset()
+        self.ready = False
+        self._lock = threading.RLock()
+
+    def start(self):
+        threading.Thread(target=self.load, name="fill-forecast", daemon=True).start()
+
+    def _reset(self):
+        self.slot_of = {}
+        self.container_ids = np.empty(0, dtype=np.int64)
+        self.count = np.empty(0)
+        self.sum_x = np.empty(0)
+        self.sum_y = np.empty(0)
+        self.sum_xx = np.empty(0)
+        self.sum_xy = np.empty(0)
+        self.origin = np.empty(0)  # seconds of the segment's first reading
+        self.last_seconds = np.empty(0)
+        self.last_fill = np.empty(0)
+
+    def _clear(self, slots=None):
+        for values in (self.count, self.sum_x, self.sum_y, self.sum_xx, self.sum_xy):
+            values[slice(None) if slots is None else slots] = 0.0
+        for values in (self.origin, self.last_seconds, self.last_fill):
+            values[slice(None) if slots is None else slots] = np.nan
+
+    def _slots(self, container_ids):
+        new_ids = [container_id for container_id in dict.fromkeys(container_ids.tolist()) if container_id not in self.slot_of]
+        if new_ids:
+            start = len(self.container_ids)
+            for offset, container_id in enumerate(new_ids):
+                self.slot_of[container_id] = start + offset
+            self.container_ids = np.concatenate([self.container_ids, np.array(new_ids, dtype=np.int64)])
+            grow = len(new_ids)
+            for name in ("count", "sum_x", "sum_y", "sum_xx", "sum_xy"):
+                setattr(self, name, np.concatenate([getattr(self, name), np.zeros(grow)]))
+            for name in ("origin", "last_seconds", "last_fill"):
+                setattr(self, name, np.concatenate([getattr(self, name), np.full(grow, np.nan)]))
+        return np.array([self.slot_of[container_id] for container_id in container_ids.tolist()], dtype=np.int64)
+
+    def add_readings(self, container_ids, seconds, fills):
+        """
+        Fold readings sorted by container and time into the sums. Every
+        reading must be newer than its container's last one.
+        """
+        if not len(container_ids):
+            return
+        slots = self._slots(container_ids)
+        rows = np.arange(len(slots))
+        first_of_container = np.ones(len(slots), dtype=bool)
+        first_of_container[1:] = slots[1:] != slots[:-1]
+        previous = np.where(first_of_container, self.last_fill[slots], np.roll(fills, 1))
+        # A new segment starts at an emptying and at a container's very first reading
+        emptied = (fills < previous * self.emptying_ratio) | np.isnan(previous)
+        marks = np.where(emptied | first_of_container, rows, -1)
+        segment_start = np.maximum.accumulate(marks)
+        last_of_container = np.ones(len(slots), dtype=bool)
+        last_of_container[:-1] = first_of_container[1:]
+        ends = rows[last_of_container]
+        starts = segment_start[ends]
+        touched = slots[ends]
+        restarted = emptied[starts]
+        self._clear(touched[restarted])
+        self.origin[touched[restarted]] = seconds[starts[restarted]]
+        # Only the rows of each container's last segment count
+        keep_from = np.repeat(starts, np.diff(np.append(rows[first_of_container], len(slots))))
+        keep = rows >= keep_from
+        kept_slots = slots[keep]
+        x = (seconds[keep] - self.origin[kept_slots]) / 3600.0
+        y = fills[keep].astype(np.float64)
+        np.add.at(self.count, kept_slots, 1.0)
+        np.add.at(self.sum_x, kept_slots, x)
+        np.add.at(self.sum_y, kept_slots, y)
+        np.add.at(self.sum_xx, kept_slots, x * x)
+        np.add.at(self.sum_xy, kept_slots, x * y)
+        self.last_seconds[touched] = seconds[ends]
+        self.last_fill[touched] = fills[ends]
+
+    def _add_batches(self, batches):
+        for batch in batches:
+            _, container_ids, timestamps, fills = zip(*batch)
+            self.add_readings(
+                np.array(container_ids, dtype=np.int64),
+                np.array([to_seconds(timestamp) for timestamp in timestamps]),
+                np.array(fills, dtype=np.float64),
+            )
+
+    def load(self):
+        try:
+            with self._lock:
+                self._reset()
+                self._add_batches(iter_reading_batches())
+                self.ready = True
+            print(f"[FORECAST] Fill rates of {len(self.slot_of)} containers loaded.")
+        except Exception as e:
+            print(f"[FORECAST] Could not load the fill rates: {e}")
+
+    def refresh(self, container_ids=None, first=None, last=None):
+        """Fold in readings an import committed between first and last (everything without ids)."""
+        if not self.ready:
+            return
+        if container_ids is None:
+            self.load()
+            return
+        with self._lock:
+            rebuild = set()
+            folded = set()  # Reading ids of containers' already folded last readings
+            batches = []
+            for batch in iter_reading_batches(container_ids, first, last):
+                for row in batch:
+                    slot = self.slot_of.get(row[1])
+                    if slot is None:
+                        continue
+                    seconds = to_seconds(row[2])
+                    # first/last span the whole chunk, so a container's last reading from the previous
+                    # chunk comes back whenever sensors report at shared times; only changes rebuild
+                    if seconds == self.last_seconds[slot] and row[3] == self.last_fill[slot]:
+                        folded.add(row[0])
+                    elif seconds <= self.last_seconds[slot]:
+                        rebuild.add(row[1])
+                batches.append(batch)
+            fresh = [
+                [row for row in batch if row[1] not in rebuild and row[0] not in folded]
+                for batch in batches
+            ]
+            self._add_batches(batch for batch in fresh if batch)
+            if rebuild:
+                self.rebuild(sorted(rebuild))
+
+    def rebuild(self, container_ids):
+        with self._lock:
+            slots = [self.slot_of[container_id] for container_id in container_ids if container_id in self.slot_of]
+            self._clear(np.array(slots, dtype=np.int64))
+            self._add_batches(iter_reading_batches(container_ids))
+
+    def rates(self, container_ids):
+        """Fill rate in litres per hour (NaN if unknown) and the last reading (seconds, fill) per container."""
+        with self._lock:
+            slots = np.array([self.slot_of.get(container_id, -1) for container_id in container_ids], dtype=np.int64)
+            known = slots >= 0
+            picked = np.where(known, slots, 0)
+            n = np.where(known, self.count[picked], 0.0)
+            sum_x, sum_y = self.sum_x[picked], self.sum_y[picked]
+            denominator = n * self.sum_xx[picked] - sum_x * sum_x
+            with np.errstate(divide="ignore", invalid="ignore"):
+                slope = (n * self.sum_xy[picked] - sum_x * sum_y) / denominator
+            valid = known & (n >= 2) & (denominator > 1e-9)
+            return (
+                np.where(valid, slope, np.nan),
+                np.where(known, self.last_seconds[picked], np.nan),
+                np.where(known, self.last_fill[picked], np.nan),
+            )
+
+    def predict(self, entries, at, horizon):
+        """
+        Predicted fill at `at + horizon` and the time the container becomes
+        full for spatial index entries, computed for all of them at once.
+        Containers without a usable rate keep their current fill.
+        """
+        ids = [entry.id for entry in entries]
+        capacity = np.array([entry.capacity for entry in entries], dtype=np.float64)
+        current = np.array([entry.current_fill for entry in entries], dtype=np.float64)
+        rate, last_seconds, last_fill = self.rates(ids)
+        # Readings only rise between emptyings
+        rate = np.maximum(rate, 0.0)
+        has_reading = ~np.isnan(last_seconds)
+        base_seconds = np.where(has_reading, last_seconds, to_seconds(at))
+        base_fill = np.where(has_reading, last_fill, current)
+        target_seconds = to_seconds(at + horizon)
+        growth = np.nan_to_num(rate) * np.maximum(target_seconds - base_seconds, 0.0) / 3600.0
+        predicted = np.minimum(base_fill + growth, capacity)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            full_seconds = np.where(
+                base_fill >= capacity, base_seconds,
+                base_seconds + (capacity - base_fill) / rate * 3600.0,
+            )
+        full_seconds = np.where(np.isfinite(full_seconds), full_seconds, np.nan)
+        hours_to_full = np.maximum(full_seconds - to_seconds(at), 0.0) / 3600.0
+        result = []
+        for i, entry in enumerate(entries):
+            known_rate = not np.isnan(rate[i])
+            full = not np.isnan(full_seconds[i])
+            result.append({
+                "container_id": entry.id,
+                "capacity": entry.capacity,
+                "current_fill": entry.current_fill,
+                "fill_rate_per_hour": round(float(rate[i]), 3) if known_rate else None,
+                "predicted_fill": int(round(predicted[i])),
+                "predicted_fill_ratio": round(float(predicted[i] / capacity[i]), 4) if capacity[i] else None,
+                "full_at": from_seconds(float(full_seconds[i])) if full else None,
+                "hours_to_full": round(float(hours_to_full[i]), 2) if full else None,
+                "full_within_horizon": bool(full and full_seconds[i] <= target_seconds),
+            })
+        return result
+
+fill_forecast = FillForecast()
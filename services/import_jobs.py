@@ -0,0 +1,284 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from database import SessionLocal
+from models.import_job import ImportJob
+from scripts.import_csv import import_data_from_csv, read_header, ImportCancelled
+
+# Number of imports that may run at the same time; further jobs wait in the queue
+IMPORT_MAX_CONCURRENCY = int(os.getenv("IMPORT_MAX_CONCURRENCY", 1))
+# Seconds a stream upload waits for a free import slot before it is turned away
+IMPORT_STREAM_WAIT_SECONDS = float(os.getenv("IMPORT_STREAM_WAIT_SECONDS", 30))
+
+# Every import that writes readings holds a slot while it runs: queued jobs, CSV watcher
+# scans and stream uploads, so together they never exceed IMPORT_MAX_CONCURRENCY
+import_slots = threading.BoundedSemaphore(IMPORT_MAX_CONCURRENCY)
+
+ACTIVE_STATUSES = ("queued", "running")
+RESUMABLE_STATUSES = ("interrupted", "failed", "cancelled")
+
+class JobProgress:
+    """Live state of a job that was queued or run by this process."""
+
+    def __init__(self, job_id, filepath, workers, incremental=False, start_offset=None, rows_processed=0, rows_rejected=0):
+        self.id = job_id
+        self.filepath = filepath
+        self.workers = workers
+        self.incremental = incremental
+        self.status = "queued"
+        self.start_offset = start_offset
+        self.byte_offset = start_offset
+        self.total_bytes = None
+        self.base_rows_processed = rows_processed
+        self.base_rows_rejected = rows_rejected
+        self.rows_processed = rows_processed
+        self.rows_rejected = rows_rejected
+        self.error = None
+        self.started = None
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self.future = None
+
+    def to_dict(self):
+        elapsed = None
+        rows_per_second = None
+        eta_seconds = None
+        progress = None
+        if self.started is not None:
+            if self.finished_at is not None:
+                elapsed = (self.finished_at - self.started_at).total_seconds()
+            else:
+                elapsed = time.monotonic() - self.started
+            rows_this_run = self.rows_processed - self.base_rows_processed
+            rows_per_second = round(rows_this_run / elapsed, 1) if elapsed > 0 else None
+            if self.total_bytes and self.byte_offset is not None:
+                progress = round(self.byte_offset / self.total_bytes, 4)
+                bytes_this_run = self.byte_offset - (self.start_offset or 0)
+                if self.status == "running" and bytes_this_run > 0:
+                    eta_seconds = round((self.total_bytes - self.byte_offset) * elapsed / bytes_this_run, 1)
+        return {
+            "id": self.id,
+            "filename": os.path.basename(self.filepath),
+            "status": self.status,
+            "workers": self.workers,
+            "incremental": self.incremental,
+            "rows_processed": self.rows_processed,
+            "rows_rejected": self.rows_rejected,
+            "rows_per_second": rows_per_second,
+            "byte_offset": self.byte_offset,
+            "total_bytes": self.total_bytes,
+            "progress": progress,
+            "elapsed_seconds": round(elapsed, 1) if elapsed is not None else None,
+            "eta_seconds": eta_seconds,
+            "error": self.error,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+def job_row_to_dict(job: ImportJob):
+    progress = None
+    if job.total_bytes and job.byte_offset is not None:
+        progress = round(job.byte_offset / job.total_bytes, 4)
+    elapsed = None
+    if job.started_at and job.finished_at:
+        elapsed = round((job.finished_at - job.started_at).total_seconds(), 1)
+    return {
+        "id": job.id,
+        "filename": os.path.basename(job.filepath),
+        "status": job.status,
+        "workers": job.workers,
+        "incremental": job.incremental,
+        "rows_processed": job.rows_processed,
+        "rows_rejected": job.rows_rejected,
+        "rows_per_second": round(job.rows_processed / elapsed, 1) if elapsed else None,
+        "byte_offset": job.byte_offset,
+        "total_bytes": job.total_bytes,
+        "progress": progress,
+        "elapsed_seconds": elapsed,
+        "eta_seconds": None,
+        "error": job.error,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+class ImportJobRegistry:
+    """
+    Queue of CSV import jobs with bounded concurrency. Job rows in the
+    import_jobs table carry the status and a byte offset checkpoint that is
+    written in the same transaction as each imported chunk, so an
+    interrupted single-worker import resumes right after its last committed row.
+    """
+
+    def __init__(self, max_concurrency=IMPORT_MAX_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self._executor = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _submit(self, progress):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="csv-import")
+            self._jobs[progress.id] = progress
+            progress.future = self._executor.submit(self._run, progress)
+
+    def submit(self, filepath, workers=1, incremental=False):
+        job_id = str(uuid.uuid4())
+        with SessionLocal() as db:
+            db.add(ImportJob(id=job_id, filepath=filepath, status="queued", workers=workers, incremental=incremental))
+            db.commit()
+        progress = JobProgress(job_id, filepath, workers, incremental)
+        self._submit(progress)
+        return progress.to_dict()
+
+    def get(self, job_id):
+        progress = self._jobs.get(job_id)
+        if progress is not None:
+            return progress.to_dict()
+        with SessionLocal() as db:
+            job = db.query(ImportJob).filter(ImportJob.id == job_id).first()
+            return job_row_to_dict(job) if job else None
+
+    def list_jobs(self, limit=50):
+        with SessionLocal() as db:
+            jobs = db.query(ImportJob).order_by(ImportJob.created_at.desc()).limit(limit).all()
+        return [
+            self._jobs[job.id].to_dict() if job.id in self._jobs else job_row_to_dict(job)
+            for job in jobs
+        ]
+
+    def cancel(self, job_id):
+        progress = self._jobs.get(job_id)
+        if progress is None or progress.status not in ACTIVE_STATUSES:
+            if self.get(job_id) is None:
+                return None
+            raise ValueError("Only queued or running jobs can be cancelled")
+        if progress.status == "running" and progress.workers > 1:
+            raise ValueError("Parallel imports cannot be cancelled while running")
+        progress.cancel_event.set()
+        if progress.future is not None and progress.future.cancel():
+            self._finish(progress, "cancelled")
+        return progress.to_dict()
+
+    def resume(self, job_id):
+        with SessionLocal() as db:
+            job = db.query(ImportJob).filter(ImportJob.id == job_id).first()
+            if job is None:
+                return None
+            if job.status not in RESUMABLE_STATUSES:
+                raise ValueError(f"Jobs with status '{job.status}' cannot be resumed")
+            if job.workers > 1:
+                raise ValueError("Parallel imports keep no checkpoint and cannot be resumed")
+            if not os.path.exists(job.filepath):
+                raise ValueError(f"CSV file no longer exists: {os.path.basename(job.filepath)}")
+            job.status = "queued"
+            job.error = None
+            job.finished_at = None
+            db.commit()
+            progress = JobProgress(
+                job.id, job.filepath, job.workers, job.incremental,
+                start_offset=job.byte_offset,
+                rows_processed=job.rows_processed,
+                rows_rejected=job.rows_rejected,
+            )
+        self._submit(progress)
+        return progress.to_dict()
+
+    def recover_interrupted(self):
+        # Jobs left queued or running by a previous process can only be resumed
+        with SessionLocal() as db:
+            db.query(ImportJob).filter(ImportJob.status.in_(ACTIVE_STATUSES)).update(
+                {ImportJob.status: "interrupted"}, synchronize_session=False
+            )
+            db.commit()
+
+    def _run(self, progress):
+        # Queued jobs also wait here for watcher scans and stream uploads
+        with import_slots:
+            self._run_import(progress)
+
+    def _run_import(self, progress):
+        if progress.cancel_event.is_set():
+            # Cancelled while waiting for a slot
+            self._finish(progress, "cancelled")
+            return
+        progress.status = "running"
+        progress.started = time.monotonic()
+        progress.started_at = datetime.utcnow()
+
+        def on_chunk(session, cursor, rows_written):
+            cursor.execute(
+                "UPDATE import_jobs SET byte_offset = %s, rows_processed = %s, rows_rejected = %s WHERE id = %s",
+                (
+                    session.offset,
+                    progress.base_rows_processed + session.rows_processed + rows_written,
+                    progress.base_rows_rejected + session.rows_rejected,
+                    progress.id,
+                ),
+            )
+
+        def on_progress(session):
+            progress.byte_offset = session.offset
+            progress.rows_processed = progress.base_rows_processed + session.rows_processed
+            progress.rows_rejected = progress.base_rows_rejected + session.rows_rejected
+            if progress.cancel_event.is_set():
+                raise ImportCancelled()
+
+        try:
+            progress.total_bytes = os.path.getsize(progress.filepath)
+            if progress.byte_offset is None:
+                progress.byte_offset = read_header(progress.filepath)[1]
+                progress.start_offset = progress.byte_offset
+            with SessionLocal() as db:
+                db.query(ImportJob).filter(ImportJob.id == progress.id).update({
+                    ImportJob.status: "running",
+                    ImportJob.started_at: progress.started_at,
+                    ImportJob.total_bytes: progress.total_bytes,
+                }, synchronize_session=False)
+                db.commit()
+
+            summary = import_data_from_csv(
+                progress.filepath,
+                workers=progress.workers,
+                start_offset=progress.start_offset,
+                on_chunk=on_chunk,
+                on_progress=on_progress,
+                incremental=progress.incremental,
+            )
+            if summary is not None and progress.workers > 1:
+                progress.rows_processed = summary["rows_processed"]
+                progress.rows_rejected = summary["rows_rejected"]
+            progress.byte_offset = progress.total_bytes
+            self._finish(progress, "completed")
+        except ImportCancelled:
+            self._finish(progress, "cancelled")
+        except Exception as e:
+            print(f"[IMPORT_JOBS] Job {progress.id} failed: {e}")
+            self._finish(progress, "failed", error=str(e))
+
+    def _finish(self, progress, status, error=None):
+        progress.status = status
+        progress.error = error
+        progress.finished_at = datetime.utcnow()
+        values = {
+            ImportJob.status: status,
+            ImportJob.error: error,
+            ImportJob.finished_at: progress.finished_at,
+        }
+        # Single-worker checkpoints are written with each chunk; parallel jobs only report totals
+        if progress.workers > 1 or status == "completed":
+            values.update({
+                ImportJob.rows_processed: progress.rows_processed,
+                ImportJob.rows_rejected: progress.rows_rejected,
+                ImportJob.byte_offset: progress.byte_offset,
+            })
+        with SessionLocal() as db:
+            db.query(ImportJob).filter(ImportJob.id == progress.id).update(values, synchronize_session=False)
+            db.commit()
+
+import_jobs = ImportJobRegistry()
@@ -0,0 +1,49 @@
+import csv
+import io
+import os
+from itertools import islice
+
+from database import SessionLocal
+from crud.container_readings import get_readings_for_export
+
+# Rows fetched from the server-side cursor and sent per chunk
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", 10000))
+
+EXPORT_FIELDS = ("reading_id", "container_id", "timestamp", "fill_level_litres")
+
+def iter_reading_batches(container_ids=None, from_timestamp=None, to_timestamp=None, batch_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield lists of reading rows read through a server-side cursor, so only
+    one batch is held in memory. The generator opens its own session because
+    a streaming response outlives the request's dependencies.
+    """
+    with SessionLocal() as db:
+        rows = iter(get_readings_for_export(db, container_ids, from_timestamp, to_timestamp).yield_per(batch_size))
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                return
+            yield batch
+
+def iter_ndjson(container_ids=None, from_timestamp=None, to_timestamp=None):
+    # All values are integers or timestamps, so the lines are formatted directly
+    for batch in iter_reading_batches(container_ids, from_timestamp, to_timestamp):
+        yield "".join(
+            f'{{"reading_id":{reading_id},"container_id":{container_id},'
+            f'"timestamp":"{timestamp.isoformat()}","fill_level_litres":{fill}}}\n'
+            for reading_id, container_id, timestamp, fill in batch
+        )
+
+def iter_csv(container_ids=None, from_timestamp=None, to_timestamp=None):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(EXPORT_FIELDS)
+    yield buffer.getvalue()
+    for batch in iter_reading_batches(container_ids, from_timestamp, to_timestamp):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(
+            (reading_id, container_id, timestamp.isoformat(), fill)
+            for reading_id, container_id, timestamp, fill in batch
+        )
+        yield buffer.getvalue()
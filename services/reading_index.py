@@ -0,0 +1,233 @@
+import os
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from database import SessionLocal
+from models.container import Container
+from models.container_readings import ContainerReading
+
+# Keep an in-memory copy of all readings for as-of lookups (see main.py)
+READING_INDEX_ENABLED = os.getenv("READING_INDEX_ENABLED", "true").lower() in ("1", "true", "yes")
+
+EPOCH = datetime(1970, 1, 1)
+
+# Same fields as the rows of crud.container_readings.get_readings_as_of
+AsOfReading = namedtuple(
+    "AsOfReading",
+    "container_id address location_lat location_lng reading_id timestamp fill_level_litres",
+)
+
+def to_seconds(timestamp):
+    # Readings are stored as naive datetimes; an offset in the request is ignored like in the SQL query
+    return (timestamp.replace(tzinfo=None) - EPOCH).total_seconds()
+
+def from_seconds(seconds):
+    return EPOCH + timedelta(seconds=seconds)
+
+class ContainerSeries:
+    """Readings of one container, sorted by timestamp, in parallel typed arrays."""
+
+    __slots__ = ("timestamps", "fills", "reading_ids")
+
+    def __init__(self):
+        self.timestamps = array('d')
+        self.fills = array('l')
+        self.reading_ids = array('q')
+
+    def append(self, timestamp, fill, reading_id):
+        self.timestamps.append(timestamp)
+        self.fills.append(fill)
+        self.reading_ids.append(reading_id)
+
+    def merge(self, rows):
+        """Insert or replace (timestamp, fill, reading_id) rows sorted by timestamp."""
+        if not self.timestamps or rows[0][0] > self.timestamps[-1]:
+            for row in rows:
+                self.append(*row)
+            return
+        for timestamp, fill, reading_id in rows:
+            i = bisect_left(self.timestamps, timestamp)
+            if i < len(self.timestamps) and self.timestamps[i] == timestamp:
+                self.fills[i] = fill
+                self.reading_ids[i] = reading_id
+            else:
+                self.timestamps.insert(i, timestamp)
+                self.fills.insert(i, fill)
+                self.reading_ids.insert(i, reading_id)
+
+    def as_of(self, timestamp, not_before=None):
+        # Index of the latest reading at or before timestamp, or None
+        i = bisect_right(self.timestamps, timestamp) - 1
+        if i < 0 or (not_before is not None and self.timestamps[i] < not_before):
+            return None
+        return i
+
+class ReadingIndex:
+    """
+    In-process copy of container_readings for the timeline slider: per
+    container the sorted timestamps (epoch seconds), fill levels and reading
+    ids in typed arrays, plus the container coordinates. An as-of snapshot is
+    one binary search per container without touching the database.
+
+    The index is loaded once in the background and kept current by the CSV
+    import pipeline, which reports every committed chunk; until it is ready
+    callers fall back to the SQL query. A load or refresh that fails is
+    logged and the whole index is loaded again on the next refresh.
+    """
+
+    def __init__(self):
+        self.series = {}
+        self.containers = {}
+        self.ready = False
+        self.load_failed = False
+        self._loading = False
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def load(self):
+        """(Re)build the index from the database; refreshes arriving meanwhile are replayed."""
+        with self._lock:
+            if self._loading:
+                self._pending.append(None)
+                return
+            self._loading = True
+        try:
+            series, containers = self._read_all()
+            with self._lock:
+                self.series = series
+                self.containers = containers
+                self.ready = True
+                self.load_failed = False
+            print(f"[READING_INDEX] Loaded readings of {len(series)} containers.")
+        except Exception as e:
+            with self._lock:
+                self.load_failed = True
+            print(f"[READING_INDEX] Could not load the readings, retrying on the next import: {e}")
+        finally:
+            with self._lock:
+                self._loading = False
+                pending, self._pending = self._pending, []
+            # After a failure the retry reloads everything the pending refreshes would have read
+            if not self.load_failed:
+                if None in pending:
+                    self.load()
+                else:
+                    for container_ids, first, last in pending:
+                        self.refresh(container_ids, first, last)
+
+    def _read_all(self):
+        series = {}
+        with SessionLocal() as db:
+            containers = {
+                row.id: (row.address, row.location_lat, row.location_lng)
+                for row in db.query(Container.id, Container.address, Container.location_lat, Container.location_lng)
+            }
+            readings = (
+                db.query(
+                    ContainerReading.container_id,
+                    ContainerReading.timestamp,
+                    ContainerReading.fill_level_litres,
+                    ContainerReading.reading_id,
+                )
+                .order_by(ContainerReading.container_id, ContainerReading.timestamp)
+                .yield_per(50000)
+            )
+            current_id = None
+            current = None
+            for container_id, timestamp, fill, reading_id in readings:
+                if container_id != current_id:
+                    current_id = container_id
+                    current = series[container_id] = ContainerSeries()
+                current.append(to_seconds(timestamp), fill, reading_id)
+        return series, containers
+
+    def start(self):
+        threading.Thread(target=self.load, name="reading-index", daemon=True).start()
+
+    def refresh(self, container_ids=None, first=None, last=None):
+        """
+        Re-read the readings of the given containers between first and last
+        after an import committed them; without container ids the whole index is reloaded.
+        """
+        if container_ids is None:
+            self.load()
+            return
+        with self._lock:
+            if self._loading:
+                self._pending.append((container_ids, first, last))
+                return
+            retry = self.load_failed
+            if not retry and not self.ready:
+                return
+        if retry:
+            self.load()
+            return
+        try:
+            rows_by_container, containers = self._read(container_ids, first, last)
+        except Exception as e:
+            with self._lock:
+                self.load_failed = True
+            print(f"[READING_INDEX] Could not refresh the readings, reloading on the next import: {e}")
+            return
+        with self._lock:
+            for row in containers:
+                self.containers[row.id] = (row.address, row.location_lat, row.location_lng)
+            for container_id, rows in rows_by_container.items():
+                self.series.setdefault(container_id, ContainerSeries()).merge(rows)
+
+    def _read(self, container_ids, first, last):
+        # Readings of the containers between first and last as (seconds, fill, reading id) rows per container
+        with SessionLocal() as db:
+            containers = db.query(
+                Container.id, Container.address, Container.location_lat, Container.location_lng
+            ).filter(Container.id.in_(container_ids)).all()
+            readings = (
+                db.query(
+                    ContainerReading.container_id,
+                    ContainerReading.timestamp,
+                    ContainerReading.fill_level_litres,
+                    ContainerReading.reading_id,
+                )
+                .filter(
+                    ContainerReading.container_id.in_(container_ids),
+                    ContainerReading.timestamp.between(first, last),
+                )
+                .order_by(ContainerReading.container_id, ContainerReading.timestamp)
+                .all()
+            )
+        rows_by_container = {}
+        for container_id, timestamp, fill, reading_id in readings:
+            rows_by_container.setdefault(container_id, []).append((to_seconds(timestamp), fill, reading_id))
+        return rows_by_container, containers
+
+    def update_container(self, container):
+        with self._lock:
+            self.containers[container.id] = (container.address, container.location_lat, container.location_lng)
+
+    def remove_container(self, container_id):
+        with self._lock:
+            self.containers.pop(container_id, None)
+            self.series.pop(container_id, None)
+
+    def as_of(self, timestamp, tolerance=None):
+        """Latest reading at or before timestamp per container, like get_readings_as_of."""
+        seconds = to_seconds(timestamp)
+        not_before = seconds - tolerance.total_seconds() if tolerance is not None else None
+        result = []
+        with self._lock:
+            for container_id in sorted(self.series):
+                series = self.series[container_id]
+                container = self.containers.get(container_id)
+                i = series.as_of(seconds, not_before) if container else None
+                if i is None:
+                    continue
+                result.append(AsOfReading(
+                    container_id, *container,
+                    series.reading_ids[i], from_seconds(series.timestamps[i]), series.fills[i],
+                ))
+        return result
+
+reading_index = ReadingIndex()
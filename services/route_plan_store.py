@@ -0,0 +1,294 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+from database import SessionLocal
+from models.container import Container
+from models.truck import Truck
+from services.distance_matrix import haversine_legs, haversine_pairs
+from services.routing import GLASS_TYPES, container_input, glass_type, improve_route, plan_routes, truck_input
+
+# Full re-plan once the distance per collected container exceeds the last full plan's by this fraction
+ROUTE_REPLAN_THRESHOLD = float(os.getenv("ROUTE_REPLAN_THRESHOLD", 0.15))
+# Time given to re-ordering the tour of a truck that moved
+ROUTE_IMPROVE_SECONDS = 0.05
+
+def planning_trucks(db, truck_ids=None):
+    trucks = db.query(Truck)
+    if truck_ids is not None:
+        trucks = trucks.filter(Truck.id.in_(truck_ids))
+    return trucks.order_by(Truck.id).all()
+
+def planning_containers(db, min_fill_ratio, container_type=None):
+    containers = db.query(Container).filter(
+        Container.current_fill > 0,
+        Container.current_fill >= Container.capacity * min_fill_ratio,
+    )
+    if container_type is not None:
+        containers = containers.filter(Container.type == container_type)
+    return containers.order_by(Container.id).all()
+
+def qualifies(container, options):
+    # Same conditions as planning_containers
+    if options["container_type"] is not None and container.type != options["container_type"]:
+        return False
+    return container.current_fill > 0 and container.current_fill >= container.capacity * options["min_fill_ratio"]
+
+class RoutePlanStore:
+    """
+    The current route plan, kept up to date between full plans. A container
+    whose fill or position changed is taken out of its tour and inserted
+    where it adds the least distance (or kept in place when it still fits
+    there); a truck that moved gets its tour re-ordered and a truck with
+    less capacity hands containers to the others. When the distance per
+    collected container has grown by more than ROUTE_REPLAN_THRESHOLD, the
+    next read plans everything from scratch with the same options.
+
+    Observes the spatial index for container changes; truck changes are
+    reported by the truck endpoints. Both are queued and applied when the
+    plan is read.
+    """
+
+    def __init__(self, replan_threshold=ROUTE_REPLAN_THRESHOLD):
+        self.replan_threshold = replan_threshold
+        self.options = None
+        self.trucks = {}  # truck id -> routing input
+        self.routes = {}  # truck id -> container routing inputs in visiting order
+        self.loads = {}
+        self.truck_of = {}  # container id -> truck id of every planned container
+        self.unassigned = {}  # container id -> routing input
+        self.skipped = set()
+        # Meters per collected container after the last full plan
+        self.baseline = None
+        self.elapsed = 0.0
+        self.updates = 0
+        self.stale = False
+        self.pending_containers = {}  # container id -> spatial index entry, None when deleted
+        self.pending_trucks = set()
+        self._lock = threading.RLock()
+        self._pending_lock = threading.Lock()
+
+    # Spatial index observer
+    def reset(self, entries):
+        with self._pending_lock:
+            self.pending_containers = {}
+            self.stale = self.options is not None
+
+    def entry_added(self, entry):
+        with self._pending_lock:
+            self.pending_containers[entry.id] = entry
+
+    def entry_removed(self, entry):
+        with self._pending_lock:
+            self.pending_containers[entry.id] = None
+
+    def truck_changed(self, truck_id):
+        with self._pending_lock:
+            self.pending_trucks.add(truck_id)
+
+    def plan(self, db, options):
+        """Plan from scratch, keep the plan as the current one and return it (None without trucks)."""
+        with self._lock:
+            with self._pending_lock:
+                # Everything queued so far is older than the rows read below
+                self.pending_containers = {}
+                self.pending_trucks = set()
+                self.stale = False
+            trucks = planning_trucks(db, options["truck_ids"])
+            if not trucks:
+                return None
+            containers = planning_containers(db, options["min_fill_ratio"], options["container_type"])
+            plan = plan_routes(trucks, containers, options["time_budget_seconds"], options["return_to_start"])
+            inputs = {
+                container.id: container_input(container, glass_type(container.type))
+                for container in containers if glass_type(container.type) is not None
+            }
+            self.options = dict(options)
+            self.trucks = {truck.id: truck_input(truck) for truck in trucks}
+            self.routes = {route["truck_id"]: [inputs[i] for i in route["container_ids"]] for route in plan["routes"]}
+            self.loads = {route["truck_id"]: dict(route["load"]) for route in plan["routes"]}
+            self.truck_of = {i: route["truck_id"] for route in plan["routes"] for i in route["container_ids"]}
+            self.unassigned = {i: inputs[i] for i in plan["unassigned_container_ids"]}
+            self.skipped = set(plan["skipped_container_ids"])
+            self.baseline = self.distance_per_container()
+            self.elapsed = plan["elapsed_seconds"]
+            self.updates = 0
+            return self.result()
+
+    def current(self):
+        """The current plan with all queued changes applied, or None before the first plan."""
+        with self._lock:
+            if self.options is None:
+                return None
+            started = time.monotonic()
+            self.apply_pending()
+            if self.stale:
+                with SessionLocal() as db:
+                    return self.plan(db, self.options)
+            self.elapsed = time.monotonic() - started
+            return self.result()
+
+    def apply_pending(self):
+        with self._pending_lock:
+            containers, self.pending_containers = self.pending_containers, {}
+            truck_ids, self.pending_trucks = self.pending_trucks, set()
+        if self.stale or not (containers or truck_ids):
+            return
+        if truck_ids:
+            with SessionLocal() as db:
+                rows = {truck.id: truck for truck in db.query(Truck).filter(Truck.id.in_(truck_ids))}
+            for truck_id in sorted(truck_ids):
+                self.update_truck(truck_id, rows.get(truck_id))
+        for container_id, entry in containers.items():
+            self.update_container(container_id, entry)
+        self.updates += len(truck_ids) + len(containers)
+        distance = self.distance_per_container()
+        if self.baseline and distance > self.baseline * (1 + self.replan_threshold):
+            self.stale = True
+
+    def path_points(self, truck_id, stops):
+        truck = self.trucks[truck_id]
+        points = [truck] + stops
+        if self.options["return_to_start"]:
+            points.append(truck)
+        return [point["lat"] for point in points], [point["lng"] for point in points]
+
+    def route_distance(self, truck_id):
+        lats, lngs = self.path_points(truck_id, self.routes[truck_id])
+        return float(haversine_legs(lats, lngs).sum()) if len(lats) > 1 else 0.0
+
+    def distance_per_container(self):
+        collected = len(self.truck_of)
+        if not collected:
+            return None
+        return sum(self.route_distance(truck_id) for truck_id in self.routes) / collected
+
+    def fits(self, truck_id, stop):
+        compartment = stop["compartment"]
+        return self.loads[truck_id][compartment] + stop["demand"] <= self.trucks[truck_id]["capacity"][compartment]
+
+    def insert(self, stop):
+        """Insert a container where it adds the least distance, or leave it unassigned."""
+        best = None
+        for truck_id, stops in self.routes.items():
+            if not self.fits(truck_id, stop):
+                continue
+            lats, lngs = self.path_points(truck_id, stops)
+            to_stop = haversine_pairs([stop["lat"]], [stop["lng"]], lats, lngs)[0]
+            costs = to_stop[:-1] + to_stop[1:] - haversine_legs(lats, lngs)
+            if not self.options["return_to_start"]:
+                # Appending after the last stop only adds the leg to it
+                costs = np.append(costs, to_stop[-1])
+            slot = int(np.argmin(costs))
+            if best is None or costs[slot] < best[0]:
+                best = (costs[slot], truck_id, slot)
+        if best is None:
+            self.unassigned[stop["id"]] = stop
+            return
+        _, truck_id, slot = best
+        self.routes[truck_id].insert(slot, stop)
+        self.loads[truck_id][stop["compartment"]] += stop["demand"]
+        self.truck_of[stop["id"]] = truck_id
+
+    def remove(self, container_id):
+        """Take a container out of the plan; returns its truck id and position, if it had one."""
+        self.unassigned.pop(container_id, None)
+        truck_id = self.truck_of.pop(container_id, None)
+        if truck_id is None:
+            return None, None
+        stops = self.routes[truck_id]
+        position = next(i for i, stop in enumerate(stops) if stop["id"] == container_id)
+        stop = stops.pop(position)
+        self.loads[truck_id][stop["compartment"]] -= stop["demand"]
+        return truck_id, position
+
+    def update_container(self, container_id, entry):
+        compartment = glass_type(entry.type) if entry is not None else None
+        wanted = entry is not None and qualifies(entry, self.options)
+        self.skipped.discard(container_id)
+        if wanted and compartment is None:
+            self.skipped.add(container_id)
+        previous = self.routes[self.truck_of[container_id]] if container_id in self.truck_of else None
+        old_stop = next((stop for stop in previous if stop["id"] == container_id), None) if previous else None
+        truck_id, position = self.remove(container_id)
+        if not wanted or compartment is None:
+            return
+        stop = container_input(entry, compartment)
+        if (truck_id is not None and (old_stop["lat"], old_stop["lng"]) == (stop["lat"], stop["lng"])
+                and self.fits(truck_id, stop)):
+            # Only the fill changed and the truck still has room: keep the stop where it was
+            self.routes[truck_id].insert(position, stop)
+            self.loads[truck_id][compartment] += stop["demand"]
+            self.truck_of[container_id] = truck_id
+            return
+        self.insert(stop)
+
+    def update_truck(self, truck_id, row):
+        if row is None or (self.options["truck_ids"] is not None and truck_id not in self.options["truck_ids"]):
+            # Deleted (or not part of this plan): its containers go to the other trucks
+            if truck_id in self.routes:
+                stops = self.routes.pop(truck_id)
+                del self.trucks[truck_id]
+                del self.loads[truck_id]
+                for stop in stops:
+                    del self.truck_of[stop["id"]]
+                for stop in stops:
+                    self.insert(stop)
+            return
+        truck = truck_input(row)
+        if truck_id not in self.routes:
+            self.trucks[truck_id] = truck
+            self.routes[truck_id] = []
+            self.loads[truck_id] = dict.fromkeys(GLASS_TYPES, 0)
+            for stop in list(self.unassigned.values()):
+                if self.fits(truck_id, stop):
+                    del self.unassigned[stop["id"]]
+                    self.insert(stop)
+            return
+        self.trucks[truck_id] = truck
+        stops = self.routes[truck_id]
+        evicted = []
+        for compartment in GLASS_TYPES:
+            # Lower capacity: hand the largest containers of the compartment to other trucks
+            while self.loads[truck_id][compartment] > truck["capacity"][compartment]:
+                stop = max((s for s in stops if s["compartment"] == compartment), key=lambda s: s["demand"])
+                self.remove(stop["id"])
+                evicted.append(stop)
+        if stops:
+            self.routes[truck_id] = improve_route(truck, stops, self.options["return_to_start"], ROUTE_IMPROVE_SECONDS)
+        for stop in evicted:
+            self.insert(stop)
+
+    def result(self):
+        routes = []
+        for truck_id in sorted(self.routes):
+            stops = self.routes[truck_id]
+            routes.append({
+                "truck_id": truck_id,
+                "container_ids": [stop["id"] for stop in stops],
+                "stops": [
+                    {
+                        "container_id": stop["id"],
+                        "lat": stop["lat"],
+                        "lng": stop["lng"],
+                        "compartment": stop["compartment"],
+                        "demand": stop["demand"],
+                    }
+                    for stop in stops
+                ],
+                "distance_m": round(self.route_distance(truck_id), 1),
+                "load": dict(self.loads[truck_id]),
+                "capacity": dict(self.trucks[truck_id]["capacity"]),
+            })
+        return {
+            "routes": routes,
+            "unassigned_container_ids": sorted(self.unassigned),
+            "skipped_container_ids": sorted(self.skipped),
+            "total_distance_m": round(sum(route["distance_m"] for route in routes), 1),
+            "elapsed_seconds": round(self.elapsed, 3),
+            "incremental_updates": self.updates,
+        }
+
+route_plan_store = RoutePlanStore()
@@ -0,0 +1,357 @@
+import time
+
+import numpy as np
+
+from services.distance_matrix import distance_matrix, haversine_matrix, haversine_pairs, DISTANCE_MATRIX_ENABLED
+from services.spatial_index import spatial_index
+
+# Truck capacity columns (models/truck.py) and the container type spellings that load into them
+GLASS_TYPES = ("white_glass", "green_glass", "brown_glass")
+GLASS_TYPE_KEYWORDS = {
+    "white_glass": ("white", "weiß", "weiss"),
+    "green_glass": ("green", "grün", "gruen"),
+    "brown_glass": ("brown", "braun"),
+}
+
+# Neighbours per container considered for savings merges
+SAVINGS_NEIGHBOURS = 20
+IMPROVEMENT_EPSILON = 1e-6
+
+def glass_type(container_type):
+    """Truck compartment a container type is collected into, or None."""
+    name = (container_type or "").lower()
+    for compartment, keywords in GLASS_TYPE_KEYWORDS.items():
+        if any(keyword in name for keyword in keywords):
+            return compartment
+    return None
+
+def with_free_end(distances):
+    # Extra node at distance 0 from everything: the end of routes that do not return to the start
+    size = distances.shape[0]
+    extended = np.zeros((size + 1, size + 1), dtype=distances.dtype)
+    extended[:size, :size] = distances
+    return extended
+
+class RoutePlanner:
+    """
+    Multi-truck collection planner. Trucks start at their own location and
+    carry white, green and brown glass in separate compartments, so a tour is
+    feasible while every compartment's load stays within its capacity.
+
+    Containers are first assigned to trucks in regret order (largest gap
+    between the nearest and second nearest truck first) while capacity
+    allows. Each truck's tour is built with the Clarke-Wright savings
+    heuristic restricted to nearest neighbours, then improved with 2-opt,
+    or-opt and relocations between tours until nothing improves or the time
+    budget is used up.
+
+    Points are indexed trucks first, then containers; `distances` may be
+    passed in precomputed for exactly that order.
+    """
+
+    def __init__(self, trucks, containers, return_to_start=True, distances=None):
+        self.trucks = trucks
+        self.containers = containers
+        self.return_to_start = return_to_start
+        self.truck_count = len(trucks)
+        if distances is None:
+            points = trucks + containers
+            distances = haversine_matrix([p["lat"] for p in points], [p["lng"] for p in points])
+        self.distances = with_free_end(distances)
+        self.free_end = self.distances.shape[0] - 1
+        self.routes = [[] for _ in trucks]
+        self.loads = [dict.fromkeys(GLASS_TYPES, 0) for _ in trucks]
+        self.unassigned = []
+
+    # Point index of a container / its entry
+    def point(self, container_index):
+        return self.truck_count + container_index
+
+    def container(self, point):
+        return self.containers[point - self.truck_count]
+
+    def path(self, truck_index, route=None):
+        route = self.routes[truck_index] if route is None else route
+        end = truck_index if self.return_to_start else self.free_end
+        return [truck_index] + list(route) + [end]
+
+    def route_distance(self, truck_index):
+        path = self.path(truck_index)
+        return float(sum(self.distances[a, b] for a, b in zip(path, path[1:])))
+
+    def fits(self, truck_index, container):
+        compartment = container["compartment"]
+        capacity = self.trucks[truck_index]["capacity"][compartment]
+        return self.loads[truck_index][compartment] + container["demand"] <= capacity
+
+    def assign(self):
+        if not self.truck_count:
+            self.unassigned = [point for point in range(self.truck_count, self.free_end)]
+            return
+        to_trucks = self.distances[self.truck_count:self.free_end, :self.truck_count]
+        order = np.argsort(to_trucks, axis=1)
+        if self.truck_count > 1:
+            nearest = np.take_along_axis(to_trucks, order[:, :2], axis=1)
+            regret = nearest[:, 1] - nearest[:, 0]
+        else:
+            regret = np.zeros(len(self.containers))
+        for container_index in np.argsort(-regret, kind="stable").tolist():
+            container = self.containers[container_index]
+            for truck_index in order[container_index].tolist():
+                if self.fits(truck_index, container):
+                    self.routes[truck_index].append(self.point(container_index))
+                    self.loads[truck_index][container["compartment"]] += container["demand"]
+                    break
+            else:
+                self.unassigned.append(self.point(container_index))
+
+    def savings_route(self, truck_index):
+        """Order a truck's containers with the savings heuristic (one vehicle, capacity already checked)."""
+        points = self.routes[truck_index]
+        if len(points) < 3:
+            return points
+        d = self.distances
+        nodes = np.array(points)
+        local = d[np.ix_(nodes, nodes)]
+        from_start = d[truck_index, nodes]
+        back = from_start if self.return_to_start else np.zeros(len(nodes))
+        k = min(SAVINGS_NEIGHBOURS, len(nodes) - 1)
+        masked = local.copy()
+        np.fill_diagonal(masked, np.inf)
+        neighbours = np.argpartition(masked, k - 1, axis=1)[:, :k]
+        rows = np.repeat(np.arange(len(nodes)), k)
+        cols = neighbours.ravel()
+        # Joining a route ending in i with one starting in j saves back(i) + start(j) - d(i, j)
+        savings = back[rows] + from_start[cols] - local[rows, cols]
+        route_of = list(range(len(nodes)))
+        chains = {i: [i] for i in range(len(nodes))}
+        for pair in np.argsort(-savings, kind="stable").tolist():
+            i, j = int(rows[pair]), int(cols[pair])
+            route_i, route_j = route_of[i], route_of[j]
+            if route_i == route_j or chains[route_i][-1] != i or chains[route_j][0] != j:
+                continue
+            chains[route_i].extend(chains[route_j])
+            for node in chains.pop(route_j):
+                route_of[node] = route_i
+        # Chains the neighbour lists did not connect are appended nearest first
+        remaining = list(chains.values())
+        ordered = remaining.pop(int(np.argmin([from_start[chain[0]] for chain in remaining])))
+        while remaining:
+            tail = ordered[-1]
+            nearest = int(np.argmin([local[tail, chain[0]] for chain in remaining]))
+            ordered.extend(remaining.pop(nearest))
+        return [points[i] for i in ordered]
+
+    def two_opt(self, truck_index, deadline):
+        path = np.array(self.path(truck_index))
+        d = self.distances
+        improved = False
+        changed = True
+        while changed and time.monotonic() < deadline:
+            changed = False
+            for i in range(1, len(path) - 2):
+                a, b = path[i - 1], path[i]
+                c, e = path[i + 1:-1], path[i + 2:]
+                delta = d[a, c] + d[b, e] - d[a, b] - d[c, e]
+                j = int(np.argmin(delta))
+                if delta[j] < -IMPROVEMENT_EPSILON:
+                    path[i:i + j + 2] = path[i:i + j + 2][::-1].copy()
+                    changed = improved = True
+        self.routes[truck_index] = path[1:-1].tolist()
+        return improved
+
+    def or_opt(self, truck_index, deadline):
+        """Move segments of one to three containers to a cheaper place in the same tour, possibly reversed."""
+        d = self.distances
+        improved = False
+        changed = True
+        while changed and time.monotonic() < deadline:
+            changed = False
+            path = self.path(truck_index)
+            for length in (1, 2, 3):
+                for i in range(1, len(path) - length):
+                    segment = path[i:i + length]
+                    first, last = segment[0], segment[-1]
+                    before, after = path[i - 1], path[i + length]
+                    gain = d[before, first] + d[last, after] - d[before, after]
+                    rest = np.array(path[:i] + path[i + length:])
+                    left, right = rest[:-1], rest[1:]
+                    forward = d[left, first] + d[last, right] - d[left, right]
+                    backward = d[left, last] + d[first, right] - d[left, right]
+                    k = int(np.argmin(np.minimum(forward, backward)))
+                    best = min(forward[k], backward[k])
+                    if best - gain < -IMPROVEMENT_EPSILON:
+                        if backward[k] < forward[k]:
+                            segment = segment[::-1]
+                        path = rest[:k + 1].tolist() + segment + rest[k + 1:].tolist()
+                        changed = improved = True
+            self.routes[truck_index] = path[1:-1]
+        return improved
+
+    def neighbour_lists(self):
+        # The SAVINGS_NEIGHBOURS nearest other containers of every container, as points
+        to_containers = self.distances[self.truck_count:self.free_end, self.truck_count:self.free_end].copy()
+        np.fill_diagonal(to_containers, np.inf)
+        k = min(SAVINGS_NEIGHBOURS, len(self.containers) - 1)
+        if k < 1:
+            return [[] for _ in self.containers]
+        nearest = np.argpartition(to_containers, k - 1, axis=1)[:, :k]
+        return (nearest + self.truck_count).tolist()
+
+    def relocate(self, neighbours, deadline):
+        """
+        Move single containers into another truck's tour, next to one of their
+        nearest neighbours, where that shortens the total distance.
+        """
+        d = self.distances
+        truck_of = {point: truck_index for truck_index, route in enumerate(self.routes) for point in route}
+        improved = False
+        for source in range(self.truck_count):
+            position = 0
+            while position < len(self.routes[source]):
+                if time.monotonic() >= deadline:
+                    return improved
+                path = self.path(source)
+                node = path[position + 1]
+                before, after = path[position], path[position + 2]
+                gain = d[before, node] + d[node, after] - d[before, after]
+                container = self.container(node)
+                best_delta, best_target, best_slot = -IMPROVEMENT_EPSILON, None, None
+                for neighbour in neighbours[node - self.truck_count]:
+                    target = truck_of.get(neighbour)
+                    if target is None or target == source or not self.fits(target, container):
+                        continue
+                    target_path = self.path(target)
+                    index = self.routes[target].index(neighbour) + 1
+                    # Insert just before or just after the neighbour
+                    for slot, left, right in ((index - 1, target_path[index - 1], neighbour),
+                                              (index, neighbour, target_path[index + 1])):
+                        delta = d[left, node] + d[node, right] - d[left, right] - gain
+                        if delta < best_delta:
+                            best_delta, best_target, best_slot = delta, target, slot
+                if best_target is None:
+                    position += 1
+                    continue
+                del self.routes[source][position]
+                self.routes[best_target].insert(best_slot, node)
+                truck_of[node] = best_target
+                compartment = container["compartment"]
+                self.loads[source][compartment] -= container["demand"]
+                self.loads[best_target][compartment] += container["demand"]
+                improved = True
+        return improved
+
+    def improve(self, deadline, neighbours=None):
+        """Local search over all tours; relocations between tours need the neighbour lists."""
+        improved = True
+        while improved and time.monotonic() < deadline:
+            improved = False
+            for truck_index in range(self.truck_count):
+                improved |= self.two_opt(truck_index, deadline)
+                improved |= self.or_opt(truck_index, deadline)
+            if neighbours is not None:
+                improved |= self.relocate(neighbours, deadline)
+
+    def plan(self, time_budget=2.0):
+        started = time.monotonic()
+        deadline = started + time_budget
+        self.assign()
+        neighbours = self.neighbour_lists()
+        for truck_index in range(self.truck_count):
+            self.routes[truck_index] = self.savings_route(truck_index)
+        self.improve(deadline, neighbours)
+        return self.result(time.monotonic() - started)
+
+    def result(self, elapsed):
+        routes = []
+        for truck_index, truck in enumerate(self.trucks):
+            stops = [self.container(point) for point in self.routes[truck_index]]
+            routes.append({
+                "truck_id": truck["id"],
+                "container_ids": [stop["id"] for stop in stops],
+                "stops": [
+                    {
+                        "container_id": stop["id"],
+                        "lat": stop["lat"],
+                        "lng": stop["lng"],
+                        "compartment": stop["compartment"],
+                        "demand": stop["demand"],
+                    }
+                    for stop in stops
+                ],
+                "distance_m": round(self.route_distance(truck_index), 1),
+                "load": dict(self.loads[truck_index]),
+                "capacity": dict(truck["capacity"]),
+            })
+        return {
+            "routes": routes,
+            "unassigned_container_ids": [self.container(point)["id"] for point in self.unassigned],
+            "total_distance_m": round(sum(route["distance_m"] for route in routes), 1),
+            "elapsed_seconds": round(elapsed, 3),
+        }
+
+def improve_route(truck, stops, return_to_start=True, time_budget=0.05):
+    """Reorder one truck's stops with 2-opt and or-opt, starting from their current order."""
+    planner = RoutePlanner([truck], stops, return_to_start)
+    planner.routes[0] = [planner.point(i) for i in range(len(stops))]
+    planner.improve(time.monotonic() + time_budget)
+    return [planner.container(point) for point in planner.routes[0]]
+
+def truck_input(truck):
+    return {
+        "id": truck.id,
+        "lat": truck.location_lat,
+        "lng": truck.location_lng,
+        "capacity": {compartment: getattr(truck, f"{compartment}_capacity") for compartment in GLASS_TYPES},
+    }
+
+def container_input(container, compartment):
+    return {
+        "id": container.id,
+        "lat": container.location_lat,
+        "lng": container.location_lng,
+        "compartment": compartment,
+        "demand": container.current_fill,
+    }
+
+def container_inputs(containers):
+    """Routing inputs for the containers that go into a truck compartment; the rest are returned separately."""
+    inputs = []
+    skipped = []
+    for container in containers:
+        compartment = glass_type(container.type)
+        if compartment is None:
+            skipped.append(container.id)
+        else:
+            inputs.append(container_input(container, compartment))
+    return inputs, skipped
+
+def cached_distances(trucks, containers):
+    """
+    Planner distances with the container block taken from the persisted
+    distance matrix; None when a container is not in it yet.
+    """
+    if not DISTANCE_MATRIX_ENABLED or not spatial_index.ready:
+        return None
+    block = distance_matrix.submatrix([container["id"] for container in containers])
+    if block is None:
+        return None
+    points = trucks + containers
+    lats = [point["lat"] for point in points]
+    lngs = [point["lng"] for point in points]
+    truck_count = len(trucks)
+    distances = np.empty((len(points), len(points)))
+    distances[truck_count:, truck_count:] = block
+    from_trucks = haversine_pairs(lats[:truck_count], lngs[:truck_count], lats, lngs)
+    distances[:truck_count, :] = from_trucks
+    distances[:, :truck_count] = from_trucks.T
+    return distances
+
+def plan_routes(trucks, containers, time_budget=2.0, return_to_start=True):
+    """Plan collection tours for Truck and Container rows."""
+    inputs, skipped = container_inputs(containers)
+    truck_inputs = [truck_input(truck) for truck in trucks]
+    distances = cached_distances(truck_inputs, inputs)
+    plan = RoutePlanner(truck_inputs, inputs, return_to_start, distances).plan(time_budget)
+    plan["skipped_container_ids"] = skipped
+    return plan
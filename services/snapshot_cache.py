@@ -0,0 +1,109 @@
+import math
+import os
+import threading
+from collections import OrderedDict
+
+from services.reading_index import to_seconds, from_seconds
+
+# Opt-in rounding: requests inside one bucket of this width share the snapshot as of the
+# bucket start, which leaves out the readings between it and the requested timestamp.
+# 0 caches every timestamp exactly
+SNAPSHOT_CACHE_BUCKET_SECONDS = int(os.getenv("SNAPSHOT_CACHE_BUCKET_SECONDS", 0))
+# Upper bound for the serialized responses kept in memory (0 disables the cache)
+SNAPSHOT_CACHE_MAX_BYTES = int(os.getenv("SNAPSHOT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+class SnapshotCache:
+    """
+    LRU cache of serialized /containers/readings/nearest responses, keyed by
+    the request timestamp and tolerance, so a cached answer is the same as
+    a computed one. With a bucket width the timestamp is rounded down to the
+    start of its bucket instead and the snapshot is computed as of that
+    instant, so every timestamp in a bucket maps to the same entry. When
+    readings are imported, only the entries at or after the first imported
+    timestamp are dropped.
+    """
+
+    def __init__(self, bucket_seconds=SNAPSHOT_CACHE_BUCKET_SECONDS, max_bytes=SNAPSHOT_CACHE_MAX_BYTES):
+        self.bucket_seconds = bucket_seconds
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        # Bumped by every invalidation so a snapshot computed before it is not stored
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def key(self, timestamp, tolerance=None):
+        """Cache key and the instant the snapshot is computed for (the bucket start when rounding)."""
+        tolerance_seconds = tolerance.total_seconds() if tolerance is not None else None
+        if self.bucket_seconds <= 0:
+            return (to_seconds(timestamp), tolerance_seconds), timestamp
+        bucket_start = math.floor(to_seconds(timestamp) / self.bucket_seconds) * self.bucket_seconds
+        return (bucket_start, tolerance_seconds), from_seconds(bucket_start)
+
+    def get(self, key):
+        with self._lock:
+            body = self.entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key, body, generation):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self.entries[key] = body
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def invalidate(self, first=None):
+        """Drop the entries whose snapshot may include readings at or after first (all without first)."""
+        with self._lock:
+            self.generation += 1
+            if first is None:
+                stale = list(self.entries)
+            else:
+                first_seconds = to_seconds(first)
+                stale = [key for key in self.entries if key[0] >= first_seconds]
+            for key in stale:
+                self.size -= len(self.entries.pop(key))
+            self.invalidations += len(stale)
+
+    def on_readings_committed(self, container_ids=None, first=None, last=None):
+        self.invalidate(first if container_ids is not None else None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "bucket_seconds": self.bucket_seconds,
+                "max_bytes": self.max_bytes,
+                "bytes": self.size,
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+snapshot_cache = SnapshotCache()
@@ -0,0 +1,169 @@
+import math
+import os
+import threading
+from collections import namedtuple
+
+from database import SessionLocal
+from models.container import Container
+
+# Edge length of a grid cell in degrees (0.005 is roughly 550 m of latitude)
+SPATIAL_CELL_DEGREES = float(os.getenv("SPATIAL_CELL_DEGREES", 0.005))
+
+EARTH_RADIUS_M = 6371000.0
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS_M / 180
+
+# The fields of ContainerResponse, so entries can be returned directly
+ContainerEntry = namedtuple(
+    "ContainerEntry",
+    "id name address location_lat location_lng type capacity current_fill last_updated",
+)
+
+def entry_from_row(row):
+    return ContainerEntry(
+        row.id, row.name, row.address, row.location_lat, row.location_lng,
+        row.type, row.capacity, row.current_fill, row.last_updated,
+    )
+
+def fill_ratio(entry):
+    return entry.current_fill / entry.capacity if entry.capacity else 0.0
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    dlat = math.radians(lat2 - lat1)
+    dlng = math.radians(lng2 - lng1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+class SpatialIndex:
+    """
+    In-memory uniform grid over container coordinates. Every container is
+    stored in the cell its coordinates fall into, so radius and bounding-box
+    searches only look at the cells that overlap the search area. Kept in
+    sync by the container endpoints and the CSV import.
+    """
+
+    def __init__(self, cell_degrees=SPATIAL_CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self.entries = {}
+        self.cells = {}
+        self.ready = False
+        # Objects with reset(entries), entry_added(entry) and entry_removed(entry)
+        self.observers = []
+        self._lock = threading.RLock()
+
+    def add_observer(self, observer):
+        with self._lock:
+            self.observers.append(observer)
+            observer.reset(list(self.entries.values()))
+
+    def cell_of(self, lat, lng):
+        return (math.floor(lat / self.cell_degrees), math.floor(lng / self.cell_degrees))
+
+    def _add(self, entry, notify=True):
+        self._remove(entry.id, notify)
+        self.entries[entry.id] = entry
+        self.cells.setdefault(self.cell_of(entry.location_lat, entry.location_lng), set()).add(entry.id)
+        if notify:
+            for observer in self.observers:
+                observer.entry_added(entry)
+
+    def _remove(self, container_id, notify=True):
+        entry = self.entries.pop(container_id, None)
+        if entry is None:
+            return
+        if notify:
+            for observer in self.observers:
+                observer.entry_removed(entry)
+        cell = self.cell_of(entry.location_lat, entry.location_lng)
+        members = self.cells.get(cell)
+        if members is not None:
+            members.discard(container_id)
+            if not members:
+                del self.cells[cell]
+
+    def load(self):
+        with SessionLocal() as db:
+            entries = [entry_from_row(row) for row in db.query(Container)]
+        with self._lock:
+            self.entries = {}
+            self.cells = {}
+            for entry in entries:
+                self._add(entry, notify=False)
+            for observer in self.observers:
+                observer.reset(entries)
+            self.ready = True
+
+    def ensure_loaded(self):
+        if not self.ready:
+            with self._lock:
+                if not self.ready:
+                    self.load()
+
+    def refresh(self, container_ids=None):
+        """Re-read the given containers (all without ids) after they changed in the database."""
+        if not self.ready:
+            return
+        if container_ids is None:
+            self.load()
+            return
+        with SessionLocal() as db:
+            rows = db.query(Container).filter(Container.id.in_(container_ids)).all()
+        with self._lock:
+            for row in rows:
+                self._add(entry_from_row(row))
+
+    def update_container(self, container):
+        if self.ready:
+            with self._lock:
+                self._add(entry_from_row(container))
+
+    def remove_container(self, container_id):
+        with self._lock:
+            self._remove(container_id)
+
+    def _candidates(self, min_lat, min_lng, max_lat, max_lng):
+        min_x, min_y = self.cell_of(min_lat, min_lng)
+        max_x, max_y = self.cell_of(max_lat, max_lng)
+        if (max_x - min_x + 1) * (max_y - min_y + 1) > len(self.cells):
+            # Large areas: checking every occupied cell is cheaper than the empty ones
+            for (x, y), members in self.cells.items():
+                if min_x <= x <= max_x and min_y <= y <= max_y:
+                    yield from members
+            return
+        for x in range(min_x, max_x + 1):
+            for y in range(min_y, max_y + 1):
+                yield from self.cells.get((x, y), ())
+
+    def _matches(self, entry, container_type, min_fill_ratio):
+        if container_type is not None and entry.type != container_type:
+            return False
+        return min_fill_ratio is None or fill_ratio(entry) >= min_fill_ratio
+
+    def near(self, lat, lng, radius_m, container_type=None, min_fill_ratio=None, limit=None):
+        """Containers within radius_m of a point as (entry, distance in m), nearest first."""
+        lat_span = radius_m / METERS_PER_DEGREE
+        lng_span = radius_m / (METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+        result = []
+        with self._lock:
+            for container_id in self._candidates(lat - lat_span, lng - lng_span, lat + lat_span, lng + lng_span):
+                entry = self.entries[container_id]
+                if not self._matches(entry, container_type, min_fill_ratio):
+                    continue
+                distance = haversine_m(lat, lng, entry.location_lat, entry.location_lng)
+                if distance <= radius_m:
+                    result.append((entry, distance))
+        result.sort(key=lambda item: item[1])
+        return result[:limit] if limit is not None else result
+
+    def in_bbox(self, min_lat, min_lng, max_lat, max_lng, container_type=None, min_fill_ratio=None, limit=None):
+        """Containers inside a bounding box, ordered by id."""
+        result = []
+        with self._lock:
+            for container_id in self._candidates(min_lat, min_lng, max_lat, max_lng):
+                entry = self.entries[container_id]
+                if (min_lat <= entry.location_lat <= max_lat and min_lng <= entry.location_lng <= max_lng
+                        and self._matches(entry, container_type, min_fill_ratio)):
+                    result.append(entry)
+        result.sort(key=lambda entry: entry.id)
+        return result[:limit] if limit is not None else result
+
+spatial_index = SpatialIndex()
@@ -0,0 +1,125 @@
+import math
+import os
+import threading
+
+from services.spatial_index import fill_ratio
+
+# Highest zoom level with precomputed clusters; deeper tiles are clustered on request
+TILE_MAX_ZOOM = int(os.getenv("TILE_MAX_ZOOM", 14))
+# A tile is split into CELLS_PER_SIDE x CELLS_PER_SIDE cells, one cluster per occupied cell
+CELLS_PER_SIDE = 8
+CELL_ZOOM_OFFSET = 3  # log2(CELLS_PER_SIDE)
+
+MAX_MERCATOR_LAT = 85.05112878
+
+def mercator_fraction(lat, lng):
+    """Web Mercator position of a coordinate as fractions (0..1) of the world width and height."""
+    lat = max(-MAX_MERCATOR_LAT, min(MAX_MERCATOR_LAT, lat))
+    x = (lng + 180.0) / 360.0
+    y = (1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0
+    return min(max(x, 0.0), 1.0 - 1e-12), min(max(y, 0.0), 1.0 - 1e-12)
+
+def tile_bounds(z, x, y):
+    # (min_lat, min_lng, max_lat, max_lng) of a tile
+    n = 2 ** z
+    min_lng = x / n * 360.0 - 180.0
+    max_lng = (x + 1) / n * 360.0 - 180.0
+    max_lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    min_lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return min_lat, min_lng, max_lat, max_lng
+
+def cluster_dict(cell):
+    count, ratio_sum, lat_sum, lng_sum, id_sum = cell
+    cluster = {
+        "count": count,
+        "avg_fill_ratio": round(ratio_sum / count, 4),
+        "lat": lat_sum / count,
+        "lng": lng_sum / count,
+    }
+    if count == 1:
+        cluster["container_id"] = id_sum
+    return cluster
+
+class TilePyramid:
+    """
+    Precomputed map clusters for zoom levels 0..TILE_MAX_ZOOM. Each tile is
+    divided into 8x8 cells, so a tile never returns more than 64 clusters;
+    per cell the count, the summed fill ratio and the summed coordinates are
+    kept, which gives the average fill ratio and the centroid.
+    Observes the spatial index: a changed container takes its old
+    contribution out of one cell per level and adds the new one.
+    """
+
+    def __init__(self, max_zoom=TILE_MAX_ZOOM):
+        self.max_zoom = max_zoom
+        # One dict per cell level (zoom + 3): (cell_x, cell_y) -> [count, ratio_sum, lat_sum, lng_sum, id_sum];
+        # the id sum of a single-container cell is that container's id
+        self.levels = []
+        self._lock = threading.Lock()
+        self.reset([])
+
+    def _cell_keys(self, entry):
+        fx, fy = mercator_fraction(entry.location_lat, entry.location_lng)
+        for level in range(CELL_ZOOM_OFFSET, self.max_zoom + CELL_ZOOM_OFFSET + 1):
+            n = 1 << level
+            yield self.levels[level - CELL_ZOOM_OFFSET], (int(fx * n), int(fy * n))
+
+    def _apply(self, entry, sign):
+        ratio = fill_ratio(entry)
+        for cells, key in self._cell_keys(entry):
+            cell = cells.get(key)
+            if cell is None:
+                cell = cells[key] = [0, 0.0, 0.0, 0.0, 0]
+            cell[0] += sign
+            if cell[0] <= 0:
+                del cells[key]
+                continue
+            cell[1] += sign * ratio
+            cell[2] += sign * entry.location_lat
+            cell[3] += sign * entry.location_lng
+            cell[4] += sign * entry.id
+
+    def reset(self, entries):
+        with self._lock:
+            self.levels = [{} for _ in range(self.max_zoom + 1)]
+            for entry in entries:
+                self._apply(entry, 1)
+
+    def entry_added(self, entry):
+        with self._lock:
+            self._apply(entry, 1)
+
+    def entry_removed(self, entry):
+        with self._lock:
+            self._apply(entry, -1)
+
+    def tile(self, z, x, y):
+        """Clusters of the occupied cells of a precomputed tile."""
+        first_x, first_y = x * CELLS_PER_SIDE, y * CELLS_PER_SIDE
+        with self._lock:
+            cells = self.levels[z]
+            return [
+                cluster_dict(cells[(cell_x, cell_y)])
+                for cell_y in range(first_y, first_y + CELLS_PER_SIDE)
+                for cell_x in range(first_x, first_x + CELLS_PER_SIDE)
+                if (cell_x, cell_y) in cells
+            ]
+
+def cluster_entries(entries, z, x, y):
+    """Cluster the containers of a tile above TILE_MAX_ZOOM into its 8x8 cells."""
+    n = 1 << (z + CELL_ZOOM_OFFSET)
+    cells = {}
+    for entry in entries:
+        fx, fy = mercator_fraction(entry.location_lat, entry.location_lng)
+        key = (int(fx * n), int(fy * n))
+        if key[0] // CELLS_PER_SIDE != x or key[1] // CELLS_PER_SIDE != y:
+            continue
+        cell = cells.setdefault(key, [0, 0.0, 0.0, 0.0, 0])
+        cell[0] += 1
+        cell[1] += fill_ratio(entry)
+        cell[2] += entry.location_lat
+        cell[3] += entry.location_lng
+        cell[4] += entry.id
+    return [cluster_dict(cells[key]) for key in sorted(cells, key=lambda key: (key[1], key[0]))]
+
+tile_pyramid = TilePyramid()
@@ -0,0 +1,120 @@
+import heapq
+import itertools
+import os
+import threading
+
+from services.co2 import estimate_co2_emission
+from services.spatial_index import fill_ratio
+
+# The urgency of a container is the extra CO2 of leaving it this many more hours
+URGENCY_DELAY_HOURS = float(os.getenv("URGENCY_DELAY_HOURS", 24))
+# A type's heap is rebuilt once it holds this many times more items than containers
+COMPACT_FACTOR = 2
+
+def delay_cost(entry, delayed_hours=URGENCY_DELAY_HOURS):
+    return estimate_co2_emission(
+        entry.current_fill, entry.capacity, entry.last_updated,
+        entry.location_lat, entry.location_lng, delayed_hours=delayed_hours,
+    )
+
+class UrgencyQueue:
+    """
+    Containers ranked by urgency in one binary heap per container type: the
+    CO2 cost of delaying their pickup by URGENCY_DELAY_HOURS
+    (services/co2.py), then the fill ratio, most urgent first.
+
+    Observes the spatial index. A changed container is pushed again with its
+    new rank in O(log n) and its older heap item becomes stale; stale items
+    are dropped when they reach the top and the heap is rebuilt once they
+    outnumber the live ones. Reading the top k pops k live items and pushes
+    them back, O(k log n) without looking at the other containers.
+    """
+
+    def __init__(self, delayed_hours=URGENCY_DELAY_HOURS):
+        self.delayed_hours = delayed_hours
+        self.heaps = {}  # type -> [(-cost, -fill ratio, container id, sequence)]
+        self.live = {}  # container id -> (type, sequence) of its current heap item
+        self.entries = {}
+        self.counts = {}  # type -> number of live containers
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    def _item(self, entry):
+        return (-delay_cost(entry, self.delayed_hours), -fill_ratio(entry), entry.id, next(self._sequence))
+
+    def _push(self, entry):
+        item = self._item(entry)
+        heapq.heappush(self.heaps.setdefault(entry.type, []), item)
+        self.live[entry.id] = (entry.type, item[3])
+        self.entries[entry.id] = entry
+        self.counts[entry.type] = self.counts.get(entry.type, 0) + 1
+
+    def _drop(self, container_id):
+        current = self.live.pop(container_id, None)
+        if current is None:
+            return
+        container_type = current[0]
+        del self.entries[container_id]
+        self.counts[container_type] -= 1
+        heap = self.heaps[container_type]
+        if not self.counts[container_type]:
+            del self.counts[container_type]
+            del self.heaps[container_type]
+        elif len(heap) > COMPACT_FACTOR * self.counts[container_type] + 64:
+            self.heaps[container_type] = [item for item in heap if self._is_live(container_type, item)]
+            heapq.heapify(self.heaps[container_type])
+
+    def _is_live(self, container_type, item):
+        return self.live.get(item[2]) == (container_type, item[3])
+
+    # Spatial index observer
+    def reset(self, entries):
+        with self._lock:
+            self.heaps, self.live, self.entries, self.counts = {}, {}, {}, {}
+            for entry in entries:
+                item = self._item(entry)
+                self.heaps.setdefault(entry.type, []).append(item)
+                self.live[entry.id] = (entry.type, item[3])
+                self.entries[entry.id] = entry
+                self.counts[entry.type] = self.counts.get(entry.type, 0) + 1
+            for heap in self.heaps.values():
+                heapq.heapify(heap)
+
+    def entry_added(self, entry):
+        with self._lock:
+            self._drop(entry.id)
+            self._push(entry)
+
+    def entry_removed(self, entry):
+        with self._lock:
+            self._drop(entry.id)
+
+    def _top_of_type(self, container_type, k):
+        heap = self.heaps.get(container_type)
+        if not heap:
+            return []
+        taken = []
+        while heap and len(taken) < k:
+            item = heapq.heappop(heap)
+            if self._is_live(container_type, item):
+                taken.append(item)
+        for item in taken:
+            heapq.heappush(heap, item)
+        return taken
+
+    def top(self, k, container_type=None):
+        """
+        The k most urgent containers (of one type, or of all types) as
+        (entry, fill ratio, CO2 cost of the delay in kg).
+        """
+        with self._lock:
+            if container_type is not None:
+                items = self._top_of_type(container_type, k)
+            else:
+                # The overall top k is among the top k of every type
+                items = heapq.nsmallest(k, (
+                    item for heap_type in list(self.heaps) for item in self._top_of_type(heap_type, k)
+                ))
+            return [(self.entries[item[2]], -item[1], -item[0]) for item in items]
+
+urgency_queue = UrgencyQueue()
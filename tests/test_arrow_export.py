@@ -0,0 +1,87 @@
+import io
+from collections import namedtuple
+from datetime import datetime
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+import services.arrow_export as arrow_export
+from services.arrow_export import ContainerColumns, READINGS_SCHEMA, iter_export_bytes
+
+ContainerRow = namedtuple("ContainerRow", "id name address type location_lat location_lng capacity")
+
+def container_row(container_id, container_type="green_glass"):
+    return ContainerRow(
+        container_id, f"C{container_id}", f"Street {container_id}", container_type,
+        48.0 + container_id / 100, 11.0 + container_id / 100, 1000 + container_id,
+    )
+
+class ContainerTable:
+    """Container rows that can change between two loads, like the table during an import."""
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.loads = 0
+
+    def __call__(self):
+        self.loads += 1
+        return sorted(self.rows)
+
+def test_take_returns_the_metadata_of_each_rows_container():
+    columns = ContainerColumns(ContainerTable([container_row(2), container_row(5, "white_glass"), container_row(9)]))
+    taken, found = columns.take(np.array([9, 2, 5, 9]))
+    assert found.all()
+    assert taken[0].to_pylist() == ["C9", "C2", "C5", "C9"]
+    assert taken[2].to_pylist() == ["green_glass", "green_glass", "white_glass", "green_glass"]
+    assert taken[5].to_pylist() == [1009, 1002, 1005, 1009]
+
+@pytest.mark.parametrize("new_id", [3, 12])
+def test_containers_created_during_the_export_are_loaded(new_id):
+    # 3 would land between known ids, 12 past the end of the snapshot
+    table = ContainerTable([container_row(2), container_row(5)])
+    columns = ContainerColumns(table)
+    table.rows.append(container_row(new_id, "brown_glass"))
+    taken, found = columns.take(np.array([2, new_id, 5]))
+    assert found.all() and table.loads == 2
+    assert taken[0].to_pylist() == ["C2", f"C{new_id}", "C5"]
+    assert taken[2].to_pylist() == ["green_glass", "brown_glass", "green_glass"]
+
+def test_rows_of_deleted_containers_are_left_out():
+    table = ContainerTable([container_row(2), container_row(5)])
+    columns = ContainerColumns(table)
+    table.rows = [container_row(2)]
+    taken, found = columns.take(np.array([2, 5, 7]))
+    assert found.tolist() == [True, False, False]
+    assert taken[0].to_pylist() == ["C2"]
+
+@pytest.fixture
+def export_source(monkeypatch):
+    table = ContainerTable([container_row(1), container_row(2)])
+    batches = [
+        [(1, 1, datetime(2024, 1, 1, 8), 100), (2, 2, datetime(2024, 1, 1, 8), 200)],
+        # Container 3 was imported after the export loaded the containers
+        [(3, 3, datetime(2024, 1, 1, 9), 300), (4, 1, datetime(2024, 1, 1, 9), 150)],
+    ]
+
+    def iter_reading_batches(container_ids=None, from_timestamp=None, to_timestamp=None, batch_size=None):
+        yield batches[0]
+        table.rows.append(container_row(3, "white_glass"))
+        yield batches[1]
+
+    monkeypatch.setattr(arrow_export, "load_container_rows", table)
+    monkeypatch.setattr(arrow_export, "iter_reading_batches", iter_reading_batches)
+
+@pytest.mark.parametrize("export_format", ["arrow", "parquet"])
+def test_export_streams_every_reading_with_its_container(export_source, export_format):
+    data = b"".join(iter_export_bytes(export_format))
+    if export_format == "arrow":
+        table = pa.ipc.open_stream(io.BytesIO(data)).read_all()
+    else:
+        table = pq.read_table(io.BytesIO(data))
+    assert table.schema.names == READINGS_SCHEMA.names
+    assert table.column("reading_id").to_pylist() == [1, 2, 3, 4]
+    assert table.column("name").to_pylist() == ["C1", "C2", "C3", "C1"]
+    assert table.column("type").to_pylist() == ["green_glass", "green_glass", "white_glass", "green_glass"]
+    assert table.column("capacity").to_pylist() == [1001, 1002, 1003, 1001]
@@ -0,0 +1,64 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from services.co2 import estimate_co2_emission, summarize_co2
+from services.tile_pyramid import mercator_fraction
+
+DELAYS = [0, 1, 6, 24]
+
+def random_rows(seed, count=200):
+    rng = np.random.default_rng(seed)
+    rows = []
+    for i in range(count):
+        capacity = int(rng.choice([0, 1100, 2500, 3200]))
+        rows.append(SimpleNamespace(
+            current_fill=int(rng.integers(0, capacity + 1)),
+            capacity=capacity,
+            type=["Weißglas", "Grünglas", "Braunglas"][int(rng.integers(3))],
+            address=f"Street {i}, {rng.choice(['68159', '68161'])} Mannheim" if i % 10 else "Unknown street",
+            location_lat=49.4 + rng.uniform(-0.2, 0.2),
+            location_lng=8.46 + rng.uniform(-0.2, 0.2),
+        ))
+    return rows
+
+def expected_kg(rows):
+    return [
+        sum(estimate_co2_emission(row.current_fill, row.capacity, None, None, None, hours) for row in rows)
+        for hours in DELAYS
+    ]
+
+def tile_key(row, zoom):
+    fx, fy = mercator_fraction(row.location_lat, row.location_lng)
+    return f"{zoom}/{int(fx * 2 ** zoom)}/{int(fy * 2 ** zoom)}"
+
+@pytest.mark.parametrize("seed", range(3))
+def test_totals_match_the_per_container_estimate(seed):
+    rows = random_rows(seed)
+    summary = summarize_co2(rows, DELAYS)
+    assert summary["delayed_hours"] == DELAYS
+    assert summary["container_count"] == len(rows)
+    assert summary["total_kg"] == pytest.approx(expected_kg(rows), abs=1e-3)
+    assert summary["groups"] is None
+
+@pytest.mark.parametrize("group_by, key", [
+    ("type", lambda row: row.type),
+    ("postal_code", lambda row: row.address.split(", ")[1][:5] if ", " in row.address else "unknown"),
+    ("tile", lambda row: tile_key(row, 12)),
+])
+def test_group_totals_match_the_per_container_estimate(group_by, key):
+    rows = random_rows(0)
+    groups = {}
+    for row in rows:
+        groups.setdefault(key(row), []).append(row)
+    summary = summarize_co2(rows, DELAYS, group_by)
+    assert [group["key"] for group in summary["groups"]] == sorted(groups)
+    for group in summary["groups"]:
+        assert group["container_count"] == len(groups[group["key"]])
+        assert group["total_kg"] == pytest.approx(expected_kg(groups[group["key"]]), abs=1e-3)
+
+def test_no_containers():
+    summary = summarize_co2([], DELAYS, "type")
+    assert summary["total_kg"] == [0.0] * len(DELAYS)
+    assert summary["groups"] == []
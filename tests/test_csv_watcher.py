@@ -0,0 +1,92 @@
+import os
+
+import pytest
+
+import services.csv_watcher as csv_watcher
+from services.csv_watcher import CsvDirectoryWatcher
+
+HEADER = "Label,Location,Latitude,Longitude,Datum,Uhrzeit,Füllstand,Containergröße,Container-Typ\n"
+
+def row(i):
+    return f'C{i},"Street {i}","48,1","11,5",2024-01-01,10:{i:02d},"0.{i}","3,2",Grünglas\n'
+
+class FakeSession:
+    """Stands in for ImportSession and records the lines it was given."""
+
+    sessions = []
+
+    def __init__(self, header, rejects_path, chunk_size, resume=False):
+        self.header = header
+        self.lines = []
+        self.rows_processed = 0
+        self.rows_rejected = 0
+        FakeSession.sessions.append(self)
+
+    def import_lines(self, reader):
+        self.lines = list(reader)
+        self.rows_processed = len(self.lines)
+
+    def update_container_fills(self):
+        pass
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def watcher(tmp_path, monkeypatch):
+    FakeSession.sessions = []
+    reads = []
+    complete_lines_end = csv_watcher.complete_lines_end
+
+    def counting_complete_lines_end(filepath, offset, size):
+        reads.append(offset)
+        return complete_lines_end(filepath, offset, size)
+
+    monkeypatch.setattr(csv_watcher, "ImportSession", FakeSession)
+    monkeypatch.setattr(csv_watcher, "complete_lines_end", counting_complete_lines_end)
+    watcher = CsvDirectoryWatcher(str(tmp_path), interval=0)
+    watcher.reads = reads
+    return watcher
+
+def append(path, text):
+    with open(path, "a", encoding="utf-8") as csv_file:
+        csv_file.write(text)
+
+def test_only_new_complete_lines_are_imported(watcher, tmp_path):
+    path = tmp_path / "sensors.csv"
+    append(path, HEADER + row(1) + row(2))
+    assert watcher.scan() == 2
+    append(path, row(3) + 'C4,"Street 4","48,1","11')
+    assert watcher.scan() == 1
+    assert FakeSession.sessions[-1].lines == [row(3)]
+    append(path, ',5",2024-01-01,10:04,"0.4","3,2",Grünglas\n')
+    assert watcher.scan() == 1
+    assert FakeSession.sessions[-1].lines == [row(4)]
+
+def test_unchanged_files_are_skipped_without_reading_them(watcher, tmp_path):
+    path = tmp_path / "sensors.csv"
+    append(path, HEADER + row(1) + "C2,partial")
+    watcher.scan()
+    reads, sessions = len(watcher.reads), len(FakeSession.sessions)
+    for _ in range(3):
+        assert watcher.scan() == 0
+    assert len(watcher.reads) == reads
+    assert len(FakeSession.sessions) == sessions
+
+def test_state_survives_a_restart(watcher, tmp_path):
+    path = tmp_path / "sensors.csv"
+    append(path, HEADER + row(1))
+    watcher.scan()
+    restarted = CsvDirectoryWatcher(str(tmp_path), interval=0)
+    assert restarted.scan() == 0
+    assert len(FakeSession.sessions) == 1
+
+def test_replaced_file_is_read_from_the_start(watcher, tmp_path):
+    path = tmp_path / "sensors.csv"
+    append(path, HEADER + row(1) + row(2))
+    watcher.scan()
+    replacement = tmp_path / "replacement.tmp"
+    append(replacement, HEADER + row(5))
+    os.replace(replacement, path)
+    assert watcher.scan() == 1
+    assert FakeSession.sessions[-1].lines == [row(5)]
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from services.fill_forecast import FillForecast
+
+HOUR = 3600.0
+
+def add(forecast, rows):
+    container_ids, seconds, fills = zip(*rows)
+    forecast.add_readings(
+        np.array(container_ids, dtype=np.int64),
+        np.array(seconds, dtype=np.float64),
+        np.array(fills, dtype=np.float64),
+    )
+
+def fitted_rate(rows):
+    hours = np.array([row[1] for row in rows]) / HOUR
+    return np.polyfit(hours, [row[2] for row in rows], 1)[0]
+
+def test_rate_is_the_least_squares_slope():
+    rows = [(1, i * HOUR, 100 + 20 * i + (5 if i % 2 else -5)) for i in range(8)]
+    forecast = FillForecast(emptying_ratio=0.5)
+    add(forecast, rows)
+    rate, last_seconds, last_fill = forecast.rates([1])
+    assert rate[0] == pytest.approx(fitted_rate(rows))
+    assert last_seconds[0] == rows[-1][1]
+    assert last_fill[0] == rows[-1][2]
+
+def test_segment_restarts_at_an_emptying():
+    before = [(1, i * HOUR, 200 + 50 * i) for i in range(5)]
+    after = [(1, (5 + i) * HOUR, 10 + 10 * i) for i in range(4)]
+    forecast = FillForecast(emptying_ratio=0.5)
+    add(forecast, before + after)
+    slot = forecast.slot_of[1]
+    assert forecast.count[slot] == len(after)
+    assert forecast.origin[slot] == after[0][1]
+    assert forecast.rates([1])[0][0] == pytest.approx(10.0)
+
+def test_emptying_at_the_start_of_a_later_batch_restarts_the_segment():
+    forecast = FillForecast(emptying_ratio=0.5)
+    add(forecast, [(1, i * HOUR, 200 + 50 * i) for i in range(5)])
+    after = [(1, (5 + i) * HOUR, 10 + 30 * i) for i in range(3)]
+    add(forecast, after)
+    slot = forecast.slot_of[1]
+    assert forecast.count[slot] == len(after)
+    assert forecast.origin[slot] == after[0][1]
+    assert forecast.rates([1])[0][0] == pytest.approx(30.0)
+
+def test_small_drop_does_not_restart_the_segment():
+    rows = [(1, 0.0, 400), (1, HOUR, 500), (1, 2 * HOUR, 450), (1, 3 * HOUR, 600)]
+    forecast = FillForecast(emptying_ratio=0.5)
+    add(forecast, rows)
+    assert forecast.count[forecast.slot_of[1]] == len(rows)
+    assert forecast.rates([1])[0][0] == pytest.approx(fitted_rate(rows))
+
+def test_batches_give_the_same_sums_as_one_pass():
+    rng = np.random.default_rng(1)
+    rows = []
+    for container_id in range(1, 6):
+        fill = 0.0
+        for i in range(40):
+            fill = fill + rng.uniform(0, 30) if rng.random() > 0.1 else rng.uniform(0, 5)
+            rows.append((container_id, i * HOUR, round(fill, 1)))
+    whole = FillForecast(emptying_ratio=0.5)
+    add(whole, rows)
+    by_time = sorted(rows, key=lambda row: row[1])
+    split = FillForecast(emptying_ratio=0.5)
+    for start in range(0, len(by_time), 37):
+        # add_readings wants each batch sorted by container and time
+        add(split, sorted(by_time[start:start + 37]))
+    ids = list(range(1, 6))
+    for expected, actual in zip(whole.rates(ids), split.rates(ids)):
+        np.testing.assert_allclose(actual, expected, rtol=1e-9, equal_nan=True)
+    for name in ("count", "sum_x", "sum_y", "sum_xx", "sum_xy", "origin"):
+        order = [split.slot_of[i] for i in ids]
+        np.testing.assert_allclose(getattr(split, name)[order], getattr(whole, name)[[whole.slot_of[i] for i in ids]])
+
+def test_unknown_and_single_reading_containers_have_no_rate():
+    forecast = FillForecast()
+    add(forecast, [(1, 0.0, 100)])
+    rate, last_seconds, _ = forecast.rates([1, 2])
+    assert np.isnan(rate).all()
+    assert last_seconds[0] == 0.0 and np.isnan(last_seconds[1])
@@ -0,0 +1,261 @@
+import csv
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from scripts.import_csv import (
+    COLLECTION_EMPTYING_RATIO, GLOBAL_STATS_ID, LineReader, RejectsWriter, StreamRowDecoder, bucket_ranges,
+    column_indexes, parse_chunk, parse_decimal_column, parse_timestamp_column, read_header, skip_seen_rows,
+    split_byte_ranges, summarize_chunk, update_collection_events, update_reading_stats, update_rollups,
+)
+
+HEADER = ["Label", "Füllstand"]
+
+CSV_HEADER = ["Label", "Location", "Latitude", "Longitude", "Datum", "Uhrzeit", "Füllstand", "Containergröße", "Container-Typ"]
+
+def sensor_row(label="C1", lat="49,400", lng="8,4600", date="2024-01-01", time="10:00", fill="0.40", size="3,2"):
+    return [label, f"Street {label}", lat, lng, date, time, fill, size, "Weißglas"]
+
+def parse(rows):
+    return parse_chunk(rows, column_indexes(CSV_HEADER), len(CSV_HEADER))
+
+def test_decimal_columns_accept_commas_and_mark_bad_values():
+    parsed = parse_decimal_column(np.array(["3,2", " 0.40 ", "12", "x", ""]))
+    assert parsed[:3].tolist() == [3.2, 0.4, 12.0]
+    assert np.isnan(parsed[3:]).all()
+
+def test_timestamp_columns_combine_date_and_time():
+    parsed = parse_timestamp_column(np.array(["2024-01-01", "2024-02-30", "2024-03-05"]), np.array(["10:05", "10:00", "7:5"]))
+    assert parsed[0] == np.datetime64("2024-01-01T10:05:00")
+    assert np.isnat(parsed[1])
+    # Chunks with a bad value fall back to strptime, which accepts unpadded times like the old importer
+    assert parsed[2] == np.datetime64("2024-03-05T07:05:00")
+
+def test_chunk_is_parsed_column_wise_in_litres():
+    columns, rejects = parse([sensor_row(), sensor_row("C2", time="11:30", fill="2,54", size="1.5")])
+    assert rejects == []
+    assert columns["name"].tolist() == ["C1", "C2"]
+    assert columns["address"].tolist() == ["Street C1", "Street C2"]
+    assert columns["location_lat"].tolist() == [49.4, 49.4]
+    assert columns["capacity"].tolist() == [3200, 1500]
+    assert columns["fill_level_litres"].tolist() == [400, 2540]
+    assert columns["timestamp"].tolist() == [datetime(2024, 1, 1, 10, 0), datetime(2024, 1, 1, 11, 30)]
+
+def test_invalid_rows_are_rejected_with_the_first_failing_column():
+    good = sensor_row()
+    short = good[:-1]
+    bad_lat = sensor_row("C2", lat="north")
+    bad_fill_and_time = sensor_row("C3", fill="full", time="noon")
+    bad_time = sensor_row("C4", date="01.01.2024")
+    columns, rejects = parse([good, short, bad_lat, bad_fill_and_time, bad_time])
+    assert columns["name"].tolist() == ["C1"]
+    assert rejects == [
+        (short, "wrong number of fields"),
+        (bad_lat, "invalid Latitude"),
+        (bad_fill_and_time, "invalid Füllstand"),
+        (bad_time, "invalid Datum/Uhrzeit"),
+    ]
+
+def test_chunk_without_valid_rows_has_no_columns():
+    columns, rejects = parse([sensor_row(fill="?"), ["too", "short"]])
+    assert columns is None
+    assert len(rejects) == 2
+
+def test_missing_columns_are_reported_by_name():
+    with pytest.raises(ValueError, match="Füllstand, Containergröße"):
+        column_indexes([name for name in CSV_HEADER if name not in ("Füllstand", "Containergröße")])
+
+def read_rejects(path):
+    with open(path, encoding="utf-8", newline="") as rejects_file:
+        return list(csv.reader(rejects_file))
+
+def test_rejects_are_written_once_their_chunk_is_committed(tmp_path):
+    path = tmp_path / "data.csv.rejects.csv"
+    rejects = RejectsWriter(str(path), HEADER)
+    rejects.add([(["a", "x"], "bad fill")])
+    assert rejects.count == 1
+    assert not path.exists()
+    rejects.flush()
+    rejects.add([(["b", "y"], "bad fill")])
+    rejects.close()
+    assert read_rejects(path) == [HEADER + ["reason"], ["a", "x", "bad fill"]]
+
+def test_rejects_of_a_rolled_back_chunk_are_dropped(tmp_path):
+    path = tmp_path / "data.csv.rejects.csv"
+    rejects = RejectsWriter(str(path), HEADER)
+    rejects.add([(["a", "x"], "bad fill")])
+    rejects.flush()
+    rejects.add([(["b", "y"], "bad fill"), (["c", "z"], "bad fill")])
+    rejects.discard()
+    assert rejects.count == 1
+    rejects.close()
+    # A resumed run continues the file and reads the rolled back chunk again
+    resumed = RejectsWriter(str(path), HEADER, append=True)
+    resumed.add([(["b", "y"], "bad fill")])
+    resumed.flush()
+    resumed.close()
+    assert read_rejects(path) == [HEADER + ["reason"], ["a", "x", "bad fill"], ["b", "y", "bad fill"]]
+
+class RecordingCursor:
+    """Records statements; every fetchall() returns the next of the given results."""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.statements = []
+
+    def execute(self, sql, params=None):
+        self.statements.append((" ".join(sql.split()), list(params or [])))
+
+    def executemany(self, sql, rows):
+        self.statements.append((" ".join(sql.split()), list(rows)))
+
+    def fetchall(self):
+        return self.results.pop(0)
+
+def test_collection_events_are_recomputed_between_the_neighbour_readings():
+    ids = np.array([7, 3, 7, 3])
+    timestamps = np.array(
+        ["2024-01-01T10:00", "2024-01-01T11:00", "2024-01-01T12:00", "2024-01-01T13:00"], dtype="datetime64[s]",
+    )
+    summary = summarize_chunk(ids, timestamps, np.array([100, 200, 20, 250]))
+    cursor = RecordingCursor([
+        # Container 3 has an older reading, container 7 a newer one
+        {"container_id": 3, "timestamp": datetime(2024, 1, 1, 9, 0)},
+        {"container_id": 7, "timestamp": datetime(2024, 1, 1, 15, 0)},
+    ])
+    update_collection_events(cursor, summary)
+    assert not cursor.results
+    seeks, delete, recompute = cursor.statements
+    # Seeks run container by container in ascending id order, like the rollup locks
+    assert seeks[1] == [3, datetime(2024, 1, 1, 11), 3, datetime(2024, 1, 1, 13),
+                        7, datetime(2024, 1, 1, 10), 7, datetime(2024, 1, 1, 12)]
+    assert seeks[0].count("FOR SHARE") == 4
+    assert delete[0].startswith("DELETE FROM collection_events")
+    assert delete[1] == [
+        3, datetime(2024, 1, 1, 11), datetime(2024, 1, 1, 13, 0, 1),
+        7, datetime(2024, 1, 1, 10), datetime(2024, 1, 1, 15, 0, 1),
+    ]
+    assert recompute[0].startswith("INSERT INTO collection_events")
+    assert recompute[1] == [
+        3, datetime(2024, 1, 1, 9), datetime(2024, 1, 1, 13, 0, 1),
+        7, datetime(2024, 1, 1, 10), datetime(2024, 1, 1, 15, 0, 1),
+        COLLECTION_EMPTYING_RATIO,
+    ]
+
+@pytest.mark.parametrize("piece_size", [1, 2, 3, 7, 64, 10000])
+def test_stream_decoder_rebuilds_rows_from_any_byte_chunks(piece_size):
+    text = 'Label,Location\nC1,"Straße 1"\n\nC2,"Grünweg, 2"\nC3,Ende'
+    data = text.encode("utf-8")
+    decoder = StreamRowDecoder()
+    rows = []
+    for start in range(0, len(data), piece_size):
+        # Pieces may end inside a multi-byte character or a quoted field
+        rows.extend(decoder.feed(data[start:start + piece_size]))
+    rows.extend(decoder.flush())
+    assert rows == [["Label", "Location"], ["C1", "Straße 1"], ["C2", "Grünweg, 2"], ["C3", "Ende"]]
+
+def test_stream_decoder_keeps_only_the_partial_line():
+    decoder = StreamRowDecoder()
+    assert decoder.feed(b"a,b\nc,") == [["a", "b"]]
+    assert decoder.feed(b"d\r\n") == [["c", "d"]]
+    assert decoder.flush() == []
+
+def test_rows_at_or_before_the_high_water_mark_are_skipped():
+    columns, _ = parse([
+        sensor_row("C1", time="09:00"), sensor_row("C1", time="10:00"), sensor_row("C1", time="11:00"),
+        sensor_row("C2", time="08:00"), sensor_row("C3", time="07:00"),
+    ])
+    marks = {
+        ("C1", "Street C1"): np.datetime64("2024-01-01T10:00:00", "s"),
+        ("C3", "Street C3"): np.datetime64("2024-01-02T00:00:00", "s"),
+    }
+    kept, skipped = skip_seen_rows(columns, marks)
+    assert skipped == 3
+    # C2 has no stored readings yet
+    assert list(zip(kept["name"], kept["timestamp"].tolist())) == [
+        ("C1", datetime(2024, 1, 1, 11, 0)), ("C2", datetime(2024, 1, 1, 8, 0)),
+    ]
+    assert all(len(values) == 2 for values in kept.values())
+
+def test_chunk_without_new_rows_is_dropped_whole():
+    columns, _ = parse([sensor_row("C1", time="09:00")])
+    assert skip_seen_rows(columns, {("C1", "Street C1"): np.datetime64("2024-01-01T09:00:00", "s")}) == (None, 1)
+    assert skip_seen_rows(columns, {})[1] == 0
+
+@pytest.mark.parametrize("parts", [1, 2, 3, 7, 50])
+def test_byte_ranges_split_the_data_on_line_boundaries(tmp_path, parts):
+    path = tmp_path / "sensors.csv"
+    lines = [",".join(CSV_HEADER)] + [",".join(sensor_row(f"C{i}", time=f"10:{i % 60:02d}")) for i in range(23)]
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    header, data_start = read_header(str(path))
+    assert header == CSV_HEADER
+    ranges = split_byte_ranges(str(path), data_start, parts)
+    assert ranges[0][0] == data_start and ranges[-1][1] == path.stat().st_size
+    assert all(end == next_start for (_, end), (next_start, _) in zip(ranges, ranges[1:]))
+    assert len(ranges) <= parts
+    read = [line for start, end in ranges for line in LineReader(str(path), start, end)]
+    assert [line.rstrip("\n") for line in read] == lines[1:]
+
+def test_line_reader_offset_is_where_a_resumed_import_continues(tmp_path):
+    path = tmp_path / "sensors.csv"
+    path.write_bytes("h\nä,1\nb,2\nc,3\n".encode("utf-8"))
+    reader = LineReader(str(path), 2, path.stat().st_size)
+    lines = iter(reader)
+    assert next(lines) == "ä,1\n"
+    # Just past the line handed out, counted in bytes
+    assert reader.offset == 7
+    assert list(LineReader(str(path), reader.offset, path.stat().st_size)) == ["b,2\n", "c,3\n"]
+
+def chunk_summary():
+    ids = np.array([7, 3, 7, 3, 7])
+    timestamps = np.array(
+        ["2024-01-01T10:15", "2024-01-01T23:59", "2024-01-01T09:00", "2024-01-02T00:30", "2024-01-01T10:45"],
+        dtype="datetime64[s]",
+    )
+    return summarize_chunk(ids, timestamps, np.array([100, 200, 50, 210, 130]))
+
+def test_chunk_summary_has_the_span_and_last_fill_per_container():
+    container_ids, first, last, last_fills = chunk_summary()
+    assert container_ids.tolist() == [3, 7]
+    assert first.tolist() == [datetime(2024, 1, 1, 23, 59), datetime(2024, 1, 1, 9, 0)]
+    assert last.tolist() == [datetime(2024, 1, 2, 0, 30), datetime(2024, 1, 1, 10, 45)]
+    assert last_fills.tolist() == [210, 130]
+
+def test_bucket_ranges_cover_the_hours_and_days_of_each_span():
+    container_ids, first, last, _ = chunk_summary()
+    assert bucket_ranges(container_ids, first, last, "h") == [
+        (3, datetime(2024, 1, 1, 23), datetime(2024, 1, 2, 1)),
+        (7, datetime(2024, 1, 1, 9), datetime(2024, 1, 1, 11)),
+    ]
+    assert bucket_ranges(container_ids, first, last, "D") == [
+        (3, datetime(2024, 1, 1), datetime(2024, 1, 3)),
+        (7, datetime(2024, 1, 1), datetime(2024, 1, 2)),
+    ]
+
+def test_rollups_are_recomputed_and_report_the_readings_the_chunk_added():
+    # Hourly reading counts of the touched hours before and after the recompute;
+    # container 7 had one of its three readings already (a re-import)
+    cursor = RecordingCursor(
+        [{"container_id": 7, "reading_count": 1}],
+        [{"container_id": 3, "reading_count": 2}, {"container_id": 7, "reading_count": 3}],
+    )
+    added = update_rollups(cursor, chunk_summary())
+    assert added == {3: 2, 7: 2}
+    locked, hourly, _, daily = cursor.statements
+    assert locked[0].endswith("FOR UPDATE")
+    assert hourly[0].startswith("INSERT INTO container_readings_hourly")
+    assert daily[0].startswith("INSERT INTO container_readings_daily")
+    assert daily[1] == [3, datetime(2024, 1, 1), datetime(2024, 1, 3), 7, datetime(2024, 1, 1), datetime(2024, 1, 2)]
+
+def test_reading_stats_get_a_row_per_container_and_the_global_row():
+    cursor = RecordingCursor()
+    update_reading_stats(cursor, chunk_summary(), {3: 2, 7: 1})
+    [(sql, rows)] = cursor.statements
+    assert sql.startswith("INSERT INTO container_reading_stats")
+    assert rows == [
+        (3, datetime(2024, 1, 1, 23, 59), datetime(2024, 1, 2, 0, 30), 2, 210),
+        (7, datetime(2024, 1, 1, 9, 0), datetime(2024, 1, 1, 10, 45), 1, 130),
+        # Spans the whole chunk and takes the fill of its newest reading
+        (GLOBAL_STATS_ID, datetime(2024, 1, 1, 9, 0), datetime(2024, 1, 2, 0, 30), 3, 210),
+    ]
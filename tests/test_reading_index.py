@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from services.reading_index import ContainerSeries, ReadingIndex, to_seconds
+
+START = datetime(2024, 3, 1)
+
+def series_of(rows):
+    series = ContainerSeries()
+    for row in sorted(rows):
+        series.append(*row)
+    return series
+
+def brute_force_as_of(readings, timestamp, tolerance=None):
+    # readings: container id -> [(seconds, fill, reading id)]
+    seconds = to_seconds(timestamp)
+    result = {}
+    for container_id, rows in readings.items():
+        before = [row for row in rows if row[0] <= seconds]
+        if tolerance is not None:
+            before = [row for row in before if row[0] >= seconds - tolerance.total_seconds()]
+        if before:
+            result[container_id] = max(before)
+    return result
+
+@pytest.mark.parametrize("tolerance", [None, timedelta(minutes=30), timedelta(hours=6)])
+def test_as_of_matches_a_scan_of_all_readings(tolerance):
+    rng = np.random.default_rng(5)
+    readings = {}
+    for container_id in range(1, 21):
+        minutes = np.unique(rng.integers(0, 3 * 24 * 60, size=40))
+        readings[container_id] = [
+            (to_seconds(START + timedelta(minutes=int(m))), int(rng.integers(0, 1000)), container_id * 1000 + i)
+            for i, m in enumerate(minutes)
+        ]
+    index = ReadingIndex()
+    for container_id, rows in readings.items():
+        index.series[container_id] = series_of(rows)
+        index.containers[container_id] = (f"Street {container_id}", 48.0, 11.0)
+    index.ready = True
+    for hours in range(0, 80, 3):
+        timestamp = START + timedelta(hours=hours, minutes=7)
+        expected = brute_force_as_of(readings, timestamp, tolerance)
+        result = index.as_of(timestamp, tolerance)
+        assert [reading.container_id for reading in result] == sorted(expected)
+        for reading in result:
+            seconds, fill, reading_id = expected[reading.container_id]
+            assert (to_seconds(reading.timestamp), reading.fill_level_litres, reading.reading_id) == (seconds, fill, reading_id)
+
+def test_reading_at_the_exact_timestamp_counts():
+    index = ReadingIndex()
+    index.series[1] = series_of([(to_seconds(START), 10, 1), (to_seconds(START + timedelta(hours=1)), 20, 2)])
+    index.containers[1] = ("Street", 48.0, 11.0)
+    assert index.as_of(START + timedelta(hours=1))[0].reading_id == 2
+    assert index.as_of(START - timedelta(seconds=1)) == []
+
+def test_merge_inserts_out_of_order_rows_and_replaces_duplicates():
+    series = series_of([(10.0, 1, 1), (30.0, 3, 3)])
+    series.merge([(20.0, 2, 2), (30.0, 33, 4)])
+    series.merge([(40.0, 4, 5)])
+    assert list(series.timestamps) == [10.0, 20.0, 30.0, 40.0]
+    assert list(series.fills) == [1, 2, 33, 4]
+    assert list(series.reading_ids) == [1, 2, 4, 5]
+
+def test_failed_load_is_logged_and_retried_on_the_next_refresh(monkeypatch, capsys):
+    index = ReadingIndex()
+    loaded = ({1: series_of([(to_seconds(START), 10, 1)])}, {1: ("Street", 48.0, 11.0)})
+    attempts = []
+
+    def read_all():
+        attempts.append(len(attempts))
+        if len(attempts) == 1:
+            raise RuntimeError("database unavailable")
+        return loaded
+
+    monkeypatch.setattr(index, "_read_all", read_all)
+    index.load()
+    assert not index.ready and index.load_failed
+    assert "Could not load the readings" in capsys.readouterr().out
+    index.refresh([1], START, START)
+    assert index.ready and not index.load_failed
+    assert len(attempts) == 2
+    assert index.as_of(START)[0].fill_level_litres == 10
+
+def test_failed_refresh_reloads_the_index_on_the_next_one(monkeypatch):
+    index = ReadingIndex()
+    index.series[1] = series_of([(to_seconds(START), 10, 1)])
+    index.containers[1] = ("Street", 48.0, 11.0)
+    index.ready = True
+
+    def read(container_ids, first, last):
+        raise RuntimeError("connection lost")
+
+    monkeypatch.setattr(index, "_read", read)
+    monkeypatch.setattr(index, "_read_all", lambda: (
+        {1: series_of([(to_seconds(START), 10, 1), (to_seconds(START + timedelta(hours=1)), 20, 2)])},
+        {1: ("Street", 48.0, 11.0)},
+    ))
+    index.refresh([1], START + timedelta(hours=1), START + timedelta(hours=1))
+    assert index.load_failed
+    index.refresh([1], START + timedelta(hours=2), START + timedelta(hours=2))
+    assert not index.load_failed
+    assert index.as_of(START + timedelta(hours=1))[0].fill_level_litres == 20
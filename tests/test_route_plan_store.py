@@ -0,0 +1,121 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from services.routing import GLASS_TYPES, container_input, truck_input
+from services.route_plan_store import RoutePlanStore
+
+OPTIONS = {
+    "truck_ids": None,
+    "min_fill_ratio": 0.0,
+    "container_type": None,
+    "time_budget_seconds": 0.1,
+    "return_to_start": True,
+}
+
+def truck_row(truck_id, lat, lng, capacity=200):
+    return SimpleNamespace(
+        id=truck_id, location_lat=lat, location_lng=lng,
+        white_glass_capacity=capacity, green_glass_capacity=capacity, brown_glass_capacity=capacity,
+    )
+
+def container_entry(container_id, lat, lng, fill, container_type="green_glass", capacity=1000):
+    return SimpleNamespace(
+        id=container_id, type=container_type, location_lat=lat, location_lng=lng,
+        current_fill=fill, capacity=capacity,
+    )
+
+def make_store(truck_rows, containers_per_truck):
+    """A store holding a plan set up directly, without planning from the database."""
+    store = RoutePlanStore()
+    store.options = dict(OPTIONS)
+    for row, entries in zip(truck_rows, containers_per_truck):
+        store.trucks[row.id] = truck_input(row)
+        store.routes[row.id] = [container_input(entry, "green_glass") for entry in entries]
+        store.loads[row.id] = dict.fromkeys(GLASS_TYPES, 0)
+        for entry in entries:
+            store.loads[row.id]["green_glass"] += entry.current_fill
+            store.truck_of[entry.id] = row.id
+    store.baseline = store.distance_per_container()
+    return store
+
+def assert_consistent(store, container_ids):
+    placed = [stop["id"] for stops in store.routes.values() for stop in stops]
+    placed += list(store.unassigned) + list(store.skipped)
+    assert sorted(placed) == sorted(container_ids)
+    for truck_id, stops in store.routes.items():
+        for compartment in GLASS_TYPES:
+            load = sum(stop["demand"] for stop in stops if stop["compartment"] == compartment)
+            assert load == store.loads[truck_id][compartment]
+            assert load <= store.trucks[truck_id]["capacity"][compartment]
+        assert all(store.truck_of[stop["id"]] == truck_id for stop in stops)
+
+@pytest.fixture
+def store():
+    trucks = [truck_row(1, 48.10, 11.50), truck_row(2, 48.20, 11.60)]
+    near_first = [container_entry(10 + i, 48.10 + 0.002 * i, 11.50, 30) for i in range(4)]
+    near_second = [container_entry(20 + i, 48.20 + 0.002 * i, 11.60, 30) for i in range(4)]
+    return make_store(trucks, [near_first, near_second])
+
+ALL_IDS = [10, 11, 12, 13, 20, 21, 22, 23]
+
+def test_fill_change_keeps_the_stop_in_place(store):
+    order = [stop["id"] for stop in store.routes[1]]
+    store.update_container(11, container_entry(11, 48.102, 11.50, 50))
+    assert [stop["id"] for stop in store.routes[1]] == order
+    assert store.loads[1]["green_glass"] == 140
+    assert_consistent(store, ALL_IDS)
+
+def test_moved_container_is_inserted_into_the_nearest_tour(store):
+    store.update_container(11, container_entry(11, 48.201, 11.60, 30))
+    assert store.truck_of[11] == 2
+    assert_consistent(store, ALL_IDS)
+
+def test_container_that_does_not_fit_stays_unassigned(store):
+    store.update_container(30, container_entry(30, 48.15, 11.55, 150))
+    assert 30 in store.unassigned
+    assert_consistent(store, ALL_IDS + [30])
+
+def test_deleted_and_emptied_containers_leave_the_plan(store):
+    store.update_container(12, None)
+    store.update_container(13, container_entry(13, 48.106, 11.50, 0))
+    assert 12 not in store.truck_of and 13 not in store.truck_of
+    assert_consistent(store, [i for i in ALL_IDS if i not in (12, 13)])
+
+def test_container_without_a_compartment_is_skipped(store):
+    store.update_container(11, container_entry(11, 48.102, 11.50, 30, container_type="paper"))
+    assert store.skipped == {11}
+    assert_consistent(store, ALL_IDS)
+
+def test_truck_with_less_capacity_hands_containers_over(store):
+    store.update_truck(1, truck_row(1, 48.10, 11.50, capacity=70))
+    assert store.loads[1]["green_glass"] <= 70
+    assert_consistent(store, ALL_IDS)
+
+def test_deleted_truck_hands_all_containers_over(store):
+    store.update_truck(1, None)
+    assert list(store.routes) == [2]
+    assert_consistent(store, ALL_IDS)
+
+def test_random_updates_keep_every_container_placed_once():
+    rng = np.random.default_rng(3)
+    trucks = [truck_row(i, 48.1 + 0.05 * i, 11.5, capacity=300) for i in range(1, 4)]
+    entries = {i: container_entry(i, 48.1 + rng.uniform(0, 0.1), 11.5 + rng.uniform(0, 0.1), 40) for i in range(30)}
+    store = make_store(trucks, [[entries[i] for i in range(k * 5, k * 5 + 5)] for k in range(3)])
+    for container_id in range(15, 30):
+        store.update_container(container_id, entries[container_id])
+    for _ in range(300):
+        container_id = int(rng.integers(40))
+        if rng.random() < 0.1:
+            entries.pop(container_id, None)
+            store.update_container(container_id, None)
+            continue
+        entry = container_entry(
+            container_id, 48.1 + rng.uniform(0, 0.1), 11.5 + rng.uniform(0, 0.1), int(rng.integers(0, 120)),
+            container_type="paper" if rng.random() < 0.05 else "green_glass",
+        )
+        entries[container_id] = entry
+        store.update_container(container_id, entry)
+    wanted = [i for i, entry in entries.items() if entry.current_fill > 0]
+    assert_consistent(store, wanted)
@@ -0,0 +1,95 @@
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from services.routing import GLASS_TYPES, RoutePlanner, improve_route, plan_routes
+
+def random_instance(seed, truck_count=3, container_count=60, capacity=250):
+    rng = np.random.default_rng(seed)
+    trucks = [
+        {
+            "id": 100 + i,
+            "lat": 48.1 + rng.uniform(-0.05, 0.05),
+            "lng": 11.5 + rng.uniform(-0.05, 0.05),
+            "capacity": {compartment: capacity for compartment in GLASS_TYPES},
+        }
+        for i in range(truck_count)
+    ]
+    containers = [
+        {
+            "id": i,
+            "lat": 48.1 + rng.uniform(-0.05, 0.05),
+            "lng": 11.5 + rng.uniform(-0.05, 0.05),
+            "compartment": GLASS_TYPES[int(rng.integers(len(GLASS_TYPES)))],
+            "demand": int(rng.integers(10, 80)),
+        }
+        for i in range(container_count)
+    ]
+    return trucks, containers
+
+@pytest.mark.parametrize("return_to_start", [True, False])
+@pytest.mark.parametrize("seed", range(5))
+def test_plan_respects_compartment_capacities(seed, return_to_start):
+    trucks, containers = random_instance(seed)
+    plan = RoutePlanner(trucks, containers, return_to_start).plan(time_budget=0.5)
+    demand = {container["id"]: container for container in containers}
+    for route, truck in zip(plan["routes"], trucks):
+        loads = dict.fromkeys(GLASS_TYPES, 0)
+        for container_id in route["container_ids"]:
+            loads[demand[container_id]["compartment"]] += demand[container_id]["demand"]
+        assert loads == route["load"]
+        for compartment in GLASS_TYPES:
+            assert loads[compartment] <= truck["capacity"][compartment]
+
+@pytest.mark.parametrize("seed", range(5))
+def test_plan_places_every_container_once(seed):
+    trucks, containers = random_instance(seed)
+    plan = RoutePlanner(trucks, containers).plan(time_budget=0.5)
+    placed = [i for route in plan["routes"] for i in route["container_ids"]] + plan["unassigned_container_ids"]
+    assert sorted(placed) == [container["id"] for container in containers]
+    # The instance is larger than the fleet, so some containers must be left over
+    assert plan["unassigned_container_ids"]
+
+def test_plan_routes_skips_containers_without_a_compartment():
+    trucks = [
+        SimpleNamespace(
+            id=1, location_lat=48.1, location_lng=11.5,
+            white_glass_capacity=100, green_glass_capacity=100, brown_glass_capacity=100,
+        )
+    ]
+    types = ["White glass", "Grünglas", "Braunglas", "Paper", None, "green_glass"]
+    containers = [
+        SimpleNamespace(id=i, type=container_type, location_lat=48.1 + i * 0.001, location_lng=11.5, current_fill=60)
+        for i, container_type in enumerate(types)
+    ]
+    plan = plan_routes(trucks, containers, time_budget=0.1)
+    assert sorted(plan["skipped_container_ids"]) == [3, 4]
+    routed = plan["routes"][0]["container_ids"]
+    placed = routed + plan["unassigned_container_ids"] + plan["skipped_container_ids"]
+    assert sorted(placed) == list(range(len(types)))
+    # Only one of the two green containers of 60 fits the compartment of 100
+    assert len(plan["unassigned_container_ids"]) == 1
+
+@pytest.mark.parametrize("return_to_start", [True, False])
+@pytest.mark.parametrize("seed", range(10))
+def test_two_opt_never_lengthens_a_route(seed, return_to_start):
+    trucks, containers = random_instance(seed, truck_count=1, container_count=40, capacity=10 ** 6)
+    planner = RoutePlanner(trucks, containers, return_to_start)
+    order = np.random.default_rng(seed).permutation(len(containers))
+    planner.routes[0] = [planner.point(int(i)) for i in order]
+    before = planner.route_distance(0)
+    planner.two_opt(0, time.monotonic() + 5)
+    assert planner.route_distance(0) <= before + 1e-6
+    assert sorted(planner.routes[0]) == [planner.point(i) for i in range(len(containers))]
+
+def test_improve_route_keeps_the_stops_and_does_not_lengthen_the_tour():
+    trucks, containers = random_instance(7, truck_count=1, container_count=30, capacity=10 ** 6)
+    before = RoutePlanner(trucks, containers)
+    before.routes[0] = [before.point(i) for i in range(len(containers))]
+    stops = improve_route(trucks[0], containers, time_budget=1.0)
+    after = RoutePlanner(trucks, stops)
+    after.routes[0] = [after.point(i) for i in range(len(stops))]
+    assert sorted(stop["id"] for stop in stops) == [container["id"] for container in containers]
+    assert after.route_distance(0) <= before.route_distance(0) + 1e-6
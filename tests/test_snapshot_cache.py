@@ -0,0 +1,91 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+
+import routes.containers as containers_routes
+from services.reading_index import ContainerSeries, ReadingIndex, to_seconds
+from services.snapshot_cache import SnapshotCache
+
+START = datetime(2024, 5, 1, 8, 0)
+
+def make_index():
+    index = ReadingIndex()
+    for container_id in range(1, 4):
+        index.containers[container_id] = (f"Street {container_id}", 48.1, 11.5 + container_id / 100)
+        series = ContainerSeries()
+        # Readings every 7 minutes, offset per container
+        for i in range(40):
+            timestamp = START + timedelta(minutes=7 * i + container_id)
+            series.append(to_seconds(timestamp), 100 * container_id + i, 1000 * container_id + i)
+        index.series[container_id] = series
+    index.ready = True
+    return index
+
+@pytest.fixture
+def index(monkeypatch):
+    index = make_index()
+    monkeypatch.setattr(containers_routes, "reading_index", index)
+    return index
+
+def nearest(monkeypatch, cache, timestamp, tolerance=None):
+    monkeypatch.setattr(containers_routes, "snapshot_cache", cache)
+    response = containers_routes.get_nearest_readings(timestamp, tolerance, db=None)
+    if isinstance(response, dict):
+        return json.loads(json.dumps(jsonable_encoder(response)))
+    return json.loads(response.body)
+
+@pytest.mark.parametrize("tolerance", [None, timedelta(minutes=5), timedelta(hours=1)])
+def test_cached_answers_equal_uncached_ones(index, monkeypatch, tolerance):
+    cache = SnapshotCache()
+    uncached = SnapshotCache(max_bytes=0)
+    assert not uncached.enabled
+    for minutes in (0, 1, 3, 9, 61, 62, 199, 299):
+        timestamp = START + timedelta(minutes=minutes, seconds=30)
+        expected = nearest(monkeypatch, uncached, timestamp, tolerance)
+        # A miss that fills the cache, then a hit
+        assert nearest(monkeypatch, cache, timestamp, tolerance) == expected
+        assert nearest(monkeypatch, cache, timestamp, tolerance) == expected
+    assert cache.hits == 8 and cache.misses == 8
+
+def test_rounding_to_buckets_is_opt_in(index, monkeypatch):
+    timestamp = START + timedelta(minutes=9)
+    rounded = nearest(monkeypatch, SnapshotCache(bucket_seconds=300), timestamp)
+    exact = nearest(monkeypatch, SnapshotCache(max_bytes=0), timestamp)
+    bucket_start = nearest(monkeypatch, SnapshotCache(max_bytes=0), START + timedelta(minutes=5))
+    assert rounded == bucket_start
+    assert rounded != exact
+
+def test_invalidate_drops_only_entries_at_or_after_the_first_imported_reading():
+    cache = SnapshotCache()
+    keys = [cache.key(START + timedelta(hours=hours))[0] for hours in range(4)]
+    for key in keys:
+        cache.put(key, b"{}", cache.generation)
+    cache.invalidate(START + timedelta(hours=2))
+    assert list(cache.entries) == keys[:2]
+    assert cache.invalidations == 2
+    cache.invalidate()
+    assert not cache.entries and cache.size == 0
+
+def test_snapshot_computed_before_an_invalidation_is_not_stored():
+    cache = SnapshotCache()
+    key, _ = cache.key(START)
+    generation = cache.generation
+    cache.on_readings_committed([1], START - timedelta(days=1), START)
+    cache.put(key, b"{}", generation)
+    assert cache.get(key) is None
+
+def test_least_recently_used_entries_are_evicted_first():
+    cache = SnapshotCache(max_bytes=30)
+    keys = [cache.key(START + timedelta(minutes=minutes))[0] for minutes in range(3)]
+    for key in keys:
+        cache.put(key, b"x" * 10, cache.generation)
+    assert cache.get(keys[0]) is not None
+    cache.put(cache.key(START + timedelta(minutes=3))[0], b"x" * 10, cache.generation)
+    assert keys[1] not in cache.entries
+    assert keys[0] in cache.entries and keys[2] in cache.entries
+    assert cache.size == 30 and cache.evictions == 1
+    # Bodies larger than the whole cache are not kept at all
+    cache.put(keys[1], b"x" * 31, cache.generation)
+    assert keys[1] not in cache.entries and cache.size == 30
@@ -0,0 +1,93 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from services.spatial_index import SpatialIndex, fill_ratio, haversine_m
+
+def container(id, lat, lng, type="Weißglas", capacity=3200, current_fill=0):
+    return SimpleNamespace(
+        id=id, name=f"C{id}", address=f"Street {id}", location_lat=lat, location_lng=lng,
+        type=type, capacity=capacity, current_fill=current_fill, last_updated=None,
+    )
+
+def random_containers(seed, count=300):
+    rng = np.random.default_rng(seed)
+    return [
+        container(
+            i, 49.4 + rng.uniform(-0.05, 0.05), 8.46 + rng.uniform(-0.05, 0.05),
+            type=["Weißglas", "Grünglas", "Braunglas"][int(rng.integers(3))],
+            current_fill=int(rng.integers(0, 3200)),
+        )
+        for i in range(count)
+    ]
+
+def loaded_index(containers):
+    index = SpatialIndex()
+    index.ready = True
+    for c in containers:
+        index.update_container(c)
+    return index
+
+class RecordingObserver:
+    def __init__(self):
+        self.events = []
+
+    def reset(self, entries):
+        self.events.append(("reset", sorted(entry.id for entry in entries)))
+
+    def entry_added(self, entry):
+        self.events.append(("added", entry.id))
+
+    def entry_removed(self, entry):
+        self.events.append(("removed", entry.id))
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("radius_m", [50, 800, 5000])
+def test_radius_search_matches_brute_force(seed, radius_m):
+    containers = random_containers(seed)
+    index = loaded_index(containers)
+    lat, lng = 49.41, 8.45
+    found = index.near(lat, lng, radius_m, container_type="Grünglas", min_fill_ratio=0.25)
+    expected = sorted(
+        (haversine_m(lat, lng, c.location_lat, c.location_lng), c.id)
+        for c in containers
+        if c.type == "Grünglas" and fill_ratio(c) >= 0.25
+        and haversine_m(lat, lng, c.location_lat, c.location_lng) <= radius_m
+    )
+    assert [entry.id for entry, _ in found] == [i for _, i in expected]
+    assert [distance for _, distance in found] == pytest.approx([d for d, _ in expected])
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("bbox", [(49.39, 8.44, 49.40, 8.47), (49.0, 8.0, 50.0, 9.0)])
+def test_bbox_search_matches_brute_force(seed, bbox):
+    # The second box spans more cells than are occupied
+    containers = random_containers(seed)
+    index = loaded_index(containers)
+    min_lat, min_lng, max_lat, max_lng = bbox
+    expected = [
+        c.id for c in containers
+        if min_lat <= c.location_lat <= max_lat and min_lng <= c.location_lng <= max_lng
+    ]
+    assert [entry.id for entry in index.in_bbox(*bbox)] == expected
+    assert [entry.id for entry in index.in_bbox(*bbox, limit=5)] == expected[:5]
+
+def test_moved_and_removed_containers_leave_their_cells():
+    index = loaded_index([container(1, 49.40, 8.46), container(2, 49.40, 8.46)])
+    index.update_container(container(1, 49.50, 8.60))
+    index.remove_container(2)
+    assert index.near(49.40, 8.46, 100) == []
+    assert [entry.id for entry, _ in index.near(49.50, 8.60, 100)] == [1]
+    assert list(index.cells) == [index.cell_of(49.50, 8.60)]
+
+def test_observers_see_every_change():
+    index = loaded_index([container(1, 49.40, 8.46)])
+    observer = RecordingObserver()
+    index.add_observer(observer)
+    index.update_container(container(2, 49.41, 8.47))
+    index.update_container(container(1, 49.42, 8.48))
+    index.remove_container(2)
+    index.remove_container(2)
+    assert observer.events == [
+        ("reset", [1]), ("added", 2), ("removed", 1), ("added", 1), ("removed", 2),
+    ]
@@ -0,0 +1,65 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from services.spatial_index import SpatialIndex
+from services.tile_pyramid import CELLS_PER_SIDE, TilePyramid, cluster_entries, mercator_fraction
+
+def container(id, lat, lng, capacity=3200, current_fill=0):
+    return SimpleNamespace(
+        id=id, name=f"C{id}", address=f"Street {id}", location_lat=lat, location_lng=lng,
+        type="Weißglas", capacity=capacity, current_fill=current_fill, last_updated=None,
+    )
+
+def random_containers(seed, count=300):
+    rng = np.random.default_rng(seed)
+    return [
+        container(i, 49.4 + rng.uniform(-0.05, 0.05), 8.46 + rng.uniform(-0.05, 0.05), current_fill=int(rng.integers(0, 3200)))
+        for i in range(count)
+    ]
+
+def tile_of(lat, lng, z):
+    fx, fy = mercator_fraction(lat, lng)
+    return z, int(fx * 2 ** z), int(fy * 2 ** z)
+
+def assert_same_clusters(actual, expected):
+    assert len(actual) == len(expected)
+    for a, e in zip(actual, expected):
+        assert a == pytest.approx(e)
+
+@pytest.mark.parametrize("z", [0, 6, 12, 14])
+def test_precomputed_tiles_match_clustering_on_request(z):
+    containers = random_containers(0)
+    pyramid = TilePyramid(max_zoom=14)
+    pyramid.reset(containers)
+    tile = tile_of(49.4, 8.46, z)
+    clusters = pyramid.tile(*tile)
+    assert 0 < len(clusters) <= CELLS_PER_SIDE * CELLS_PER_SIDE
+    assert sum(cluster["count"] for cluster in clusters) <= len(containers)
+    assert_same_clusters(clusters, cluster_entries(containers, *tile))
+
+def test_observed_changes_keep_the_tiles_up_to_date():
+    containers = random_containers(1)
+    index = SpatialIndex()
+    index.ready = True
+    for c in containers:
+        index.update_container(c)
+    pyramid = TilePyramid(max_zoom=14)
+    index.add_observer(pyramid)
+    for c in containers[:50]:
+        index.update_container(container(c.id, c.location_lat + 0.01, c.location_lng, current_fill=1600))
+    for c in containers[50:100]:
+        index.remove_container(c.id)
+    entries = list(index.entries.values())
+    for z in (0, 10, 14):
+        tile = tile_of(49.4, 8.46, z)
+        assert_same_clusters(pyramid.tile(*tile), cluster_entries(entries, *tile))
+
+def test_single_container_cells_name_the_container():
+    pyramid = TilePyramid(max_zoom=14)
+    pyramid.reset([container(7, 49.4, 8.46, current_fill=800)])
+    [cluster] = pyramid.tile(*tile_of(49.4, 8.46, 14))
+    assert cluster == {"count": 1, "avg_fill_ratio": 0.25, "lat": 49.4, "lng": 8.46, "container_id": 7}
+    pyramid.entry_removed(container(7, 49.4, 8.46, current_fill=800))
+    assert all(not cells for cells in pyramid.levels)
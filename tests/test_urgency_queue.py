@@ -0,0 +1,75 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from services.spatial_index import fill_ratio
+from services.urgency_queue import COMPACT_FACTOR, UrgencyQueue, delay_cost
+
+TYPES = ["Weißglas", "Grünglas", "Braunglas"]
+
+def container(id, type, capacity, current_fill):
+    return SimpleNamespace(
+        id=id, type=type, capacity=capacity, current_fill=current_fill,
+        location_lat=49.4, location_lng=8.46, last_updated=None,
+    )
+
+def random_container(rng, id):
+    capacity = int(rng.choice([1100, 2500, 3200]))
+    return container(id, TYPES[int(rng.integers(3))], capacity, int(rng.integers(0, capacity + 1)))
+
+def brute_force_top(entries, k, container_type=None):
+    ranked = sorted(
+        (entry for entry in entries.values() if container_type in (None, entry.type)),
+        key=lambda entry: (-delay_cost(entry), -fill_ratio(entry), entry.id),
+    )
+    return [entry.id for entry in ranked[:k]]
+
+@pytest.mark.parametrize("seed", range(5))
+def test_top_matches_brute_force_after_random_updates(seed):
+    rng = np.random.default_rng(seed)
+    entries = {i: random_container(rng, i) for i in range(200)}
+    queue = UrgencyQueue()
+    queue.reset(list(entries.values()))
+    for _ in range(2000):
+        container_id = int(rng.integers(250))
+        if rng.random() < 0.2:
+            # Removing an unknown container is a no-op
+            removed = entries.pop(container_id, None) or container(container_id, TYPES[0], 1100, 0)
+            queue.entry_removed(removed)
+        else:
+            entries[container_id] = random_container(rng, container_id)
+            queue.entry_added(entries[container_id])
+    for k in (1, 10, 300):
+        assert [entry.id for entry, _, _ in queue.top(k)] == brute_force_top(entries, k)
+        for container_type in TYPES:
+            assert [entry.id for entry, _, _ in queue.top(k, container_type)] == brute_force_top(entries, k, container_type)
+    # Reading the top leaves the heaps as they were
+    assert [entry.id for entry, _, _ in queue.top(300)] == brute_force_top(entries, 300)
+
+def test_top_reports_the_fill_ratio_and_cost():
+    queue = UrgencyQueue(delayed_hours=10)
+    queue.reset([container(1, "Weißglas", 3200, 1600), container(2, "Weißglas", 3200, 3200)])
+    [(first, first_ratio, first_cost), (second, second_ratio, second_cost)] = queue.top(2)
+    assert (first.id, first_ratio, first_cost) == (2, 1.0, pytest.approx(delay_cost(first, 10)))
+    assert (second.id, second_ratio, second_cost) == (1, 0.5, pytest.approx(delay_cost(second, 10)))
+
+def test_stale_items_are_compacted():
+    queue = UrgencyQueue()
+    queue.reset([container(i, "Weißglas", 3200, 100) for i in range(10)])
+    for fill in range(200, 3200, 10):
+        queue.entry_added(container(0, "Weißglas", 3200, fill))
+        queue.entry_removed(container(9, "Weißglas", 3200, 0))
+        queue.entry_added(container(9, "Weißglas", 3200, 0))
+    # Compaction runs on removal, so the heap never grows much past the live count
+    assert len(queue.heaps["Weißglas"]) <= COMPACT_FACTOR * queue.counts["Weißglas"] + 64 + 1
+    assert queue.counts == {"Weißglas": 10}
+    assert [entry.id for entry, _, _ in queue.top(1)] == [0]
+
+def test_removing_the_last_container_of_a_type_drops_its_heap():
+    queue = UrgencyQueue()
+    queue.reset([container(1, "Grünglas", 3200, 100), container(2, "Braunglas", 3200, 200)])
+    queue.entry_removed(container(1, "Grünglas", 3200, 100))
+    assert list(queue.heaps) == list(queue.counts) == ["Braunglas"]
+    assert queue.top(5, "Grünglas") == []
+    assert [entry.id for entry, _, _ in queue.top(5)] == [2]